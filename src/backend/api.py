@@ -5,15 +5,77 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from fastapi import FastAPI, APIRouter, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from backend.summarizer import Summarizer
-from helper_methods import check_run_docker
-from backend.recruit import process_cv_files
-from typing import List
+from helper_methods import check_run_docker, load_parameters
+from backend.recruit import aprocess_cv_files
+from backend.jobs import JobManager, JobNotFoundError
+from backend.metrics import MetricsReporter
+from backend.chat import (
+    ProjectAccessError,
+    answer,
+    batch_answers,
+    get_chatbot,
+    stream_answer,
+)
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import functools
 import tempfile
+import asyncio
 import shutil
 import ast
 
-app = FastAPI()
+# application parameters of the chat endpoints (read once per process)
+PARAMETERS = load_parameters()
+
+# background jobs (long summaries and CV batches), persisted on disk
+JOB_MANAGER = JobManager(PARAMETERS)
+
+# per-worker metrics, aggregated across the workers by the metrics endpoints
+METRICS_REPORTER = MetricsReporter(PARAMETERS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # started per worker process (after the fork of the pre-fork server)
+    JOB_MANAGER.start()
+    METRICS_REPORTER.start()
+    yield
+    JOB_MANAGER.stop()
+    METRICS_REPORTER.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# bounded pool for the blocking steps of the async endpoints (file copies,
+# unzipping, text extraction), so they never run on the event loop
+BLOCKING_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(PARAMETERS.get("api_blocking_workers", 8)),
+    thread_name_prefix="api-blocking",
+)
+
+
+async def run_blocking(func, *args):
+    """Runs a blocking function in the bounded pool, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(BLOCKING_EXECUTOR, functools.partial(func, *args))
+
+
+def copy_upload(file: UploadFile, file_path: str) -> None:
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+
+
+async def save_uploads(files: List[UploadFile], directory: str) -> List[str]:
+    """Saves the uploaded files into a directory (in the blocking pool)."""
+    file_paths = [os.path.join(directory, os.path.basename(file.filename)) for file in files]
+    await asyncio.gather(
+        *(run_blocking(copy_upload, file, path) for file, path in zip(files, file_paths))
+    )
+    return file_paths
 
 # CORS origins
 if check_run_docker():
@@ -31,6 +93,140 @@ app.add_middleware(
 # Create routers
 summarizer_router = APIRouter()
 recruit_router = APIRouter()
+metrics_router = APIRouter()
+chat_router = APIRouter()
+jobs_router = APIRouter()
+
+
+class ChatRequest(BaseModel):
+    message: str
+    temperature: float = 0.0
+    debug: bool = False
+    password: str = ""
+    sources: Optional[List[str]] = None
+    stream: bool = True
+
+
+class FederatedChatRequest(ChatRequest):
+    projects: List[str] = Field(..., min_length=1)
+
+
+class ProjectAccess(BaseModel):
+    password: str = ""
+
+
+class SearchRequest(BaseModel):
+    query: str
+    password: str = ""
+    sources: Optional[List[str]] = None
+
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    temperature: float = 0.0
+    password: str = ""
+    sources: Optional[List[str]] = None
+    max_concurrency: Optional[int] = None
+
+
+def chat_response(project_names: List[str], request: ChatRequest):
+    """Answers a chat request, streamed as Server-Sent Events unless `stream` is off."""
+    try:
+        bot = get_chatbot(project_names, request.password, PARAMETERS)
+    except ProjectAccessError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    if not request.stream:
+        try:
+            return answer(
+                bot, request.message, request.temperature, request.debug, request.sources
+            )
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+    return StreamingResponse(
+        stream_answer(
+            bot, request.message, request.temperature, request.debug, request.sources
+        ),
+        media_type="text/event-stream",
+        # no proxy buffering, so tokens reach the client as they are generated
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Chat endpoints (sync: they run in the threadpool, sharing the warm indexes)
+@chat_router.post("/chat/{project}")
+def chat_endpoint(project: str, request: ChatRequest):
+    return chat_response([project], request)
+
+
+@chat_router.post("/chat")
+def federated_chat_endpoint(request: FederatedChatRequest):
+    return chat_response(sorted(set(request.projects)), request)
+
+
+@chat_router.post("/chat/{project}/batch")
+def chat_batch_endpoint(project: str, request: BatchRequest):
+    max_questions = int(PARAMETERS.get("batch_max_questions", 1000))
+    if len(request.questions) > max_questions:
+        return JSONResponse(
+            {"error": f"Máximo de {max_questions} perguntas por lote."}, status_code=400
+        )
+    max_concurrency = int(PARAMETERS.get("batch_max_concurrency", 4))
+    if request.max_concurrency:
+        max_concurrency = max(1, min(request.max_concurrency, max_concurrency))
+
+    try:
+        bot = get_chatbot([project], request.password, PARAMETERS)
+    except ProjectAccessError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    # one JSON line per question, in input order, streamed as they are answered
+    return StreamingResponse(
+        batch_answers(
+            bot, request.questions, request.temperature, request.sources, max_concurrency
+        ),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+# Retrieval only (no LLM call): the relevant chunks of a query
+@chat_router.post("/chat/{project}/search")
+def chat_search_endpoint(project: str, request: SearchRequest):
+    try:
+        bot = get_chatbot([project], request.password, PARAMETERS)
+        return {"documents": bot.get_relevant_documents(request.query, request.sources) or []}
+    except ProjectAccessError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@chat_router.post("/chat/{project}/sources")
+def chat_sources_endpoint(project: str, access: ProjectAccess):
+    try:
+        bot = get_chatbot([project], access.password, PARAMETERS)
+        return {"sources": bot.list_sources()}
+    except ProjectAccessError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# Metrics endpoints (summed across all the API workers)
+@metrics_router.get("/metrics")
+def metrics_endpoint():
+    return METRICS_REPORTER.collect()
+
+
+@metrics_router.get("/metrics/llm")
+def llm_metrics_endpoint():
+    return METRICS_REPORTER.collect()["llm"]
 
 
 # Summarize endpoint
@@ -45,18 +241,15 @@ async def summarize_endpoint(
     try:
         parameters = ast.literal_eval(parameters)
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            file_paths = []
-            for file in files:
-                file_path = os.path.join(temp_dir, file.filename)
-                with open(file_path, "wb") as f:
-                    shutil.copyfileobj(file.file, f)
-                file_paths.append(file_path)
-
+        temp_dir = await run_blocking(tempfile.mkdtemp)
+        try:
+            file_paths = await save_uploads(files, temp_dir)
             summarizer = Summarizer(parameters)
-            result = summarizer.process_documents(
-                file_paths, word_limit, summarize_all, additional_info
+            result = await summarizer.aprocess_documents(
+                file_paths, word_limit, summarize_all, additional_info, BLOCKING_EXECUTOR
             )
+        finally:
+            await run_blocking(shutil.rmtree, temp_dir, True)
 
         return {"summaries": result}
 
@@ -75,23 +268,79 @@ async def recrutamento_endpoint(
     try:
         parameters = ast.literal_eval(parameters)
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            file_paths = []
-            for file in files:
-                file_path = os.path.join(temp_dir, file.filename)
-                with open(file_path, "wb") as f:
-                    shutil.copyfileobj(file.file, f)
-                file_paths.append(file_path)
-
-            result = process_cv_files(
-                file_paths, job_title, job_description, parameters
+        temp_dir = await run_blocking(tempfile.mkdtemp)
+        try:
+            file_paths = await save_uploads(files, temp_dir)
+            result = await aprocess_cv_files(
+                file_paths, job_title, job_description, parameters, BLOCKING_EXECUTOR
             )
+        finally:
+            await run_blocking(shutil.rmtree, temp_dir, True)
 
         return {"data": result}
     except Exception as e:
         return {"error": str(e)}
 
 
+async def submit_job(kind: str, options: dict, files: List[UploadFile]):
+    """Saves the uploads of a job and queues it, returning its status."""
+    try:
+        job_id, inputs_dir = await run_blocking(JOB_MANAGER.create)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    try:
+        await save_uploads(files, inputs_dir)
+        return await run_blocking(JOB_MANAGER.submit, job_id, kind, options)
+    except Exception as e:
+        await run_blocking(shutil.rmtree, JOB_MANAGER.job_dir(job_id), True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# Background jobs: submit returns the job id, then poll its status and result
+@jobs_router.post("/jobs/summarize")
+async def summarize_job_endpoint(
+    word_limit: int = Form(...),
+    summarize_all: bool = Form(...),
+    additional_info: str = Form(""),
+    files: List[UploadFile] = File(...),
+):
+    options = {
+        "word_limit": word_limit,
+        "summarize_all": summarize_all,
+        "additional_info": additional_info,
+    }
+    return await submit_job("summarize", options, files)
+
+
+@jobs_router.post("/jobs/recrutamento")
+async def recrutamento_job_endpoint(
+    job_title: str = Form(...),
+    job_description: str = Form(...),
+    files: List[UploadFile] = File(...),
+):
+    options = {"job_title": job_title, "job_description": job_description}
+    return await submit_job("recruit", options, files)
+
+
+@jobs_router.get("/jobs/{job_id}")
+def job_status_endpoint(job_id: str):
+    try:
+        return JOB_MANAGER.status(job_id)
+    except JobNotFoundError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+
+
+@jobs_router.get("/jobs/{job_id}/result")
+def job_result_endpoint(job_id: str):
+    try:
+        return JOB_MANAGER.result(job_id)
+    except JobNotFoundError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+
+
 # Register routers with the app
 app.include_router(summarizer_router)
 app.include_router(recruit_router)
+app.include_router(metrics_router)
+app.include_router(chat_router)
+app.include_router(jobs_router)
@@ -0,0 +1,211 @@
+from helper_methods import PROJECTS_DIR, decrypt_password
+from helper_rag import ChatBot, FederatedChatBot
+from typing import Iterator, List
+from datetime import datetime
+import json
+import os
+
+
+class ProjectAccessError(Exception):
+    """Raised when a project does not exist or its password does not match."""
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def load_metadata(project_name: str) -> dict:
+    """Reads the metadata of a project (raises ProjectAccessError if it does not exist)."""
+    metadata_path = os.path.join(PROJECTS_DIR, project_name, "metadata.json")
+    if (
+        not project_name
+        or os.path.basename(project_name) != project_name
+        or not os.path.exists(metadata_path)
+    ):
+        raise ProjectAccessError(f"Projeto não encontrado: {project_name}", 404)
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_password(project_name: str, password: str, parameters: dict) -> None:
+    """
+    Checks the password of a project (the project's own or the admin password).
+
+    Raises:
+        ProjectAccessError: If the project does not exist or the password is wrong.
+    """
+    metadata = load_metadata(project_name)
+    if not metadata.get("flag_password"):
+        return
+
+    password = (password or "").strip()
+    if password == "":
+        raise ProjectAccessError("Por favor, digite a senha do projeto.", 401)
+    project_password = decrypt_password(
+        metadata["password"].strip(), parameters
+    ).strip()
+    if password != project_password and password != parameters["admin"]:
+        raise ProjectAccessError("Senha incorreta.", 401)
+
+
+def get_chatbot(
+    project_names: List[str], password: str, parameters: dict
+) -> ChatBot:
+    """
+    Builds the chatbot of a request. The indexes, models and caches it uses are
+    shared by all requests of the process (registry), so this is cheap once the
+    project is warm.
+
+    Args:
+        project_names (List[str]): One project, or several for a federated search.
+        password (str): Password of the project (federated search only accepts
+            projects without password).
+        parameters (dict): Application parameters.
+
+    Returns:
+        ChatBot: The chatbot.
+
+    Raises:
+        ProjectAccessError: If a project does not exist, has a wrong password or
+            cannot be searched together with others (password or KB projects).
+    """
+    if len(project_names) == 1:
+        check_password(project_names[0], password, parameters)
+        return ChatBot(project_names[0], parameters)
+
+    for project_name in project_names:
+        try:
+            metadata = load_metadata(project_name)
+        except ProjectAccessError as e:
+            raise ProjectAccessError(str(e), 400)
+        if metadata.get("flag_password"):
+            raise ProjectAccessError(
+                f"Projetos com senha não podem ser consultados em conjunto: {project_name}",
+                403,
+            )
+        if os.path.exists(os.path.join(PROJECTS_DIR, project_name, "KB.txt")):
+            raise ProjectAccessError(
+                f"Projetos do tipo KB não podem ser consultados em conjunto: {project_name}",
+                400,
+            )
+    return FederatedChatBot(project_names, parameters)
+
+
+def preload_projects(parameters: dict) -> List[str]:
+    """
+    Loads the embedding model and the indexes of all projects into the
+    process-wide registry (used by the pre-fork server before forking workers).
+
+    Args:
+        parameters (dict): Application parameters.
+
+    Returns:
+        List[str]: The projects loaded.
+    """
+    try:
+        project_names = sorted(os.listdir(PROJECTS_DIR))
+    except FileNotFoundError:
+        return []
+
+    loaded = []
+    for project_name in project_names:
+        if not os.path.exists(os.path.join(PROJECTS_DIR, project_name, "metadata.json")):
+            continue
+        try:
+            ChatBot(project_name, parameters)
+            loaded.append(project_name)
+        except Exception:
+            continue
+    return loaded
+
+
+def save_log(project_name: str, user_input: str, result: dict) -> None:
+    """Logs a single chatbot interaction to a JSONL file."""
+    try:
+        log_path = os.path.join(PROJECTS_DIR, project_name, "logs")
+        os.makedirs(log_path, exist_ok=True)
+
+        log_file = os.path.join(log_path, f"chat_log_{datetime.now().date()}.jsonl")
+        log_entry = {
+            "timestamp": datetime.now().isoformat(),
+            "user_input": user_input,
+            "bot_response": result,
+        }
+
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
+
+
+def sse_event(event: str, data) -> str:
+    """Formats a Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def answer(
+    bot: ChatBot,
+    message: str,
+    temperature: float,
+    debug: bool,
+    sources: List[str] = None,
+) -> dict:
+    """Answers a message and logs the interaction in each searched project."""
+    result = bot.generate_response(
+        message, temperature, "Sim" if debug else "Não", sources=sources
+    )
+    for project_name in getattr(bot, "project_names", [bot.project_name]):
+        save_log(project_name, message, result)
+    return result
+
+
+def stream_answer(
+    bot: ChatBot,
+    message: str,
+    temperature: float,
+    debug: bool,
+    sources: List[str] = None,
+) -> Iterator[str]:
+    """
+    Answers a message as Server-Sent Events: `debug` messages, then one `token`
+    event per text delta and a final `result` event with the response dict
+    (`error` if the answer fails). The interaction is logged at the end.
+    """
+    try:
+        response_stream = bot.generate_response(
+            message, temperature, "Sim" if debug else "Não", stream=True, sources=sources
+        )
+        for debug_message in bot.debug_messages:
+            yield sse_event("debug", debug_message)
+        for token in response_stream:
+            yield sse_event("token", token)
+        result = response_stream.result
+    except Exception as e:
+        yield sse_event("error", str(e))
+        return
+
+    for project_name in getattr(bot, "project_names", [bot.project_name]):
+        save_log(project_name, message, result)
+    yield sse_event("result", result)
+
+
+def batch_answers(
+    bot: ChatBot,
+    questions: List[str],
+    temperature: float,
+    sources: List[str] = None,
+    max_concurrency: int = None,
+) -> Iterator[str]:
+    """
+    Answers a batch of questions as NDJSON: one line per question, in input
+    order, each with its `index`, `question` and response dict (or `error`).
+    Each interaction is logged as it is answered.
+    """
+    try:
+        for result in bot.generate_batch(questions, temperature, sources, max_concurrency):
+            if "error" not in result:
+                for project_name in getattr(bot, "project_names", [bot.project_name]):
+                    save_log(project_name, result["question"], result)
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
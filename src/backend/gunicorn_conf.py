@@ -0,0 +1,97 @@
+"""
+Gunicorn configuration of the API (multi-worker serving).
+
+The app, the embedding model and the project indexes are loaded once in the
+master process and the workers are forked from it, so the model weights and
+indexes are shared copy-on-write instead of being loaded once per worker.
+Workers are recycled after `GUNICORN_MAX_REQUESTS` requests (with jitter, so
+they do not restart together); a recycled worker is forked again from the
+preloaded master, so it starts warm. Each worker has its own LLM gateway, so
+the LLM limits of `artifacts.yaml` (requests and tokens per minute,
+concurrency), which are the provider's global limits, are split evenly
+among the workers.
+
+Usage (with `src` on the PYTHONPATH):
+    gunicorn backend.api:app -c python:backend.gunicorn_conf
+
+Environment variables:
+    WEB_CONCURRENCY: number of workers (default: number of CPUs).
+    GUNICORN_BIND: address to bind (default: 0.0.0.0:8000).
+    GUNICORN_MAX_REQUESTS / GUNICORN_MAX_REQUESTS_JITTER: worker recycling.
+    GUNICORN_TIMEOUT / GUNICORN_GRACEFUL_TIMEOUT: seconds.
+    GUNICORN_PRELOAD_PROJECTS: preload the project indexes (default: 1).
+    WORKER_THREADS: torch/FAISS threads per worker (default: CPUs / workers).
+"""
+
+import multiprocessing
+import gc
+import os
+
+# tokenizers' thread pool does not survive fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# graceful recycling (bounds memory growth of long-lived workers)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def set_threads(num_threads: int) -> None:
+    """Sets the intra-op threads of torch and FAISS (OpenMP)."""
+    try:
+        import torch
+
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    try:
+        import faiss
+
+        faiss.omp_set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
+def when_ready(server) -> None:
+    """Preloads models and indexes in the master, before the workers are forked."""
+    # single-threaded in the master: OpenMP thread pools are not fork-safe
+    set_threads(1)
+
+    if os.getenv("GUNICORN_PRELOAD_PROJECTS", "1") == "1":
+        from backend.api import PARAMETERS
+        from backend.chat import preload_projects
+
+        loaded = preload_projects(PARAMETERS)
+        server.log.info("Preloaded %d projects: %s", len(loaded), ", ".join(loaded))
+
+    # move everything loaded so far to the permanent generation: the garbage
+    # collector no longer touches these objects, so their pages stay shared
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker) -> None:
+    """Resets the per-process state inherited from the master."""
+    from helper_registry import INDEX_REGISTRY
+    from helper_llm import set_llm_gateway_processes
+
+    INDEX_REGISTRY.after_fork()
+    # the LLM limits in artifacts.yaml are global: each worker gets its share
+    set_llm_gateway_processes(workers)
+    set_threads(
+        int(
+            os.getenv(
+                "WORKER_THREADS", max(1, multiprocessing.cpu_count() // max(1, workers))
+            )
+        )
+    )
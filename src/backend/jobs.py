@@ -0,0 +1,369 @@
+"""
+Background jobs of the API: summaries and CV evaluations of large uploads,
+which do not fit in a single request.
+
+A job is a directory in `JOBS_DIR` with its state (`job.json`), its uploaded
+files (`inputs`) and one result file per item (`results`), written as soon as
+the item is processed. The state is on disk, so a job can be followed from
+any worker and after a page reload, and a job interrupted by a worker restart
+is resumed by the next scan, skipping the items that already have a result.
+Each job is processed by a single process at a time (file lock).
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from helper_methods import CACHE_DIR, extract_text_from_file
+from backend.recruit import list_cv_pdfs, process_pdf
+from backend.summarizer import Summarizer
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import threading
+import shutil
+import json
+import uuid
+import re
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, no lock needed
+    fcntl = None
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(CACHE_DIR, "jobs"))
+
+JOB_KINDS = ("summarize", "recruit")
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED = "queued", "running", "done", "failed"
+
+ALL_DOCS = "_All_Docs_"
+
+
+class JobNotFoundError(Exception):
+    """Raised when a job id does not exist."""
+
+
+def write_json(path: str, data: dict) -> None:
+    """Writes a JSON file atomically (readers never see a partial file)."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_json(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def now() -> str:
+    return datetime.now().isoformat()
+
+
+class JobManager:
+    """
+    Creates, runs and reports the background jobs. Each process runs its jobs
+    in a small thread pool (`jobs_workers` jobs at a time, `jobs_item_concurrency`
+    items of a job at a time) and rescans the jobs dir every `jobs_scan_seconds`
+    to resume unfinished jobs no process is running.
+    """
+
+    def __init__(self, parameters: dict, jobs_dir: str = JOBS_DIR) -> None:
+        self.parameters = parameters
+        self.jobs_dir = jobs_dir
+        self.workers = int(parameters.get("jobs_workers", 2))
+        self.item_concurrency = int(parameters.get("jobs_item_concurrency", 4))
+        self.scan_seconds = float(parameters.get("jobs_scan_seconds", 30))
+        self.retention = timedelta(days=float(parameters.get("jobs_retention_days", 7)))
+        self.executor = None
+        self.active = set()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def job_dir(self, job_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+            raise JobNotFoundError(f"Tarefa não encontrada: {job_id}")
+        return os.path.join(self.jobs_dir, job_id)
+
+    def state_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), "job.json")
+
+    def read_state(self, job_id: str) -> dict:
+        try:
+            return read_json(self.state_path(job_id))
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise JobNotFoundError(f"Tarefa não encontrada: {job_id}")
+
+    def write_state(self, state: dict) -> None:
+        state["updated"] = now()
+        write_json(self.state_path(state["id"]), state)
+
+    def start(self) -> None:
+        """
+        Starts the worker pool and the scanner of this process (called in each
+        API worker, after the fork) and resumes the unfinished jobs.
+        """
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.stopping.clear()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="api-jobs"
+        )
+        threading.Thread(target=self.scan_loop, name="api-jobs-scan", daemon=True).start()
+
+    def stop(self) -> None:
+        """Stops taking items; running jobs are left to be resumed later."""
+        self.stopping.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def scan_loop(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                self.scan()
+            except Exception:
+                pass
+            self.stopping.wait(self.scan_seconds)
+
+    def scan(self) -> None:
+        """Resumes the unfinished jobs and removes the expired ones."""
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            try:
+                state = self.read_state(job_id)
+            except JobNotFoundError:
+                # still being uploaded, or an upload interrupted before `submit`
+                self.remove_orphan(job_id)
+                continue
+            if state["status"] in (JOB_QUEUED, JOB_RUNNING):
+                self.schedule(job_id)
+            elif datetime.now() - datetime.fromisoformat(state["updated"]) > self.retention:
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def remove_orphan(self, job_id: str) -> None:
+        """Removes a job dir without state once it is older than the retention."""
+        try:
+            job_dir = self.job_dir(job_id)
+            modified = datetime.fromtimestamp(os.path.getmtime(job_dir))
+        except (JobNotFoundError, FileNotFoundError):
+            return  # not a job dir
+        if datetime.now() - modified > self.retention:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def create(self) -> Tuple[str, str]:
+        """
+        Creates the directory of a new job.
+
+        Returns:
+            Tuple[str, str]: The job id and the dir to save its uploaded files in.
+        """
+        job_id = uuid.uuid4().hex
+        inputs_dir = os.path.join(self.job_dir(job_id), "inputs")
+        os.makedirs(inputs_dir)
+        os.makedirs(os.path.join(self.job_dir(job_id), "results"))
+        return job_id, inputs_dir
+
+    def submit(self, job_id: str, kind: str, options: dict) -> dict:
+        """
+        Queues a job whose files were saved in its `inputs` dir.
+
+        Args:
+            job_id (str): Id returned by `create`.
+            kind (str): `summarize` or `recruit`.
+            options (dict): Form fields of the job (word limit, job title...).
+
+        Returns:
+            dict: The job status.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Tipo de tarefa inválido: {kind}")
+        state = {
+            "id": job_id,
+            "kind": kind,
+            "status": JOB_QUEUED,
+            "created": now(),
+            "options": options,
+            "items": None,
+            "total": 0,
+            "completed": 0,
+            "error": None,
+        }
+        self.write_state(state)
+        self.schedule(job_id)
+        return self.status(job_id)
+
+    def schedule(self, job_id: str) -> None:
+        with self.lock:
+            if job_id in self.active or self.executor is None or self.stopping.is_set():
+                return
+            self.active.add(job_id)
+        try:
+            self.executor.submit(self.run, job_id)
+        except RuntimeError:  # shutting down
+            with self.lock:
+                self.active.discard(job_id)
+
+    def status(self, job_id: str) -> dict:
+        """Returns the progress of a job (raises JobNotFoundError)."""
+        state = self.read_state(job_id)
+        return {
+            key: state[key]
+            for key in ("id", "kind", "status", "total", "completed", "error", "created", "updated")
+        }
+
+    def result(self, job_id: str) -> dict:
+        """
+        Returns the results of a job, in the format of the synchronous endpoints
+        (`summaries` or `data`). Unfinished jobs return the items processed so far.
+        """
+        state = self.read_state(job_id)
+        results = self.read_results(job_id, state.get("items") or [])
+        response = {"status": state["status"], "error": state["error"]}
+        if state["kind"] == "summarize":
+            response["summaries"] = {
+                item: result["result"]
+                for item, result in results
+                if result.get("result")
+            }
+            response["errors"] = {
+                item: result["error"] for item, result in results if result.get("error")
+            }
+        else:
+            response["data"] = [result["result"] for _, result in results]
+        return response
+
+    def read_results(self, job_id: str, items: List[str]) -> List[Tuple[str, dict]]:
+        results = []
+        for index, item in enumerate(items):
+            try:
+                results.append((item, read_json(self.result_path(job_id, index))))
+            except FileNotFoundError:
+                continue
+        return results
+
+    def result_path(self, job_id: str, index: int) -> str:
+        return os.path.join(self.job_dir(job_id), "results", f"{index:06d}.json")
+
+    def run(self, job_id: str) -> None:
+        """Runs (or resumes) a job, if no other process is running it."""
+        lock_file = None
+        try:
+            lock_file = open(os.path.join(self.job_dir(job_id), "lock"), "w")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return  # another process is running it
+
+            # re-read under the lock: the job may have finished meanwhile
+            state = self.read_state(job_id)
+            if state["status"] not in (JOB_QUEUED, JOB_RUNNING):
+                return
+            state["status"] = JOB_RUNNING
+            self.write_state(state)
+            self.process(state)
+        except JobNotFoundError:
+            pass
+        finally:
+            if lock_file is not None:
+                lock_file.close()  # releases the lock
+            with self.lock:
+                self.active.discard(job_id)
+
+    def process(self, state: dict) -> None:
+        job_id = state["id"]
+        job_dir = self.job_dir(job_id)
+        inputs_dir = os.path.join(job_dir, "inputs")
+        try:
+            if state["items"] is None:
+                state["items"], state["paths"] = self.plan(state, inputs_dir, job_dir)
+                state["total"] = len(state["items"])
+                self.write_state(state)
+
+            pending = [
+                index
+                for index in range(len(state["items"]))
+                if not os.path.exists(self.result_path(job_id, index))
+            ]
+            state["completed"] = state["total"] - len(pending)
+            self.write_state(state)
+
+            with ThreadPoolExecutor(max_workers=self.item_concurrency) as executor:
+                futures = {
+                    executor.submit(self.process_item, state, index): index
+                    for index in pending
+                }
+                for future in as_completed(futures):
+                    if future.result() is None:
+                        continue  # not processed (stopping)
+                    write_json(self.result_path(job_id, futures[future]), future.result())
+                    state["completed"] += 1
+                    self.write_state(state)
+
+            if self.stopping.is_set() and state["completed"] < state["total"]:
+                return  # left running, resumed by the next process
+
+            state["status"] = JOB_DONE
+        except Exception as e:
+            state["status"] = JOB_FAILED
+            state["error"] = str(e)
+
+        self.write_state(state)
+        shutil.rmtree(inputs_dir, ignore_errors=True)
+        shutil.rmtree(os.path.join(job_dir, "extracted"), ignore_errors=True)
+
+    def plan(self, state: dict, inputs_dir: str, job_dir: str) -> Tuple[List[str], List]:
+        """
+        Lists the items of a job (stored in its state, so a resumed job
+        processes the same items in the same order).
+
+        Returns:
+            Tuple[List[str], List]: The item names and the files of each item
+            (relative to the job dir).
+        """
+        file_paths = [
+            os.path.join(inputs_dir, f) for f in sorted(os.listdir(inputs_dir))
+        ]
+        if state["kind"] == "recruit":
+            paths = list_cv_pdfs(file_paths, os.path.join(job_dir, "extracted"))
+            items = [os.path.basename(path) for path in paths]
+            paths = [os.path.relpath(path, job_dir) for path in paths]
+        elif state["options"]["summarize_all"]:
+            items = [ALL_DOCS]
+            paths = [[os.path.relpath(path, job_dir) for path in file_paths]]
+        else:
+            items = [os.path.basename(path) for path in file_paths]
+            paths = [os.path.relpath(path, job_dir) for path in file_paths]
+        return items, paths
+
+    def process_item(self, state: dict, index: int) -> Optional[dict]:
+        """Processes one item of a job (a CV, a document or all documents)."""
+        if self.stopping.is_set():
+            return None
+
+        job_dir = self.job_dir(state["id"])
+        options = state["options"]
+        paths = state["paths"][index]
+
+        if state["kind"] == "recruit":
+            result = process_pdf(
+                os.path.join(job_dir, paths),
+                options["job_title"],
+                options["job_description"],
+                self.parameters,
+            )
+            return {"item": state["items"][index], "result": result}
+
+        try:
+            if isinstance(paths, list):
+                extractions = [
+                    extract_text_from_file(os.path.join(job_dir, path)) for path in paths
+                ]
+                text = "".join(
+                    f"{extraction}\n\n" for extraction in extractions if extraction
+                )
+            else:
+                text = extract_text_from_file(os.path.join(job_dir, paths))
+            summary = None
+            if (text or "").strip():
+                summary = Summarizer(self.parameters).summarize_text(
+                    text, options["word_limit"], options["additional_info"]
+                )
+            return {"item": state["items"][index], "result": summary}
+        except Exception as e:
+            return {"item": state["items"][index], "result": None, "error": str(e)}
@@ -0,0 +1,154 @@
+"""
+Performance metrics of the API, aggregated across its worker processes.
+
+Each worker keeps its own counters (guardrail, query-embedding cache, index
+registry, LLM gateway), so every worker writes a snapshot of them to
+`METRICS_DIR` every `metrics_snapshot_seconds`; the metrics endpoint sums the
+snapshots of the live workers (snapshots not refreshed for a few intervals
+belong to workers that exited and are removed).
+"""
+
+from helper_llm import get_llm_gateway_stats, get_llm_gateway_usage
+from helper_guardrail import GUARDRAIL_METRICS, GuardrailMetrics
+from helper_cache import QUERY_EMBEDDING_CACHE
+from helper_registry import INDEX_REGISTRY
+from backend.jobs import read_json, write_json
+from helper_methods import CACHE_DIR
+import threading
+import time
+import json
+import os
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(CACHE_DIR, "metrics"))
+
+# LLM gateway fields that are not summed across workers
+LLM_DERIVED_FIELDS = ("wait_time_avg", "wait_time_max", "cache_hit_rate")
+
+
+def process_metrics() -> dict:
+    """Returns the raw counters of this process."""
+    registry = INDEX_REGISTRY.stats()
+    guardrail = GUARDRAIL_METRICS.stats()
+    return {
+        "pid": os.getpid(),
+        "time": time.time(),
+        "guardrail": {outcome: guardrail[outcome] for outcome in GuardrailMetrics.OUTCOMES},
+        "query_cache": QUERY_EMBEDDING_CACHE.stats(),
+        "registry": {
+            "indexes": len(registry["indexes"]),
+            "memory_bytes": registry["memory_bytes"],
+            "max_memory_bytes": registry["max_memory_bytes"],
+        },
+        "llm": get_llm_gateway_stats(),
+        "llm_usage": get_llm_gateway_usage(),
+    }
+
+
+def aggregate(snapshots: list) -> dict:
+    """
+    Sums the counters of several processes, recomputing the rates.
+
+    Args:
+        snapshots (list): Results of `process_metrics` of each process.
+
+    Returns:
+        dict: `workers`, `guardrail`, `query_cache`, `registry` (per worker),
+        `llm` and `llm_usage`, in the format of the per-process stats.
+    """
+    guardrail = GuardrailMetrics()
+    for snapshot in snapshots:
+        for outcome, count in snapshot["guardrail"].items():
+            guardrail.counts[outcome] = guardrail.counts.get(outcome, 0) + count
+
+    hits = sum(s["query_cache"]["hits"] for s in snapshots)
+    misses = sum(s["query_cache"]["misses"] for s in snapshots)
+    query_cache = {
+        "size": sum(s["query_cache"]["size"] for s in snapshots),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+    llm = {}
+    for snapshot in snapshots:
+        for field, value in snapshot["llm"].items():
+            if field not in LLM_DERIVED_FIELDS:
+                llm[field] = llm.get(field, 0) + value
+    if llm:
+        llm["wait_time_max"] = max(s["llm"].get("wait_time_max", 0.0) for s in snapshots)
+        llm["wait_time_avg"] = (
+            llm["wait_time_total"] / llm["requests"] if llm["requests"] else 0.0
+        )
+        llm["cache_hit_rate"] = (
+            llm["cached_tokens"] / llm["prompt_tokens"] if llm["prompt_tokens"] else 0.0
+        )
+
+    return {
+        "workers": len(snapshots),
+        "guardrail": guardrail.stats(),
+        "query_cache": query_cache,
+        "registry": [{"pid": s["pid"], **s["registry"]} for s in snapshots],
+        "llm": llm,
+        "llm_usage": [call for s in snapshots for call in s["llm_usage"]],
+    }
+
+
+class MetricsReporter:
+    """Writes the snapshots of this process and aggregates those of all workers."""
+
+    def __init__(self, parameters: dict, metrics_dir: str = METRICS_DIR) -> None:
+        self.metrics_dir = metrics_dir
+        self.interval = float(parameters.get("metrics_snapshot_seconds", 10))
+        self.stopping = threading.Event()
+
+    def snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.metrics_dir, f"{pid}.json")
+
+    def write_snapshot(self) -> dict:
+        snapshot = process_metrics()
+        write_json(self.snapshot_path(snapshot["pid"]), snapshot)
+        return snapshot
+
+    def start(self) -> None:
+        """Starts writing the snapshots of this process (called in each API worker)."""
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        self.stopping.clear()
+        threading.Thread(target=self.loop, name="api-metrics", daemon=True).start()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        try:
+            os.remove(self.snapshot_path(os.getpid()))
+        except FileNotFoundError:
+            pass
+
+    def loop(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                self.write_snapshot()
+            except Exception:
+                pass
+            self.stopping.wait(self.interval)
+
+    def collect(self) -> dict:
+        """Returns the metrics summed across the live workers."""
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        own = self.write_snapshot()
+        snapshots = [own]
+        for name in os.listdir(self.metrics_dir):
+            path = os.path.join(self.metrics_dir, name)
+            if not name.endswith(".json") or name == f"{own['pid']}.json":
+                continue
+            try:
+                snapshot = read_json(path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            if time.time() - snapshot["time"] > 3 * self.interval:
+                # worker exited (or hung): its counters are gone with it
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            snapshots.append(snapshot)
+        return aggregate(snapshots)
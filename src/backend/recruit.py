@@ -1,8 +1,10 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from helper_methods import get_llm_response
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from helper_methods import aget_llm_response, get_llm_response
+from helper_llm import PRIORITY_BULK
 from prompts.prompts import PROMPT_CV
 import tempfile
 import zipfile
+import asyncio
 import PyPDF2
 import json
 import os
@@ -14,16 +16,31 @@ def extract_text_from_pdf(pdf_path: str) -> str:
         return "".join(page.extract_text() for page in reader.pages)
 
 
-def llm_extract_cv_details(
-    cv_text: str, job_title: str, job_description: str, parameters: dict
-) -> dict:
-    prompt = (
+def build_cv_prompt(cv_text: str, job_title: str, job_description: str) -> str:
+    return (
         PROMPT_CV.replace("<titulo>", job_title)
         .replace("<descricao>", job_description)
         .replace("<cv_text>", cv_text)
     )
-    response = get_llm_response(prompt, parameters, 0)
 
+
+def llm_extract_cv_details(
+    cv_text: str, job_title: str, job_description: str, parameters: dict
+) -> dict:
+    prompt = build_cv_prompt(cv_text, job_title, job_description)
+    response = get_llm_response(prompt, parameters, 0, PRIORITY_BULK)
+    return parse_cv_details(response)
+
+
+async def allm_extract_cv_details(
+    cv_text: str, job_title: str, job_description: str, parameters: dict
+) -> dict:
+    prompt = build_cv_prompt(cv_text, job_title, job_description)
+    response = await aget_llm_response(prompt, parameters, 0, PRIORITY_BULK)
+    return parse_cv_details(response)
+
+
+def parse_cv_details(response: str) -> dict:
     try:
         return json.loads(response)
     except Exception:
@@ -44,24 +61,39 @@ def process_pdf(
         return {"error": str(e)}
 
 
-def process_cv_files(
-    file_paths: list, job_title: str, job_description: str, parameters: dict
-) -> list:
+def list_cv_pdfs(file_paths: list, extract_dir: str = None) -> list:
+    """
+    Returns the PDFs to evaluate. Zip files are extracted to a temporary dir, or
+    to a subdir of `extract_dir` named after the zip when it is given.
+    """
     all_pdfs = []
 
     for path in file_paths:
         if path.endswith(".zip"):
             with zipfile.ZipFile(path, "r") as zip_ref:
-                extract_dir = tempfile.mkdtemp()
-                zip_ref.extractall(extract_dir)
+                if extract_dir is None:
+                    zip_dir = tempfile.mkdtemp()
+                else:
+                    zip_dir = os.path.join(
+                        extract_dir, os.path.splitext(os.path.basename(path))[0]
+                    )
+                    os.makedirs(zip_dir, exist_ok=True)
+                zip_ref.extractall(zip_dir)
                 pdfs = [
-                    os.path.join(extract_dir, f)
-                    for f in os.listdir(extract_dir)
+                    os.path.join(zip_dir, f)
+                    for f in sorted(os.listdir(zip_dir))
                     if f.endswith(".pdf")
                 ]
                 all_pdfs.extend(pdfs)
         elif path.endswith(".pdf"):
             all_pdfs.append(path)
+    return all_pdfs
+
+
+def process_cv_files(
+    file_paths: list, job_title: str, job_description: str, parameters: dict
+) -> list:
+    all_pdfs = list_cv_pdfs(file_paths)
 
     results = []
     with ThreadPoolExecutor(max_workers=5) as executor:
@@ -73,3 +105,30 @@ def process_cv_files(
             results.append(future.result())
 
     return results
+
+
+async def aprocess_cv_files(
+    file_paths: list,
+    job_title: str,
+    job_description: str,
+    parameters: dict,
+    executor: Executor = None,
+) -> list:
+    """
+    Async version of `process_cv_files`, for the API's event loop: unzipping
+    and PDF parsing run in `executor` and the CVs are evaluated concurrently
+    (the LLM gateway bounds the requests in flight).
+    """
+    loop = asyncio.get_running_loop()
+    all_pdfs = await loop.run_in_executor(executor, list_cv_pdfs, file_paths)
+
+    async def process(pdf_path: str) -> dict:
+        try:
+            cv_text = await loop.run_in_executor(executor, extract_text_from_pdf, pdf_path)
+            return await allm_extract_cv_details(
+                cv_text, job_title, job_description, parameters
+            )
+        except Exception as e:
+            return {"error": str(e)}
+
+    return list(await asyncio.gather(*(process(pdf) for pdf in all_pdfs)))
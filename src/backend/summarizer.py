@@ -1,21 +1,77 @@
 from helper_methods import (
+    aget_llm_response,
     get_llm_response,
     extract_text_from_file,
 )
+from helper_llm import PRIORITY_BULK
 from prompts.prompts import PROMPT_SUMMARIZER
+from concurrent.futures import Executor
+import asyncio
 
 
 class Summarizer:
     def __init__(self, parameters):
         self.parameters = parameters
 
-    def summarize_text(self, text, word_limit, additional_info):
+    @staticmethod
+    def build_prompt(text, word_limit, additional_info):
         if additional_info:
             additional_info = f"Informações adicionais: {additional_info}"
-        prompt = PROMPT_SUMMARIZER.format(
+        return PROMPT_SUMMARIZER.format(
             text=text, word_limit=word_limit, additional_info=additional_info
         )
-        return get_llm_response(prompt, self.parameters, 0)
+
+    def summarize_text(self, text, word_limit, additional_info):
+        prompt = self.build_prompt(text, word_limit, additional_info)
+        return get_llm_response(prompt, self.parameters, 0, PRIORITY_BULK)
+
+    async def asummarize_text(self, text, word_limit, additional_info):
+        prompt = self.build_prompt(text, word_limit, additional_info)
+        return await aget_llm_response(prompt, self.parameters, 0, PRIORITY_BULK)
+
+    async def aprocess_documents(
+        self,
+        file_paths,
+        word_limit,
+        summarize_all,
+        additional_info,
+        executor: Executor = None,
+    ):
+        """
+        Async version of `process_documents`, for the API's event loop: text
+        extraction runs in `executor` (blocking parsers) and the documents are
+        summarized concurrently.
+        """
+        loop = asyncio.get_running_loop()
+        extractions = await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, extract_text_from_file, f)
+                for f in file_paths
+            )
+        )
+
+        summaries = {}
+        if summarize_all:
+            combined = "".join(
+                f"{extraction}\n\n" for extraction in extractions if extraction
+            )
+            summaries["_All_Docs_"] = await self.asummarize_text(
+                combined, word_limit, additional_info
+            )
+        else:
+            documents = {
+                f.split("\\")[-1]: extraction
+                for f, extraction in zip(file_paths, extractions)
+                if extraction
+            }
+            results = await asyncio.gather(
+                *(
+                    self.asummarize_text(extraction, word_limit, additional_info)
+                    for extraction in documents.values()
+                )
+            )
+            summaries = dict(zip(documents, results))
+        return summaries
 
     def process_documents(self, file_paths, word_limit, summarize_all, additional_info):
         summaries = {}
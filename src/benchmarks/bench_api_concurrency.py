@@ -0,0 +1,112 @@
+"""
+Load test of the summarize endpoint: sends concurrent requests and, at the
+same time, pings a light endpoint to measure how responsive the event loop
+stays. With blocking handlers the requests are served one at a time and the
+pings wait behind them; with non-blocking handlers the requests overlap.
+
+By default the API runs in-process with a fake LLM (fixed latency, no API key
+needed), so only the server's concurrency is measured. Use `--url` to test a
+running server with the real LLM instead.
+
+Usage (from the `src` directory):
+    python -m benchmarks.bench_api_concurrency [--concurrency 1 4 16] [--llm-latency 0.5]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import statistics
+import threading
+import argparse
+import requests
+import asyncio
+import time
+
+DOCUMENT = "O colaborador deve solicitar o reembolso em até 30 dias. " * 200
+
+
+def start_local_server(port: int, llm_latency: float) -> str:
+    """Starts the API in a background thread, with a fake LLM of fixed latency."""
+    import helper_llm
+    import uvicorn
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            await asyncio.sleep(llm_latency)
+            message = SimpleNamespace(content="Resumo.")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    helper_llm.get_llm_client = lambda parameters: fake_client
+
+    from backend.api import app
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{url}/metrics/llm", timeout=1)
+            return url
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise TimeoutError("server did not start")
+
+
+def summarize(url: str, parameters: dict) -> float:
+    started = time.time()
+    response = requests.post(
+        f"{url}/summarize/",
+        data={
+            "word_limit": 100,
+            "summarize_all": False,
+            "additional_info": "",
+            "parameters": str(parameters),
+        },
+        files=[("files", (f"doc{i}.txt", DOCUMENT.encode("utf-8"))) for i in range(3)],
+    )
+    response.raise_for_status()
+    return time.time() - started
+
+
+def run(url: str, concurrency: int, parameters: dict) -> None:
+    pings = []
+    done = threading.Event()
+
+    def ping() -> None:
+        while not done.is_set():
+            started = time.time()
+            requests.get(f"{url}/metrics/llm")
+            pings.append(time.time() - started)
+            time.sleep(0.05)
+
+    pinger = threading.Thread(target=ping)
+    pinger.start()
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda _: summarize(url, parameters), range(concurrency)))
+    elapsed = time.time() - started
+    done.set()
+    pinger.join()
+
+    print(
+        f"concurrency={concurrency:3d} wall={elapsed:6.2f}s "
+        f"throughput={concurrency / elapsed:6.2f} req/s "
+        f"latency_avg={statistics.mean(latencies):6.2f}s "
+        f"ping_p50={statistics.median(pings) * 1000:7.1f}ms ping_max={max(pings) * 1000:7.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    from helper_methods import load_parameters
+
+    parameters = load_parameters()
+    url = args.url or start_local_server(args.port, args.llm_latency)
+    for concurrency in args.concurrency:
+        run(url, concurrency, parameters)
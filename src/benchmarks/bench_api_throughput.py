@@ -0,0 +1,119 @@
+"""
+Throughput and memory of the API served by gunicorn with 1..N pre-forked
+workers. Each run starts the server with `WEB_CONCURRENCY` workers, sends
+retrieval requests (`/chat/{project}/search`, no LLM calls) from concurrent
+clients and reports requests/s together with the memory of the whole server:
+RSS (counts shared pages once per process) and PSS (shared pages split
+between the processes that map them, i.e. the real footprint).
+
+Usage (from the `src` directory, with a project that has a vector index):
+    python -m benchmarks.bench_api_throughput <project> [--workers 1 2 4] [--requests 400]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import subprocess
+import argparse
+import requests
+import time
+import sys
+import os
+
+QUERIES = [
+    "Qual o horário de funcionamento do RH durante o feriado?",
+    "Como solicitar o reembolso de despesas de viagem nacional?",
+    "Quais documentos são necessários para a admissão?",
+    "Qual o prazo para pedir férias?",
+    "Como funciona o auxílio home office?",
+]
+
+
+def process_tree(pid: int) -> list:
+    """Returns the pid of a process and of its children (Linux)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r") as f:
+            for child in f.read().split():
+                pids.extend(process_tree(int(child)))
+    except FileNotFoundError:
+        pass
+    return pids
+
+
+def memory_mb(pid: int) -> tuple:
+    """Returns the (RSS, PSS) of a process tree in MB (Linux)."""
+    rss = pss = 0
+    for child in process_tree(pid):
+        try:
+            with open(f"/proc/{child}/smaps_rollup", "r") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+                    elif line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+    return rss / 1024, pss / 1024
+
+
+def wait_ready(url: str, timeout: float = 300) -> None:
+    started = time.time()
+    while time.time() - started < timeout:
+        try:
+            requests.get(f"{url}/metrics/llm", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(1)
+    raise TimeoutError("server did not start")
+
+
+def run(project: str, workers: int, num_requests: int, port: int) -> None:
+    url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "GUNICORN_MAX_REQUESTS": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "backend.api:app", "-c", "python:backend.gunicorn_conf"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(url)
+        endpoint = f"{url}/chat/{quote(project, safe='')}/search"
+
+        def search(i: int) -> int:
+            return requests.post(endpoint, json={"query": f"{QUERIES[i % len(QUERIES)]} {i}"}).status_code
+
+        # warm-up (one request per worker at least)
+        with ThreadPoolExecutor(max_workers=workers * 4) as executor:
+            list(executor.map(search, range(workers * 8)))
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=workers * 4) as executor:
+            statuses = list(executor.map(search, range(num_requests)))
+        elapsed = time.time() - started
+
+        rss, pss = memory_mb(server.pid)
+        errors = sum(status != 200 for status in statuses)
+        print(
+            f"workers={workers:2d} throughput={num_requests / elapsed:8.1f} req/s "
+            f"errors={errors:3d} rss={rss:8.1f}MB pss={pss:8.1f}MB"
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("project")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    for num_workers in args.workers:
+        run(args.project, num_workers, args.requests, args.port)
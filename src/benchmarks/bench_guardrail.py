@@ -0,0 +1,58 @@
+"""
+Benchmark of the offensive-word guardrail: per-word regex loop (previous
+implementation) vs. the precompiled matcher in `helper_guardrail`.
+
+Usage (from the `src` directory):
+    python -m benchmarks.bench_guardrail
+"""
+
+from helper_guardrail import OffensiveWordMatcher
+from parameters.offensive_words import LIST_OFFENSIVE_WORDS
+from unidecode import unidecode
+import timeit
+import re
+
+# (text, whether it contains an offensive word)
+TEXTS = [
+    ("Qual o horário de funcionamento do RH durante o feriado?", False),
+    (
+        "Preciso saber como solicitar o reembolso de despesas de viagem nacional. "
+        * 20,
+        False,
+    ),
+    ("Esse sistema é uma merda, ninguém me responde", True),
+]
+
+
+def legacy_search(text: str, words) -> bool:
+    """Previous implementation: compiles and runs one regex per word."""
+    text_clean = unidecode(text.lower())
+    for word in words:
+        if re.search(rf"\b{word}\b", text_clean):
+            return True
+    return False
+
+
+def run(number: int = 2000) -> None:
+    for list_size in [1, 10, 100]:
+        # the default list, padded to simulate larger lists (e.g. project-specific
+        # extra words)
+        words = list(LIST_OFFENSIVE_WORDS) + [
+            f"{word}{i}" for i in range(1, list_size) for word in LIST_OFFENSIVE_WORDS
+        ]
+        matcher = OffensiveWordMatcher(words)
+
+        for text, offensive in TEXTS:
+            assert legacy_search(text, words) == matcher.search(text) == offensive
+            legacy = timeit.timeit(lambda: legacy_search(text, words), number=number)
+            compiled = timeit.timeit(lambda: matcher.search(text), number=number)
+            print(
+                f"words={len(words):5d} text_len={len(text):5d} "
+                f"legacy={legacy / number * 1e6:9.1f}us "
+                f"compiled={compiled / number * 1e6:7.1f}us "
+                f"speedup={legacy / compiled:6.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,262 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+import numpy as np
+import threading
+import faiss
+import copy
+import re
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes a query for cache lookups (lowercase, collapsed whitespace)."""
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe LRU cache with hit/miss counters.
+    """
+
+    def __init__(self, max_size: int = 1024) -> None:
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_size (int): Maximum number of entries kept in the cache.
+        """
+        self.max_size = int(max_size)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def resize(self, max_size: int) -> None:
+        """Changes the maximum size, evicting the oldest entries if needed."""
+        with self._lock:
+            self.max_size = int(max_size)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value for `key`, counting a hit or a miss."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Stores a value, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns the size and hit/miss counters of the cache."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class QueryEmbeddingCache(LRUCache):
+    """
+    LRU cache of query embeddings, keyed on the embedding model name and the
+    normalized query text.
+    """
+
+    def get_or_compute(
+        self, model_name: str, query: str, embed: Callable[[str], list]
+    ) -> np.ndarray:
+        """
+        Returns the embedding of a query, computing it only on a cache miss.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            query (str): The user's query.
+            embed (Callable[[str], list]): Function that embeds a single text.
+
+        Returns:
+            np.ndarray: The query embedding (float32).
+        """
+        query_norm = normalize_text(query)
+        key = (model_name, query_norm)
+        vector = self.get(key)
+        if vector is None:
+            vector = np.asarray(embed(query_norm), dtype=np.float32)
+            self.put(key, vector)
+        return vector
+
+    def get_or_compute_many(
+        self,
+        model_name: str,
+        queries: List[str],
+        embed_many: Callable[[List[str]], List[list]],
+    ) -> List[np.ndarray]:
+        """
+        Returns the embeddings of several queries, computing all cache misses in
+        a single batched call to the encoder.
+
+        Args:
+            model_name (str): Name of the embedding model.
+            queries (List[str]): The queries.
+            embed_many (Callable[[List[str]], List[list]]): Function that embeds a list of texts.
+
+        Returns:
+            List[np.ndarray]: The query embeddings (float32), in input order.
+        """
+        normalized = [normalize_text(query) for query in queries]
+        vectors = {query: self.get((model_name, query)) for query in set(normalized)}
+        missing = [query for query, vector in vectors.items() if vector is None]
+        if missing:
+            for query, vector in zip(missing, embed_many(missing)):
+                vectors[query] = np.asarray(vector, dtype=np.float32)
+                self.put((model_name, query), vectors[query])
+        return [vectors[query] for query in normalized]
+
+
+class SemanticAnswerCache:
+    """
+    Per-project cache of (query vector, response dict) pairs stored in a small
+    FAISS inner-product index, used to answer near-duplicate questions.
+    """
+
+    def __init__(self, signature: Tuple = None, max_entries: int = 500) -> None:
+        """
+        Initializes an empty cache.
+
+        Args:
+            signature (Tuple): Signature of the project index, prompt and model the
+                answers were built from.
+            max_entries (int): Maximum number of answers kept in the cache.
+        """
+        self.signature = signature
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None
+        self._vectors = []
+        self._entries = []
+
+    def lookup(
+        self,
+        query_vector: np.ndarray,
+        temperature: float,
+        threshold: float,
+        temperature_band: float,
+    ) -> dict:
+        """
+        Returns a cached response for a similar query, if there is one.
+
+        Args:
+            query_vector (np.ndarray): Embedding of the user's query.
+            temperature (float): Temperature requested for the response.
+            threshold (float): Minimum cosine similarity to reuse an answer.
+            temperature_band (float): Maximum temperature difference to reuse an answer.
+
+        Returns:
+            dict: A copy of the cached response dict, or None on a miss.
+        """
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            k = min(5, self._index.ntotal)
+            scores, ids = self._index.search(self._normalize(query_vector), k)
+            for score, idx in zip(scores[0], ids[0]):
+                if idx < 0 or score < threshold:
+                    break
+                entry = self._entries[idx]
+                if abs(entry["temperature"] - temperature) <= temperature_band:
+                    self.hits += 1
+                    return copy.deepcopy(entry["response"])
+
+            self.misses += 1
+            return None
+
+    def add(self, query_vector: np.ndarray, temperature: float, response: dict) -> None:
+        """Stores a response, evicting the oldest entries when the cache is full."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            vector = self._normalize(query_vector)
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(vector.shape[1])
+            self._vectors.append(vector[0])
+            self._entries.append(
+                {"temperature": temperature, "response": copy.deepcopy(response)}
+            )
+            self._index.add(vector)
+
+            if len(self._entries) > self.max_entries:
+                # drop the oldest 10% and rebuild the (small) index
+                drop = max(1, self.max_entries // 10)
+                self._vectors = self._vectors[drop:]
+                self._entries = self._entries[drop:]
+                self._index.reset()
+                self._index.add(np.vstack(self._vectors))
+
+    def stats(self) -> dict:
+        """Returns the size and hit/miss counters of the cache."""
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        """Reshapes to (1, d) float32 and L2-normalizes, so inner product is cosine similarity."""
+        vector = np.array(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+
+_semantic_caches: Dict[str, SemanticAnswerCache] = {}
+_semantic_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(
+    project_key: str, signature: Tuple, max_entries: int = 500
+) -> SemanticAnswerCache:
+    """
+    Returns the semantic answer cache of a project, replacing it with an empty
+    one when the signature changed (index rebuilt, prompt or model changed).
+
+    Args:
+        project_key (str): Unique key of the project (e.g. its index path).
+        signature (Tuple): Current signature of the project index, prompt and model.
+        max_entries (int): Maximum number of answers kept in the cache.
+
+    Returns:
+        SemanticAnswerCache: The project's cache.
+    """
+    with _semantic_caches_lock:
+        cache = _semantic_caches.get(project_key)
+        if cache is None or cache.signature != signature:
+            cache = SemanticAnswerCache(signature, max_entries)
+            _semantic_caches[project_key] = cache
+        cache.max_entries = int(max_entries)
+        return cache
+
+
+# Process-wide caches shared by all sessions
+QUERY_EMBEDDING_CACHE = QueryEmbeddingCache()
+RERANK_SCORE_CACHE = LRUCache(max_size=10_000)
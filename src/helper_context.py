@@ -0,0 +1,260 @@
+from helper_index import BM25Index, reciprocal_rank_fusion
+from helper_llm import count_tokens
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import re
+
+
+def strip_overlap(previous: str, current: str, max_overlap: int, min_overlap: int = 20) -> str:
+    """
+    Removes from `current` the prefix it shares with the end of `previous`
+    (the region duplicated by the splitter's `chunk_overlap`).
+
+    Args:
+        previous (str): Text of the preceding chunk.
+        current (str): Text of the following chunk.
+        max_overlap (int): Maximum overlap length (the splitter's `chunk_overlap`).
+        min_overlap (int): Shorter shared prefixes are kept (likely coincidences).
+
+    Returns:
+        str: `current` without the duplicated prefix.
+    """
+    longest = min(len(previous), len(current), int(max_overlap))
+    for length in range(longest, min_overlap - 1, -1):
+        if previous.endswith(current[:length]):
+            return current[length:].lstrip()
+    return current
+
+
+def document_label(chunk: dict) -> str:
+    """Returns the document name shown in the context (prefixed by its project, if any)."""
+    if chunk.get("project"):
+        return f"{chunk['project']}/{chunk['document']}"
+    return chunk["document"]
+
+
+def pack_context(
+    chunks: List[dict], token_budget: int, model_name: str, chunk_overlap: int
+) -> Tuple[str, List[dict], Dict[str, int]]:
+    """
+    Packs the retrieved chunks into a context that fits a token budget: chunks
+    are taken greedily in relevance order while they fit, adjacent chunks of the
+    same file are merged and the overlap duplicated between them is removed.
+
+    Args:
+        chunks (List[dict]): Retrieved chunks (best first) with `id`, `document` and `content`.
+        token_budget (int): Maximum number of context tokens.
+        model_name (str): Model whose tokenizer counts the tokens.
+        chunk_overlap (int): The splitter's `chunk_overlap` (characters).
+
+    Returns:
+        Tuple[str, List[dict], Dict[str, int]]: The context, the chunks it uses
+        (best first) and its token stats (`chunks`, `chunks_used`, `tokens_naive`,
+        `tokens`, `tokens_saved`).
+    """
+    # tokens the previous layout (every chunk in full, verbose headers) would use
+    tokens_naive = count_tokens(
+        "".join(
+            f"Documento: {document_label(chunk)}\n"
+            f"### Início do conteúdo do documento: {document_label(chunk)}\n{chunk['content']}\n"
+            f"### Fim do documento: {document_label(chunk)}\n\n"
+            for chunk in chunks
+        ),
+        model_name,
+    )
+
+    header_tokens = count_tokens("### Documento: \n\n", model_name)
+
+    # greedy selection by relevance; a chunk next to a selected one only costs its new text
+    selected: Dict[Tuple, dict] = {}
+    used_tokens = 0
+    for rank, chunk in enumerate(chunks):
+        key = (chunk.get("project"), chunk["document"], chunk.get("id", rank))
+        previous = selected.get(key[:2] + (key[2] - 1,))
+        text = chunk["content"]
+        if previous is not None:
+            text = strip_overlap(previous["content"], text, chunk_overlap)
+        cost = count_tokens(text, model_name)
+        if previous is None:
+            cost += header_tokens + count_tokens(document_label(chunk), model_name)
+        if used_tokens + cost > token_budget:
+            continue
+        used_tokens += cost
+        selected[key] = {**chunk, "rank": rank}
+
+    # merge runs of adjacent chunks of the same file, best run first
+    blocks = []
+    for key in sorted(selected, key=lambda k: (str(k[0]), k[1], k[2])):
+        chunk = selected[key]
+        last = blocks[-1] if blocks else None
+        if last and last["key"][:2] == key[:2] and last["key"][2] == key[2] - 1:
+            last["text"] += "\n" + strip_overlap(last["tail"], chunk["content"], chunk_overlap)
+            last["tail"] = chunk["content"]
+            last["key"] = key
+            last["rank"] = min(last["rank"], chunk["rank"])
+        else:
+            blocks.append(
+                {
+                    "key": key,
+                    "label": document_label(chunk),
+                    "text": chunk["content"],
+                    "tail": chunk["content"],
+                    "rank": chunk["rank"],
+                }
+            )
+    blocks.sort(key=lambda block: block["rank"])
+
+    context = "".join(f"### Documento: {block['label']}\n{block['text']}\n\n" for block in blocks)
+    tokens = count_tokens(context, model_name)
+    used_chunks = [chunks[rank] for rank in sorted(c["rank"] for c in selected.values())]
+    return context, used_chunks, {
+        "chunks": len(chunks),
+        "chunks_used": len(selected),
+        "tokens_naive": tokens_naive,
+        "tokens": tokens,
+        "tokens_saved": max(0, tokens_naive - tokens),
+    }
+
+
+def repair_kb_text(text: str) -> str:
+    """
+    Repairs KB files written with a newline after every character (older
+    ingestion joined the characters of the text), returning the original text.
+    """
+    if len(text) >= 3 and set(text[1::2]) == {"\n"}:
+        return text[::2]
+    return text
+
+
+def split_sections(text: str, max_chars: int = 1200, min_chars: int = 200) -> List[str]:
+    """
+    Splits a KB into sections: paragraphs (blank-line separated), long ones cut
+    into windows of whole sentences and short ones merged with the next.
+
+    Args:
+        text (str): The KB text.
+        max_chars (int): Maximum section length.
+        min_chars (int): Paragraphs shorter than this are merged with the next one.
+
+    Returns:
+        List[str]: The sections, in document order.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        window = ""
+        for sentence in re.split(r"(?<=[.!?;])\s+|\n", paragraph):
+            if window and len(window) + len(sentence) + 1 > max_chars:
+                pieces.append(window)
+                window = ""
+            window = f"{window} {sentence}".strip()
+        if window:
+            pieces.append(window)
+
+    sections = []
+    for piece in pieces:
+        if sections and len(sections[-1]) < min_chars and len(sections[-1]) + len(piece) <= max_chars:
+            sections[-1] = f"{sections[-1]}\n\n{piece}"
+        else:
+            sections.append(piece)
+    return sections
+
+
+class KBIndex:
+    """
+    In-memory index of the sections of a KB project (BM25 and, optionally,
+    embeddings), used to send only the sections relevant to each question.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        model_name: str,
+        embed_documents: Callable[[List[str]], List[List[float]]] = None,
+        max_chars: int = 1200,
+        min_chars: int = 200,
+    ) -> None:
+        """
+        Splits and indexes the KB.
+
+        Args:
+            text (str): The KB text.
+            model_name (str): Model whose tokenizer counts the tokens.
+            embed_documents (Callable): Batch embedding function (None: lexical only).
+            max_chars (int): Maximum section length.
+            min_chars (int): Minimum section length.
+        """
+        self.text = text
+        self.sections = split_sections(text, max_chars, min_chars)
+        self.tokens = [count_tokens(section, model_name) for section in self.sections]
+        self.tokens_full = count_tokens(text, model_name)
+        self.lexical = BM25Index.build(self.sections)
+        self.vectors = None
+        if embed_documents is not None and self.sections:
+            vectors = np.asarray(embed_documents(self.sections), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self.vectors = vectors / np.maximum(norms, 1e-12)
+
+    def select(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        token_budget: int,
+        min_similarity: float,
+        min_lexical_score: float = 3.0,
+    ) -> Optional[Tuple[str, Dict[str, int]]]:
+        """
+        Selects the sections relevant to a question (fused BM25 and embedding
+        ranking), packed into a token budget and kept in document order.
+
+        Args:
+            query (str): The user's question.
+            query_vector (np.ndarray): Embedding of the question (None: lexical only).
+            token_budget (int): Maximum number of KB tokens to send.
+            min_similarity (float): Minimum cosine similarity of the best section
+                to trust the embedding ranking.
+            min_lexical_score (float): Minimum BM25 score of the best section to
+                trust the lexical ranking (a single common word is not enough).
+
+        Returns:
+            Optional[Tuple[str, Dict[str, int]]]: The selected text and its stats, or
+            None when the full KB should be sent (small KB or low confidence).
+        """
+        if self.tokens_full <= token_budget or len(self.sections) < 2:
+            return None
+
+        rankings = []
+        lexical = self.lexical.search(query, len(self.sections))
+        confident = bool(lexical) and lexical[0][1] >= min_lexical_score
+        if lexical:
+            rankings.append([idx for idx, _ in lexical])
+
+        if self.vectors is not None and query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+            similarities = self.vectors @ (vector / max(np.linalg.norm(vector), 1e-12))
+            confident = confident or similarities.max() >= min_similarity
+            rankings.append(list(np.argsort(-similarities)))
+
+        # low confidence: no strong lexical match and no close section
+        if not confident:
+            return None
+
+        selected, used_tokens = [], 0
+        for idx, _ in reciprocal_rank_fusion(rankings):
+            if used_tokens + self.tokens[idx] <= token_budget:
+                selected.append(int(idx))
+                used_tokens += self.tokens[idx]
+
+        text = "\n\n".join(self.sections[idx] for idx in sorted(selected))
+        return text, {
+            "sections": len(self.sections),
+            "sections_used": len(selected),
+            "tokens_full": self.tokens_full,
+            "tokens": used_tokens,
+            "tokens_saved": self.tokens_full - used_tokens,
+        }
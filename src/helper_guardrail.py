@@ -0,0 +1,361 @@
+from parameters.offensive_words import LIST_OFFENSIVE_WORDS
+from parameters.guardrail_exemplars import (
+    LIST_ALLOWED_EXEMPLARS,
+    LIST_BLOCKED_EXEMPLARS,
+)
+from prompts.prompts import PROMPT_GUARDRAIL
+from unidecode import unidecode
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import threading
+import hashlib
+import sqlite3
+import time
+import re
+import os
+
+
+def normalize_guardrail_text(text: str) -> str:
+    """Normalizes text for the guardrail (lowercase, no accents, collapsed whitespace)."""
+    return re.sub(r"\s+", " ", unidecode(str(text).lower())).strip()
+
+
+def _trie_to_regex(node: dict) -> str:
+    """
+    Converts a character trie into a regex where shared prefixes are factored
+    out, so the regex engine never retries the same prefix for each word.
+    """
+    end = "" in node
+    branches = []
+    for char in sorted(key for key in node if key != ""):
+        char_regex = r"\s+" if char == " " else re.escape(char)
+        branches.append(char_regex + _trie_to_regex(node[char]))
+
+    if not branches:
+        return ""
+    if len(branches) == 1 and not end:
+        return branches[0]
+
+    regex = "(?:" + "|".join(branches) + ")"
+    return regex + "?" if end else regex
+
+
+class OffensiveWordMatcher:
+    """
+    Matches a list of offensive words and phrases in a single pass over the text,
+    using one precompiled trie-shaped regex over the `unidecode`d text.
+    """
+
+    def __init__(self, words: Iterable[str]) -> None:
+        """
+        Compiles the word list (duplicates and accents are removed).
+
+        Args:
+            words (Iterable[str]): Offensive words or multi-word phrases.
+        """
+        self.words: List[str] = sorted(
+            {normalize_guardrail_text(word) for word in words if str(word).strip()}
+        )
+
+        trie: dict = {}
+        for word in self.words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = True
+
+        self.pattern = (
+            re.compile(rf"\b{_trie_to_regex(trie)}\b") if self.words else None
+        )
+
+    def search(self, text: str) -> bool:
+        """
+        Checks whether the text contains any of the offensive words.
+
+        Args:
+            text (str): The user's input text.
+
+        Returns:
+            bool: True if an offensive word or phrase is found.
+        """
+        if self.pattern is None:
+            return False
+        return self.pattern.search(normalize_guardrail_text(text)) is not None
+
+
+DEFAULT_MATCHER = OffensiveWordMatcher(LIST_OFFENSIVE_WORDS)
+
+_project_matchers: Dict[str, Tuple[int, OffensiveWordMatcher]] = {}
+_project_matchers_lock = threading.Lock()
+
+
+def get_offensive_matcher(extra_words_path: str = None) -> OffensiveWordMatcher:
+    """
+    Returns the matcher for the default offensive words plus a project's extra
+    word list (one word or phrase per line), recompiled only when the file changes.
+
+    Args:
+        extra_words_path (str): Path to the project's `offensive_words.txt`.
+
+    Returns:
+        OffensiveWordMatcher: The compiled matcher.
+    """
+    if not extra_words_path:
+        return DEFAULT_MATCHER
+
+    try:
+        mtime = os.stat(extra_words_path).st_mtime_ns
+    except OSError:
+        return DEFAULT_MATCHER
+
+    with _project_matchers_lock:
+        cached = _project_matchers.get(extra_words_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    with open(extra_words_path, "r", encoding="utf-8") as file:
+        extra_words = [line.strip() for line in file if line.strip()]
+    matcher = OffensiveWordMatcher(list(LIST_OFFENSIVE_WORDS) + extra_words)
+
+    with _project_matchers_lock:
+        _project_matchers[extra_words_path] = (mtime, matcher)
+    return matcher
+
+
+def guardrail_prompt_version(model_name: str) -> str:
+    """Returns a short hash identifying the guardrail prompt and model (cache version)."""
+    return hashlib.sha256(f"{model_name}\n{PROMPT_GUARDRAIL}".encode("utf-8")).hexdigest()[:16]
+
+
+class GuardrailVerdictCache:
+    """
+    Persistent cache of LLM guardrail verdicts stored in SQLite, so it is shared
+    by all sessions and processes (Streamlit and API) on the same host/volume.
+
+    Entries are keyed on the hash of the normalized input and the guardrail
+    prompt version, expire after a TTL and are bounded in number.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float, max_entries: int) -> None:
+        """
+        Args:
+            db_path (str): Path to the SQLite database file.
+            ttl_seconds (float): Time-to-live of a verdict.
+            max_entries (int): Maximum number of verdicts kept.
+        """
+        self.db_path = db_path
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self._local = threading.local()
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts "
+                "(key TEXT PRIMARY KEY, allowed INTEGER NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_verdicts_created ON verdicts (created)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns this thread's connection (WAL mode allows concurrent readers)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(text: str, version: str) -> str:
+        """Hashes the normalized input together with the prompt version."""
+        payload = f"{version}\x00{normalize_guardrail_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, text: str, version: str) -> Optional[bool]:
+        """
+        Returns the cached verdict for an input.
+
+        Returns:
+            Optional[bool]: True (allowed), False (blocked) or None on a miss.
+        """
+        try:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT allowed FROM verdicts WHERE key = ? AND created >= ?",
+                    (self.make_key(text, version), time.time() - self.ttl_seconds),
+                )
+                .fetchone()
+            )
+            return None if row is None else bool(row[0])
+        except sqlite3.Error:
+            return None
+
+    def put(self, text: str, version: str, allowed: bool) -> None:
+        """Stores a verdict, pruning expired and excess entries from time to time."""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO verdicts (key, allowed, created) VALUES (?, ?, ?)",
+                    (self.make_key(text, version), int(bool(allowed)), time.time()),
+                )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.prune()
+        except sqlite3.Error:
+            pass
+
+    def prune(self) -> None:
+        """Removes expired verdicts and keeps only the newest `max_entries`."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM verdicts WHERE created < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            conn.execute(
+                "DELETE FROM verdicts WHERE key IN "
+                "(SELECT key FROM verdicts ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+_verdict_caches: Dict[str, GuardrailVerdictCache] = {}
+_verdict_caches_lock = threading.Lock()
+
+
+def get_verdict_cache(
+    db_path: str, ttl_seconds: float, max_entries: int
+) -> GuardrailVerdictCache:
+    """Returns the process-wide verdict cache for a database file."""
+    with _verdict_caches_lock:
+        cache = _verdict_caches.get(db_path)
+        if cache is None:
+            cache = GuardrailVerdictCache(db_path, ttl_seconds, max_entries)
+            _verdict_caches[db_path] = cache
+        cache.ttl_seconds = float(ttl_seconds)
+        cache.max_entries = int(max_entries)
+        return cache
+
+
+class EmbeddingGuardrail:
+    """
+    Local guardrail tier: compares the input embedding with curated allowed and
+    blocked exemplars, resolving clear cases without an LLM call.
+    """
+
+    def __init__(
+        self,
+        embed_documents: Callable[[List[str]], List[List[float]]],
+        allowed: List[str] = LIST_ALLOWED_EXEMPLARS,
+        blocked: List[str] = LIST_BLOCKED_EXEMPLARS,
+    ) -> None:
+        """
+        Embeds the exemplars once.
+
+        Args:
+            embed_documents (Callable): Batch embedding function of the shared model.
+            allowed (List[str]): Exemplars of allowed inputs.
+            blocked (List[str]): Exemplars of blocked inputs.
+        """
+        self.allowed = self._normalize(embed_documents(list(allowed)))
+        self.blocked = self._normalize(embed_documents(list(blocked)))
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def score(self, query_vector: np.ndarray) -> float:
+        """
+        Scores an input: highest cosine similarity to a blocked exemplar minus the
+        highest similarity to an allowed exemplar (positive means closer to blocked).
+
+        Args:
+            query_vector (np.ndarray): Embedding of the input text.
+
+        Returns:
+            float: The score, between -2 and 2.
+        """
+        vector = self._normalize(query_vector)[0]
+        return float(np.max(self.blocked @ vector) - np.max(self.allowed @ vector))
+
+    def classify(
+        self, query_vector: np.ndarray, allow_below: float, block_above: float
+    ) -> Optional[bool]:
+        """
+        Classifies an input locally.
+
+        Args:
+            query_vector (np.ndarray): Embedding of the input text.
+            allow_below (float): Scores at or below this value are allowed.
+            block_above (float): Scores at or above this value are blocked.
+
+        Returns:
+            Optional[bool]: True (allowed), False (blocked) or None (ambiguous, escalate).
+        """
+        score = self.score(query_vector)
+        if score <= allow_below:
+            return True
+        if score >= block_above:
+            return False
+        return None
+
+
+_embedding_guardrails: Dict[str, EmbeddingGuardrail] = {}
+_embedding_guardrails_lock = threading.Lock()
+
+
+def get_embedding_guardrail(model_name: str, embedding_model) -> EmbeddingGuardrail:
+    """Returns the local guardrail for an embedding model, embedding the exemplars once."""
+    with _embedding_guardrails_lock:
+        guardrail = _embedding_guardrails.get(model_name)
+        if guardrail is None:
+            guardrail = EmbeddingGuardrail(embedding_model.embed_documents)
+            _embedding_guardrails[model_name] = guardrail
+        return guardrail
+
+
+class GuardrailMetrics:
+    """Thread-safe counters of how each guardrail call was resolved."""
+
+    OUTCOMES = [
+        "word_blocked",
+        "cache_hit",
+        "local_allowed",
+        "local_blocked",
+        "llm_allowed",
+        "llm_blocked",
+    ]
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts = {outcome: 0 for outcome in self.OUTCOMES}
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def stats(self) -> dict:
+        """Returns the counters and the fraction of calls resolved without the LLM."""
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        llm_calls = counts["llm_allowed"] + counts["llm_blocked"]
+        local = counts["local_allowed"] + counts["local_blocked"]
+        return {
+            **counts,
+            "total": total,
+            "local_rate": local / total if total else 0.0,
+            "no_llm_rate": (total - llm_calls) / total if total else 0.0,
+        }
+
+
+# Process-wide guardrail metrics
+GUARDRAIL_METRICS = GuardrailMetrics()
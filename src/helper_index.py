@@ -0,0 +1,1037 @@
+from unidecode import unidecode
+from collections import Counter
+from contextlib import contextmanager
+from langchain.schema import Document
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+import threading
+import sqlite3
+import pickle
+import struct
+import faiss
+import math
+import json
+import re
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, no lock needed
+    fcntl = None
+
+# Portuguese stopwords removed from the lexical index (keeps postings small)
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e",
+    "ela", "ele", "em", "entre", "essa", "esse", "esta", "este", "eu", "isso",
+    "ja", "lhe", "mais", "mas", "me", "na", "nas", "no", "nos", "o", "os", "ou",
+    "para", "pela", "pelo", "por", "qual", "quais", "que", "se", "sem", "seu",
+    "sua", "so", "tambem", "um", "uma", "voce",
+}
+
+BM25_FILES = {
+    "vocab": "bm25_vocab.json",
+    "offsets": "bm25_offsets.npy",
+    "docs": "bm25_docs.npy",
+    "tfs": "bm25_tfs.npy",
+    "doc_lens": "bm25_doc_lens.npy",
+}
+
+# Raw float32 vectors kept on disk for exact re-scoring of compressed indexes
+FLOAT_VECTORS_FILE = "vectors.f32"
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite"
+# Source file -> chunk id ranges, for filtered search
+SOURCES_FILE = "sources.json"
+# LangChain pickled docstore of projects created before the chunk store
+LEGACY_DOCSTORE_FILE = "index.pkl"
+# Serializes the writers of a project directory across processes
+LOCK_FILE = "project.lock"
+
+COMPRESSION_MODES = ["none", "sq8", "pq", "opq", "pca"]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenizes text for the lexical index: lowercase, no accents, no stopwords.
+    Codes with digits (e.g. "12.345/2020", "iso-9001") are also kept whole,
+    besides their parts, so exact codes and article numbers match.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        List[str]: The tokens.
+    """
+    text = unidecode(str(text).lower())
+    tokens = [t for t in re.findall(r"[a-z0-9]+", text) if t not in STOPWORDS]
+    codes = [
+        code
+        for code in re.findall(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)+", text)
+        if any(char.isdigit() for char in code)
+    ]
+    return tokens + codes
+
+
+@contextmanager
+def directory_lock(directory: str, shared: bool = False) -> Iterator[None]:
+    """
+    Locks a project directory across processes: writers hold it exclusively,
+    loaders shared, so a project is never loaded while it is being rewritten
+    (threads of a process are serialized by the registry's load lock).
+    """
+    # append mode: opening must not touch the mtime of the directory's files
+    with open(os.path.join(directory, LOCK_FILE), "a") as lock_file:
+        if fcntl is not None:
+            # released when the file is closed
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+
+
+def directory_signature(directory: str) -> Tuple:
+    """
+    Builds a signature (file names, sizes and modification times) of an index
+    directory, used to detect when it was rebuilt.
+
+    Returns:
+        Tuple: The signature, or None if the directory does not exist.
+    """
+    try:
+        return tuple(
+            sorted(
+                (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in os.scandir(directory)
+                # the lock and files being written are not part of the index
+                if entry.is_file()
+                and entry.name != LOCK_FILE
+                and not entry.name.endswith(".tmp")
+            )
+        )
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def atomic_file(path: str, mode: str = "wb"):
+    """
+    Opens a temporary file that replaces `path` atomically once written, so
+    readers see either the previous or the complete new file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class BM25Index:
+    """
+    Lexical inverted index with BM25 scoring.
+
+    Postings are stored in a compact CSR layout: for term `t`, the chunk ids and
+    term frequencies are `docs[offsets[t]:offsets[t + 1]]` (uint32) and
+    `tfs[offsets[t]:offsets[t + 1]]` (uint16), sorted by chunk id. Chunk ids are
+    the positions of the chunks in the FAISS index.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        offsets: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doc_lens: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ) -> None:
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.k1 = float(k1)
+        self.b = float(b)
+        self.num_docs = len(doc_lens)
+        self.avg_doc_len = float(np.mean(doc_lens)) if self.num_docs else 0.0
+
+    @classmethod
+    def build(cls, texts: Iterable[str], **kwargs) -> "BM25Index":
+        """
+        Builds the index from the chunk texts (in FAISS order).
+
+        Args:
+            texts (Iterable[str]): Chunk texts; the i-th text gets chunk id i.
+
+        Returns:
+            BM25Index: The built index.
+        """
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lens = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        vocab = {term: i for i, term in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        for term, i in vocab.items():
+            offsets[i + 1] = len(postings[term])
+        offsets = np.cumsum(offsets)
+
+        docs = np.empty(offsets[-1], dtype=np.uint32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for term, i in vocab.items():
+            term_postings = np.asarray(postings[term], dtype=np.int64)
+            docs[offsets[i]:offsets[i + 1]] = term_postings[:, 0]
+            tfs[offsets[i]:offsets[i + 1]] = np.minimum(term_postings[:, 1], 65535)
+
+        return cls(
+            vocab, offsets, docs, tfs, np.asarray(doc_lens, dtype=np.uint32), **kwargs
+        )
+
+    def save(self, directory: str) -> None:
+        """Saves the index files into a directory (e.g. the project's `faiss_db`)."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ["offsets", "docs", "tfs", "doc_lens"]:
+            with atomic_file(os.path.join(directory, BM25_FILES[name])) as f:
+                np.save(f, getattr(self, name))
+        with atomic_file(os.path.join(directory, BM25_FILES["vocab"]), "w") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return all(
+            os.path.exists(os.path.join(directory, name)) for name in BM25_FILES.values()
+        )
+
+    @classmethod
+    def load(cls, directory: str, **kwargs) -> "BM25Index":
+        """
+        Loads the index; postings arrays are memory-mapped (read lazily, shared
+        through the OS page cache).
+        """
+        with open(os.path.join(directory, BM25_FILES["vocab"]), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, BM25_FILES[name]), mmap_mode="r")
+            for name in ["offsets", "docs", "tfs", "doc_lens"]
+        }
+        return cls(
+            vocab,
+            arrays["offsets"],
+            arrays["docs"],
+            arrays["tfs"],
+            np.asarray(arrays["doc_lens"], dtype=np.float32),
+            **kwargs,
+        )
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        k1: float = None,
+        b: float = None,
+        subset: np.ndarray = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Scores the chunks containing the query terms with BM25. The cost depends
+        only on the postings of the query terms, not on the corpus size.
+
+        Args:
+            query (str): The user's query.
+            k (int): Number of results.
+            k1 (float): Term-frequency saturation (defaults to the index's `k1`).
+            b (float): Length normalization (defaults to the index's `b`).
+            subset (np.ndarray): Allowed chunk ids (sorted), or None for all.
+
+        Returns:
+            List[Tuple[int, float]]: (chunk id, BM25 score), best first.
+        """
+        k1 = self.k1 if k1 is None else float(k1)
+        b = self.b if b is None else float(b)
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or self.num_docs == 0:
+            return []
+
+        all_docs, all_scores = [], []
+        for term_id in term_ids:
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = np.asarray(self.docs[start:end], dtype=np.int64)
+            tfs = np.asarray(self.tfs[start:end], dtype=np.float32)
+            df = end - start
+            if subset is not None:
+                mask = np.isin(docs, subset, assume_unique=True)
+                docs, tfs = docs[mask], tfs[mask]
+            idf = np.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            norm = k1 * (1 - b + b * self.doc_lens[docs] / max(self.avg_doc_len, 1e-9))
+            all_docs.append(docs)
+            all_scores.append(idf * tfs * (k1 + 1) / (tfs + norm))
+
+        docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        if len(docs) == 0:
+            return []
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(docs[i]), float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[int]], k: int = 60
+) -> List[Tuple[int, float]]:
+    """
+    Fuses several rankings of chunk ids with reciprocal rank fusion.
+
+    Args:
+        rankings (List[List[int]]): Rankings of chunk ids, best first.
+        k (int): RRF constant (higher values flatten the rank weights).
+
+    Returns:
+        List[Tuple[int, float]]: (chunk id, fused score), best first.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def fuse_hits(
+    dense_hits: List[Tuple[int, float]],
+    lexical_hits: List[Tuple[int, float]],
+    similarity_threshold: float,
+    bm25_min_score: float,
+    k: int = 60,
+) -> Tuple[Dict[int, float], List[Tuple[int, float]], Dict[int, float]]:
+    """
+    Fuses the dense and lexical hits of a query. Dense hits count only under the
+    similarity threshold; when none does, only lexical hits scoring at least
+    `bm25_min_score` count (strong matches such as exact codes), so a single
+    common word shared with the query does not make it contextual.
+
+    Args:
+        dense_hits (List[Tuple[int, float]]): (chunk id, squared L2 distance), best first.
+        lexical_hits (List[Tuple[int, float]]): (chunk id, BM25 score), best first,
+            or None without hybrid search.
+        similarity_threshold (float): Maximum distance of a relevant dense hit.
+        bm25_min_score (float): Minimum BM25 score of a lexical-only hit.
+        k (int): RRF constant.
+
+    Returns:
+        Tuple: The relevant dense hits (chunk id -> distance), the fused ranking
+        ((chunk id, fused score), best first) and the relevance of each chunk
+        in [0, 1] (fused score over the best possible one).
+    """
+    dense = {idx: dist for idx, dist in dense_hits if dist <= similarity_threshold}
+    rankings = [sorted(dense, key=dense.get)]
+    if lexical_hits is not None:
+        if not dense:
+            lexical_hits = [(idx, score) for idx, score in lexical_hits if score >= bm25_min_score]
+        rankings.append([idx for idx, _ in lexical_hits])
+
+    fused = reciprocal_rank_fusion(rankings, k=k)
+    max_fused = len(rankings) / (k + 1)
+    return dense, fused, {idx: score / max_fused for idx, score in fused}
+
+
+def normalized_similarity(distance: float, similarity_threshold: float) -> float:
+    """
+    Maps a dense distance to a similarity comparable across indexes: 1 for an
+    exact match, 0 at the similarity threshold (and for chunks found only by
+    the lexical search, without a distance).
+    """
+    if distance is None:
+        return 0.0
+    return max(0.0, 1.0 - float(distance) / float(similarity_threshold))
+
+
+def choose_index_factory(num_vectors: int, parameters: dict) -> str:
+    """
+    Chooses the FAISS index factory string for a corpus size: exact flat search
+    for small corpora, HNSW for medium ones and IVF for large ones.
+
+    Args:
+        num_vectors (int): Number of chunks to index.
+        parameters (dict): Application parameters (thresholds).
+
+    Returns:
+        str: The factory string (e.g. "Flat", "HNSW32,Flat", "IVF1024,Flat").
+    """
+    if num_vectors < int(parameters.get("index_hnsw_min_vectors", 50_000)):
+        return "Flat"
+    if num_vectors < int(parameters.get("index_ivf_min_vectors", 500_000)):
+        return f"HNSW{int(parameters.get('index_hnsw_m', 32))},Flat"
+    # ~4 * sqrt(n) lists, rounded to a power of two
+    nlist = 2 ** round(math.log2(4 * math.sqrt(num_vectors)))
+    return f"IVF{nlist},Flat"
+
+
+def build_faiss_index(vectors: np.ndarray, factory: str) -> faiss.Index:
+    """
+    Builds a FAISS index (L2 metric, as the LangChain default) from a factory
+    string, training it first when needed (IVF quantizer, PQ codebooks).
+
+    Args:
+        vectors (np.ndarray): Chunk embeddings, shape (n, d).
+        factory (str): FAISS index factory string.
+
+    Returns:
+        faiss.Index: The index with all vectors added.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_L2)
+    if not index.is_trained:
+        try:
+            nlist = faiss.extract_index_ivf(index).nlist
+        except RuntimeError:
+            nlist = 1
+        # a sample is enough to train (faiss uses at most 256 points per list)
+        sample_size = min(len(vectors), max(256 * nlist, 100_000))
+        sample = vectors[np.random.default_rng(0).permutation(len(vectors))[:sample_size]]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def set_search_parameters(index: faiss.Index, parameters: dict) -> None:
+    """
+    Applies the search-time parameters (`nprobe` for IVF, `efSearch` for HNSW)
+    configured in `artifacts.yaml` to an index; other index types are left as is.
+
+    Args:
+        index (faiss.Index): The FAISS index.
+        parameters (dict): Application parameters.
+    """
+    if not isinstance(index, faiss.Index):
+        return  # MappedFlatIndex: exact search, nothing to set
+    space = faiss.ParameterSpace()
+    for name, key, default in [
+        ("nprobe", "index_nprobe", 16),
+        ("efSearch", "index_ef_search", 64),
+    ]:
+        try:
+            space.set_index_parameter(index, name, int(parameters.get(key, default)))
+        except RuntimeError:
+            pass
+
+
+def compress_index_factory(
+    factory: str, compression: str, dim: int, parameters: dict
+) -> str:
+    """
+    Applies a compression mode to an uncompressed factory string: scalar int8
+    (`sq8`), product quantization (`pq`, `opq`) or PCA-reduced dimensions (`pca`).
+
+    Args:
+        factory (str): Uncompressed factory string (e.g. "Flat", "IVF1024,Flat").
+        compression (str): One of `COMPRESSION_MODES`.
+        dim (int): Dimension of the embeddings.
+        parameters (dict): Application parameters (`compression_pq_m`, `compression_pca_dim`).
+
+    Returns:
+        str: The compressed factory string.
+    """
+    compression = (compression or "none").lower()
+    if compression == "none" or not factory.endswith("Flat"):
+        return factory
+    if compression == "pca":
+        pca_dim = min(dim, int(parameters.get("compression_pca_dim", 128)))
+        return f"PCA{pca_dim},{factory}"
+
+    base = factory[: -len("Flat")].rstrip(",")
+    if compression == "sq8":
+        code = "SQ8"
+    else:
+        # number of sub-quantizers must divide the dimension
+        m = int(parameters.get("compression_pq_m", 48))
+        m = max(d for d in range(1, min(m, dim) + 1) if dim % d == 0)
+        code = f"PQ{m}"
+    factory = f"{base},{code}" if base else code
+    return f"OPQ{m},{factory}" if compression == "opq" else factory
+
+
+def get_compression(factory: str) -> str:
+    """Returns the compression mode of a factory string ("none" for full float32 vectors)."""
+    factory = factory.upper()
+    if factory.startswith("PCA"):
+        return "pca"
+    if factory.startswith("OPQ"):
+        return "opq"
+    if "PQ" in factory:
+        return "pq"
+    if "SQ" in factory:
+        return "sq8"
+    return "none"
+
+
+def resolve_index_factory(
+    num_vectors: int,
+    dim: int,
+    parameters: dict,
+    index_factory: str = "",
+    compression: str = None,
+) -> Tuple[str, List[str]]:
+    """
+    Resolves the factory string of a project: an explicit factory string wins
+    (it already defines the compression, e.g. `IVF1024,PQ32`); otherwise it is
+    chosen by corpus size and the compression mode is applied, unless there are
+    too few vectors to train the quantizers (`compression_min_vectors`).
+
+    Args:
+        num_vectors (int): Number of chunks to index.
+        dim (int): Dimension of the embeddings.
+        parameters (dict): Application parameters.
+        index_factory (str): Per-project factory string (empty: automatic).
+        compression (str): Compression mode (None: `index_compression`).
+
+    Returns:
+        Tuple[str, List[str]]: The factory string and the warnings about the
+        settings that were not applied (shown to the user).
+    """
+    compression = compression or parameters.get("index_compression", "none")
+    index_factory = (index_factory or "").strip()
+    if index_factory:
+        if compression not in ("none", get_compression(index_factory)):
+            return index_factory, [
+                f"A compressão '{compression}' foi ignorada: o tipo de índice "
+                f"informado ({index_factory}) já define a compressão "
+                f"('{get_compression(index_factory)}')."
+            ]
+        return index_factory, []
+
+    warnings = []
+    min_vectors = int(parameters.get("compression_min_vectors", 10000))
+    if compression != "none" and num_vectors < min_vectors:
+        warnings.append(
+            f"A compressão '{compression}' foi ignorada: o projeto tem {num_vectors} "
+            f"trechos, menos que o mínimo ({min_vectors}) para treinar a compressão."
+        )
+        compression = "none"
+    factory = compress_index_factory(
+        choose_index_factory(num_vectors, parameters), compression, dim, parameters
+    )
+    return factory, warnings
+
+
+def save_float_vectors(directory: str, vectors: np.ndarray) -> None:
+    """Saves the raw float32 vectors (row i is chunk id i) for exact re-scoring."""
+    with atomic_file(os.path.join(directory, FLOAT_VECTORS_FILE)) as f:
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(f)
+
+
+def load_float_vectors(directory: str, dim: int) -> np.ndarray:
+    """
+    Memory-maps the raw float32 vectors of a project (None if not saved), so
+    only the rows of the re-scored candidates are read from disk.
+    """
+    path = os.path.join(directory, FLOAT_VECTORS_FILE)
+    if not os.path.exists(path):
+        return None
+    return np.memmap(path, dtype=np.float32, mode="r").reshape(-1, dim)
+
+
+def dense_search(
+    index: faiss.Index,
+    query_vector: np.ndarray,
+    k: int,
+    float_vectors: np.ndarray = None,
+    rescore_factor: int = 4,
+    subset: np.ndarray = None,
+) -> List[Tuple[int, float]]:
+    """
+    Searches the FAISS index. With a float store (compressed indexes), fetches
+    `k * rescore_factor` candidates and re-scores them with exact L2 distances.
+    With a `subset` of chunk ids, only those chunks are searched.
+
+    Args:
+        index (faiss.Index): The FAISS index.
+        query_vector (np.ndarray): The query embedding.
+        k (int): Number of results.
+        float_vectors (np.ndarray): Memory-mapped raw vectors, or None.
+        rescore_factor (int): Over-fetch factor for re-scoring.
+        subset (np.ndarray): Allowed chunk ids (sorted), or None for all.
+
+    Returns:
+        List[Tuple[int, float]]: (chunk id, squared L2 distance), best first.
+    """
+    query_vector = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+    if subset is not None:
+        return subset_search(index, query_vector, k, subset, float_vectors)
+    return dense_search_batch(index, query_vector, k, float_vectors, rescore_factor)[0]
+
+
+def dense_search_batch(
+    index: faiss.Index,
+    query_vectors: np.ndarray,
+    k: int,
+    float_vectors: np.ndarray = None,
+    rescore_factor: int = 4,
+) -> List[List[Tuple[int, float]]]:
+    """
+    Searches the FAISS index for several queries in a single call (FAISS
+    parallelizes and vectorizes the distance computations across queries),
+    re-scoring each query's candidates when there is a float store.
+
+    Args:
+        index (faiss.Index): The FAISS index.
+        query_vectors (np.ndarray): The query embeddings, shape (n, d).
+        k (int): Number of results per query.
+        float_vectors (np.ndarray): Memory-mapped raw vectors, or None.
+        rescore_factor (int): Over-fetch factor for re-scoring.
+
+    Returns:
+        List[List[Tuple[int, float]]]: For each query, (chunk id, squared L2 distance), best first.
+    """
+    query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+    if query_vectors.ndim == 1:
+        query_vectors = query_vectors.reshape(1, -1)
+    if len(query_vectors) == 0:
+        return []
+
+    fetch_k = k * max(1, int(rescore_factor)) if float_vectors is not None else k
+    distances, ids = index.search(query_vectors, fetch_k)
+
+    results = []
+    for row, query_vector in enumerate(query_vectors):
+        hits = [
+            (int(idx), float(dist))
+            for dist, idx in zip(distances[row], ids[row])
+            if idx >= 0
+        ]
+        if float_vectors is None or not hits:
+            results.append(hits)
+            continue
+
+        # exact re-scoring (rows read in id order for disk locality)
+        candidate_ids = np.sort(np.array([idx for idx, _ in hits], dtype=np.int64))
+        exact = np.sum((float_vectors[candidate_ids] - query_vector) ** 2, axis=1)
+        order = np.argsort(exact)[:k]
+        results.append([(int(candidate_ids[i]), float(exact[i])) for i in order])
+    return results
+
+
+def subset_search(
+    index: faiss.Index,
+    query_vector: np.ndarray,
+    k: int,
+    subset: np.ndarray,
+    float_vectors: np.ndarray = None,
+) -> List[Tuple[int, float]]:
+    """
+    Searches only a subset of chunk ids. The subset vectors are scanned directly
+    (from the float store, or reconstructed from the index), so the cost depends
+    on the subset size and not on the unrelated chunks. Indexes that cannot
+    reconstruct vectors (IVF) are searched with an id selector instead.
+
+    Args:
+        index (faiss.Index): The FAISS index.
+        query_vector (np.ndarray): The query embedding, shape (1, d).
+        k (int): Number of results.
+        subset (np.ndarray): Allowed chunk ids (sorted).
+        float_vectors (np.ndarray): Memory-mapped raw vectors, or None.
+
+    Returns:
+        List[Tuple[int, float]]: (chunk id, squared L2 distance), best first.
+    """
+    subset = np.asarray(subset, dtype=np.int64)
+    if len(subset) == 0:
+        return []
+
+    if float_vectors is not None:
+        vectors = float_vectors[subset]
+    else:
+        try:
+            vectors = index.reconstruct_batch(subset)
+        except RuntimeError:
+            vectors = None
+
+    if vectors is not None:
+        distances = np.sum((vectors - query_vector) ** 2, axis=1)
+        order = np.argsort(distances)[:k]
+        return [(int(subset[i]), float(distances[i])) for i in order]
+
+    selector = faiss.IDSelectorBatch(subset)
+    try:
+        params = faiss.SearchParametersIVF(
+            sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe
+        )
+    except RuntimeError:
+        params = faiss.SearchParameters(sel=selector)
+    distances, ids = index.search(query_vector, k, params=params)
+    return [(int(idx), float(dist)) for dist, idx in zip(distances[0], ids[0]) if idx >= 0]
+
+
+def build_source_ranges(sources: Iterable[str]) -> Dict[str, List[List[int]]]:
+    """
+    Maps each source file to the ranges of chunk ids holding its chunks
+    (chunks of a file are contiguous, so usually a single range).
+
+    Args:
+        sources (Iterable[str]): Source of each chunk, in chunk id order.
+
+    Returns:
+        Dict[str, List[List[int]]]: Source -> list of [start, end) ranges.
+    """
+    ranges: Dict[str, List[List[int]]] = {}
+    previous = None
+    for chunk_id, source in enumerate(sources):
+        if source == previous:
+            ranges[source][-1][1] = chunk_id + 1
+        else:
+            ranges.setdefault(source, []).append([chunk_id, chunk_id + 1])
+        previous = source
+    return ranges
+
+
+def save_source_ranges(directory: str, ranges: Dict[str, List[List[int]]]) -> None:
+    """Saves the source -> chunk id ranges of a project."""
+    with atomic_file(os.path.join(directory, SOURCES_FILE), "w") as f:
+        json.dump(ranges, f, ensure_ascii=False)
+
+
+def write_index(index: faiss.Index, directory: str) -> None:
+    """
+    Writes the FAISS index of a project. The file is replaced atomically, so
+    processes that mapped the previous version keep a valid mapping.
+    """
+    path = os.path.join(directory, INDEX_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class MappedFlatIndex:
+    """
+    Exact L2 index over vectors memory-mapped from disk, with the interface of
+    the FAISS index used by the searches (`d`, `ntotal`, `search`,
+    `reconstruct_batch`). FAISS reads flat indexes fully into memory even with
+    `IO_FLAG_MMAP`, so flat indexes are searched this way instead: the vectors
+    stay in the OS page cache, shared by all processes.
+    """
+
+    def __init__(self, vectors: np.ndarray) -> None:
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+        self.is_trained = True
+
+    def search(self, x: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if self.ntotal == 0:
+            return (
+                np.full((len(x), k), np.inf, dtype=np.float32),
+                np.full((len(x), k), -1, dtype=np.int64),
+            )
+        if params is not None and getattr(params, "sel", None) is not None:
+            raise RuntimeError("MappedFlatIndex: use subset_search for filtered search")
+        distances, ids = faiss.knn(x, self.vectors, min(k, self.ntotal), faiss.METRIC_L2)
+        if k > self.ntotal:
+            distances = np.pad(distances, ((0, 0), (0, k - self.ntotal)), constant_values=np.inf)
+            ids = np.pad(ids, ((0, 0), (0, k - self.ntotal)), constant_values=-1)
+        return distances, ids
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[np.asarray(ids, dtype=np.int64)])
+
+
+def map_flat_index(path: str) -> MappedFlatIndex:
+    """
+    Maps the vectors of a FAISS `IndexFlatL2` file (header, then the float32
+    vectors as a contiguous block at the end of the file). Returns None for
+    other index types or layouts.
+    """
+    # fourcc, d, ntotal, 2 unused int64, is_trained, metric type, codes size
+    header_format = "<4siqqq?iQ"
+    header_size = struct.calcsize(header_format)
+    with open(path, "rb") as f:
+        header = f.read(header_size)
+    if len(header) < header_size:
+        return None
+    fourcc, d, ntotal, _, _, _, metric_type, _ = struct.unpack(header_format, header)
+    if (
+        fourcc != b"IxF2"
+        or metric_type != faiss.METRIC_L2
+        or os.path.getsize(path) != header_size + ntotal * d * 4
+    ):
+        return None
+    if ntotal == 0:
+        return MappedFlatIndex(np.empty((0, d), dtype=np.float32))
+    return MappedFlatIndex(
+        np.memmap(path, dtype=np.float32, mode="r", offset=header_size, shape=(ntotal, d))
+    )
+
+
+def read_index(directory: str):
+    """
+    Reads the FAISS index of a project so that its vectors are shared by all
+    processes through the OS page cache where the index type allows it: flat
+    indexes are mapped by `map_flat_index` and IVF indexes are read with
+    `IO_FLAG_MMAP` (inverted lists mapped from the file). HNSW graphs and PQ/SQ
+    codes outside IVF are read into memory; with the pre-fork server
+    (`backend/gunicorn_conf.py`) that copy is only shared copy-on-write by the
+    workers forked from the master.
+    """
+    path = os.path.join(directory, INDEX_FILE)
+    index = map_flat_index(path)
+    if index is not None:
+        return index
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+class ChunkStore:
+    """
+    On-disk store of chunk texts and metadata (SQLite), keyed on the chunk id
+    (position in the FAISS index). Only the rows of the top-k hits are read.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Args:
+            directory (str): The project's `faiss_db` directory.
+        """
+        self.path = os.path.join(directory, CHUNKS_FILE)
+        self._local = threading.local()
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, CHUNKS_FILE))
+
+    @classmethod
+    def build(cls, directory: str, documents: Iterable[Document]) -> "ChunkStore":
+        """
+        Writes the chunks (the i-th document gets chunk id i), replacing the
+        store atomically.
+
+        Args:
+            directory (str): The project's `faiss_db` directory.
+            documents (Iterable[Document]): Chunks in FAISS order.
+
+        Returns:
+            ChunkStore: The new store.
+        """
+        path = os.path.join(directory, CHUNKS_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE chunks (id INTEGER PRIMARY KEY, source TEXT, "
+                    "content TEXT NOT NULL, metadata TEXT NOT NULL)"
+                )
+                conn.executemany(
+                    "INSERT INTO chunks (id, source, content, metadata) VALUES (?, ?, ?, ?)",
+                    (
+                        (
+                            i,
+                            doc.metadata.get("source"),
+                            doc.page_content,
+                            json.dumps(doc.metadata, ensure_ascii=False),
+                        )
+                        for i, doc in enumerate(documents)
+                    ),
+                )
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, path)
+        return cls(directory)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns this thread's read-only connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def reset_connections(self) -> None:
+        """Drops the connections inherited from a parent process (call after fork)."""
+        self._local = threading.local()
+
+    def get(self, ids: List[int]) -> Dict[int, dict]:
+        """
+        Reads chunks by id.
+
+        Args:
+            ids (List[int]): Chunk ids.
+
+        Returns:
+            Dict[int, dict]: Chunk id -> {"source", "content", "metadata"}.
+        """
+        if not ids:
+            return {}
+        rows = self._connect().execute(
+            "SELECT id, source, content, metadata FROM chunks WHERE id IN "
+            f"({','.join('?' * len(ids))})",
+            [int(i) for i in ids],
+        )
+        return {
+            row[0]: {"source": row[1], "content": row[2], "metadata": json.loads(row[3])}
+            for row in rows
+        }
+
+    def iter_sources(self) -> Iterator[str]:
+        """Iterates over the source of every chunk in chunk id order."""
+        for (source,) in self._connect().execute("SELECT source FROM chunks ORDER BY id"):
+            yield source
+
+    def iter_contents(self) -> Iterator[str]:
+        """Iterates over all chunk texts in chunk id order."""
+        for (content,) in self._connect().execute("SELECT content FROM chunks ORDER BY id"):
+            yield content
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+def migrate_legacy_docstore(directory: str) -> None:
+    """
+    Converts the pickled LangChain docstore (`index.pkl`) of an older project
+    into the chunk store and removes the pickle, so it is unpickled only once.
+    Called under the directory lock (see `upgrade_project`).
+
+    Args:
+        directory (str): The project's `faiss_db` directory.
+    """
+    path = os.path.join(directory, LEGACY_DOCSTORE_FILE)
+    if not ChunkStore.exists(directory):
+        with open(path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        ChunkStore.build(
+            directory,
+            (
+                docstore.search(index_to_docstore_id[i])
+                for i in range(len(index_to_docstore_id))
+            ),
+        )
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def needs_upgrade(directory: str) -> bool:
+    """Checks whether a project lacks files created by newer versions."""
+    return not (
+        ChunkStore.exists(directory)
+        and BM25Index.exists(directory)
+        and os.path.exists(os.path.join(directory, SOURCES_FILE))
+    )
+
+
+def upgrade_project(directory: str) -> None:
+    """
+    Creates the files older projects lack (chunk store from the legacy
+    docstore, BM25 index, source ranges). Runs under the directory lock, so
+    when several processes load the project only the first one writes them.
+
+    Args:
+        directory (str): The project's `faiss_db` directory.
+    """
+    with directory_lock(directory):
+        if not needs_upgrade(directory):
+            return  # upgraded by another process meanwhile
+        if os.path.exists(os.path.join(directory, LEGACY_DOCSTORE_FILE)):
+            migrate_legacy_docstore(directory)
+        chunks = ChunkStore(directory)
+        if not BM25Index.exists(directory):
+            BM25Index.build(chunks.iter_contents()).save(directory)
+        if not os.path.exists(os.path.join(directory, SOURCES_FILE)):
+            save_source_ranges(directory, build_source_ranges(chunks.iter_sources()))
+
+
+def save_project_index(
+    directory: str, documents: List[Document], vectors: np.ndarray, factory: str
+) -> faiss.Index:
+    """
+    Builds and writes the search structures of a project (FAISS index, chunk
+    store, BM25 index, source ranges and, for compressed indexes, the float
+    store). The files are replaced atomically under the directory lock and the
+    FAISS index last, so loaders never pair a new index with stale files.
+
+    Args:
+        directory (str): The project's `faiss_db` directory.
+        documents (List[Document]): Chunks; the i-th gets chunk id i.
+        vectors (np.ndarray): Chunk embeddings, shape (n, d).
+        factory (str): FAISS index factory string.
+
+    Returns:
+        faiss.Index: The built index.
+    """
+    os.makedirs(directory, exist_ok=True)
+    index = build_faiss_index(vectors, factory)
+    lexical = BM25Index.build(doc.page_content for doc in documents)
+    ranges = build_source_ranges(doc.metadata["source"] for doc in documents)
+
+    with directory_lock(directory):
+        # compressed indexes keep the raw vectors on disk for exact re-scoring
+        float_vectors_path = os.path.join(directory, FLOAT_VECTORS_FILE)
+        if get_compression(factory) != "none":
+            save_float_vectors(directory, vectors)
+        elif os.path.exists(float_vectors_path):
+            os.remove(float_vectors_path)
+
+        ChunkStore.build(directory, documents)
+        lexical.save(directory)
+        save_source_ranges(directory, ranges)
+        legacy_docstore_path = os.path.join(directory, LEGACY_DOCSTORE_FILE)
+        if os.path.exists(legacy_docstore_path):
+            os.remove(legacy_docstore_path)
+        write_index(index, directory)
+    return index
+
+
+class ProjectIndex:
+    """
+    Search structures of a project: the FAISS index (mapped, see `read_index`), the chunk
+    store, the BM25 index, the source ranges and, for compressed indexes, the
+    float store.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Opens a project's `faiss_db` directory, migrating older projects
+        (chunk store, BM25 index and source ranges are created on first load).
+
+        Args:
+            directory (str): The project's `faiss_db` directory.
+        """
+        if needs_upgrade(directory):
+            upgrade_project(directory)
+
+        # the files of one version (see `save_project_index`)
+        with directory_lock(directory, shared=True):
+            self.index = read_index(directory)
+            self.chunks = ChunkStore(directory)
+            self.lexical = BM25Index.load(directory)
+            self.float_vectors = load_float_vectors(directory, self.index.d)
+            with open(os.path.join(directory, SOURCES_FILE), "r", encoding="utf-8") as f:
+                self.sources: Dict[str, List[List[int]]] = json.load(f)
+            self.signature = directory_signature(directory)
+
+    def ids_for_sources(self, sources: Iterable[str]) -> np.ndarray:
+        """
+        Returns the sorted chunk ids of some source files, from the precomputed ranges.
+
+        Args:
+            sources (Iterable[str]): Source file names.
+
+        Returns:
+            np.ndarray: The chunk ids (int64).
+        """
+        ranges = [
+            np.arange(start, end, dtype=np.int64)
+            for source in sources
+            for start, end in self.sources.get(source, [])
+        ]
+        return np.sort(np.concatenate(ranges)) if ranges else np.empty(0, dtype=np.int64)
@@ -0,0 +1,574 @@
+from openai import (
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+)
+from concurrent.futures import Future
+from collections import deque
+from typing import AsyncIterator, Dict, List, Tuple
+import threading
+import asyncio
+import itertools
+import random
+import heapq
+import queue
+import httpx
+import time
+
+# Request priorities (lower value goes first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+_clients: Dict[Tuple, AsyncOpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(parameters: dict) -> AsyncOpenAI:
+    """
+    Returns the process-wide async OpenAI client for the given parameters.
+
+    The client keeps a pool of keep-alive HTTP connections, so consecutive calls
+    (guardrail, chatbot replies, summarizer, recruit) reuse TLS connections
+    instead of opening a new one per request. It is used from the gateway's
+    event loop; retries are handled by the gateway.
+
+    Args:
+        parameters (dict): Application parameters (API key, pool size and timeouts).
+
+    Returns:
+        AsyncOpenAI: The shared client.
+    """
+    pool_size = int(parameters.get("llm_pool_size", 20))
+    timeout = float(parameters.get("llm_timeout", 60))
+    connect_timeout = float(parameters.get("llm_connect_timeout", 10))
+    key = (parameters["key"], pool_size, timeout, connect_timeout)
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=parameters["key"],
+                timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=pool_size,
+                        max_keepalive_connections=pool_size,
+                        keepalive_expiry=60,
+                    ),
+                ),
+            )
+            _clients[key] = client
+        return client
+
+
+def count_tokens(text: str, model_name: str = "gpt-4o-mini") -> int:
+    """
+    Counts the tokens of a text with the model's local tokenizer (tiktoken),
+    falling back to an estimate of 4 characters per token.
+
+    Args:
+        text (str): The text to count.
+        model_name (str): Name of the OpenAI model.
+
+    Returns:
+        int: The number of tokens.
+    """
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float) -> None:
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.capacity / 60
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Returns how many seconds to wait until `amount` tokens are available."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.capacity
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class TokenStream:
+    """
+    Blocking iterator over the tokens of a streamed completion running on the
+    gateway loop. `close()` cancels the request (releasing its gateway slot)
+    even if the iteration never started, e.g. a discarded speculative reply.
+    """
+
+    def __init__(self, tokens: queue.Queue, future: Future) -> None:
+        """
+        Args:
+            tokens (queue.Queue): ("token" | "end" | "error", value) items.
+            future (Future): The streaming task on the gateway loop.
+        """
+        self.tokens = tokens
+        self.future = future
+        self.closed = False
+
+    def __iter__(self) -> "TokenStream":
+        return self
+
+    def __next__(self) -> str:
+        if self.closed:
+            raise StopIteration
+        kind, value = self.tokens.get()
+        if kind == "token":
+            return value
+        self.close()
+        if kind == "error":
+            raise value
+        raise StopIteration
+
+    def close(self) -> None:
+        """Stops the stream and cancels the request if it is still running."""
+        self.closed = True
+        self.future.cancel()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+class LLMGateway:
+    """
+    Central, rate-limit-aware gateway for all OpenAI chat completions of a process.
+
+    - global token buckets for requests and tokens per minute;
+    - a bounded number of concurrent requests;
+    - priorities (interactive chat is admitted before bulk jobs);
+    - exponential backoff on 429/5xx honouring `Retry-After`;
+    - queue-depth and wait-time metrics;
+    - token usage per call, including the prompt tokens served from the
+      provider's prompt cache.
+
+    The gateway runs on its own event loop thread, so it can be used both from
+    synchronous code (`complete_sync`, `stream_sync`) and from other event
+    loops (`acomplete`).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        expected_output_tokens: int = 500,
+        usage_history: int = 200,
+    ) -> None:
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_concurrency = int(max_concurrency)
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.expected_output_tokens = int(expected_output_tokens)
+
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        }
+        self._usage: deque = deque(maxlen=int(usage_history))
+
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        self._thread = threading.Thread(
+            target=self._run_loop, name="llm-gateway", daemon=True
+        )
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._loop.create_task(self._dispatch())
+        self._loop.run_forever()
+
+    # Admission control
+    async def _acquire(self, priority: int, tokens: int) -> None:
+        """Waits until the request is admitted (priority order, limits respected)."""
+        future = self._loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        self._wakeup.set()
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # admitted just before the caller was cancelled
+            else:
+                future.cancel()
+            raise
+        waited = time.monotonic() - started
+        with self._metrics_lock:
+            self._metrics["wait_time_total"] += waited
+            self._metrics["wait_time_max"] = max(self._metrics["wait_time_max"], waited)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        """Admits waiting requests, highest priority first, within the limits."""
+        while True:
+            # drop waiters whose caller gave up
+            while self._waiters and self._waiters[0][3].done():
+                heapq.heappop(self._waiters)
+
+            if not self._waiters or self._in_flight >= self.max_concurrency:
+                await self._wait_wakeup(None)
+                continue
+
+            _, _, tokens, future = self._waiters[0]
+            delay = max(
+                self._paused_until - time.monotonic(),
+                self.request_bucket.wait_time(1),
+                self.token_bucket.wait_time(tokens),
+            )
+            if delay > 0:
+                # a higher-priority request arriving meanwhile is re-evaluated
+                await self._wait_wakeup(delay)
+                continue
+
+            heapq.heappop(self._waiters)
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(tokens)
+            self._in_flight += 1
+            future.set_result(None)
+
+    async def _wait_wakeup(self, timeout: float) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    # Retries
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Returns the backoff delay, honouring `Retry-After` when the API sends it."""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except ValueError:
+            pass
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return delay * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (APIConnectionError, APITimeoutError)):
+            return True
+        if isinstance(error, APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return False
+
+    async def _with_retries(self, call, priority: int, tokens: int):
+        """Runs `call` (an async callable) with admission control and retries."""
+        attempt = 0
+        while True:
+            await self._acquire(priority, tokens)
+            try:
+                with self._metrics_lock:
+                    self._metrics["requests"] += 1
+                return await call()
+            except Exception as error:
+                if not self._is_retryable(error) or attempt >= self.max_retries:
+                    with self._metrics_lock:
+                        self._metrics["errors"] += 1
+                    raise
+                delay = self._retry_delay(error, attempt)
+                with self._metrics_lock:
+                    self._metrics["retries"] += 1
+                    if getattr(error, "status_code", None) == 429:
+                        self._metrics["rate_limited"] += 1
+                if getattr(error, "status_code", None) == 429:
+                    # pause all admissions, not only this request
+                    self._paused_until = max(
+                        self._paused_until, time.monotonic() + delay
+                    )
+                attempt += 1
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+
+    # Usage accounting
+    def _record_usage(self, usage, model_name: str, started: float) -> None:
+        """Records the token usage of a call (`usage` is the API usage field)."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        call = {
+            "model": model_name,
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "cached_tokens": (getattr(details, "cached_tokens", None) or 0),
+            "completion_tokens": usage.completion_tokens or 0,
+            "latency": time.monotonic() - started,
+        }
+        with self._metrics_lock:
+            for field in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+                self._metrics[field] += call[field]
+            self._usage.append(call)
+
+    # Public API (gateway loop)
+    async def complete(
+        self,
+        messages: List[dict],
+        parameters: dict,
+        temperature: float = 0,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> str:
+        """
+        Sends a chat completion through the gateway.
+
+        Args:
+            messages (List[dict]): Chat messages.
+            parameters (dict): Application parameters (API key and model name).
+            temperature (float): Temperature setting for the LLM response.
+            priority (int): PRIORITY_INTERACTIVE or PRIORITY_BULK.
+
+        Returns:
+            str: The response text.
+        """
+        client = get_llm_client(parameters)
+        tokens = self._estimate_tokens(messages, parameters)
+
+        async def call():
+            started = time.monotonic()
+            response = await client.chat.completions.create(
+                model=parameters["model_name"],
+                temperature=temperature,
+                messages=messages,
+            )
+            self._record_usage(response.usage, parameters["model_name"], started)
+            return response
+
+        response = await self._with_retries(call, priority, tokens)
+        return response.choices[0].message.content
+
+    async def stream(
+        self,
+        messages: List[dict],
+        parameters: dict,
+        temperature: float = 0,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        """
+        Streams a chat completion through the gateway, yielding text deltas.
+        The request keeps its concurrency slot until the stream ends.
+        """
+        client = get_llm_client(parameters)
+        tokens = self._estimate_tokens(messages, parameters)
+        attempt = 0
+        while True:
+            await self._acquire(priority, tokens)
+            started = False
+            try:
+                with self._metrics_lock:
+                    self._metrics["requests"] += 1
+                request_started = time.monotonic()
+                response = await client.chat.completions.create(
+                    model=parameters["model_name"],
+                    temperature=temperature,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                # closes the HTTP response (returning its pooled connection) even
+                # when the consumer stops early
+                async with response:
+                    async for chunk in response:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            started = True
+                            yield chunk.choices[0].delta.content
+                        # the last chunk carries the usage of the whole call
+                        if getattr(chunk, "usage", None) is not None:
+                            self._record_usage(
+                                chunk.usage, parameters["model_name"], request_started
+                            )
+                return
+            except Exception as error:
+                # only retry if nothing was sent to the caller yet
+                if (
+                    started
+                    or not self._is_retryable(error)
+                    or attempt >= self.max_retries
+                ):
+                    with self._metrics_lock:
+                        self._metrics["errors"] += 1
+                    raise
+                delay = self._retry_delay(error, attempt)
+                with self._metrics_lock:
+                    self._metrics["retries"] += 1
+                attempt += 1
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+
+    # Bridges for synchronous code and other event loops
+    def submit(self, coroutine) -> Future:
+        """Schedules a coroutine on the gateway loop."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def complete_sync(self, *args, **kwargs) -> str:
+        """Blocking version of `complete`, for synchronous callers."""
+        return self.submit(self.complete(*args, **kwargs)).result()
+
+    async def acomplete(self, *args, **kwargs) -> str:
+        """Awaitable version of `complete` for callers on another event loop."""
+        return await asyncio.wrap_future(self.submit(self.complete(*args, **kwargs)))
+
+    def stream_sync(self, *args, **kwargs) -> "TokenStream":
+        """Blocking iterator over the tokens of `stream`, for synchronous callers."""
+        tokens: queue.Queue = queue.Queue()
+
+        async def pump():
+            try:
+                async for token in self.stream(*args, **kwargs):
+                    tokens.put(("token", token))
+                tokens.put(("end", None))
+            except Exception as error:
+                tokens.put(("error", error))
+
+        return TokenStream(tokens, self.submit(pump()))
+
+    def _estimate_tokens(self, messages: List[dict], parameters: dict) -> int:
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        return count_tokens(prompt, parameters["model_name"]) + self.expected_output_tokens
+
+    def usage(self) -> List[dict]:
+        """Returns the token usage of the most recent calls (oldest first)."""
+        with self._metrics_lock:
+            return list(self._usage)
+
+    def stats(self) -> dict:
+        """Returns queue depth, in-flight requests, retries, wait-time and token metrics."""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        admitted = metrics["requests"]
+        metrics["wait_time_avg"] = (
+            metrics["wait_time_total"] / admitted if admitted else 0.0
+        )
+        metrics["queue_depth"] = sum(1 for w in self._waiters if not w[3].done())
+        metrics["in_flight"] = self._in_flight
+        metrics["cache_hit_rate"] = (
+            metrics["cached_tokens"] / metrics["prompt_tokens"]
+            if metrics["prompt_tokens"]
+            else 0.0
+        )
+        return metrics
+
+
+_gateway: LLMGateway = None
+_gateway_lock = threading.Lock()
+# processes sharing the provider limits, each with its own gateway (API workers)
+_gateway_processes = 1
+
+
+def set_llm_gateway_processes(processes: int) -> None:
+    """
+    Splits the configured limits (requests and tokens per minute, concurrency)
+    among `processes` processes, so that together they stay within the provider
+    limits. Called by the pre-fork server in each worker; a gateway inherited
+    from the parent is discarded (its loop thread does not survive the fork).
+
+    Args:
+        processes (int): Number of processes calling the provider.
+    """
+    global _gateway, _gateway_processes
+    with _gateway_lock:
+        _gateway_processes = max(1, int(processes))
+        _gateway = None
+
+
+def get_llm_gateway(parameters: dict) -> LLMGateway:
+    """
+    Returns the process-wide LLM gateway, created on first use with the
+    limits defined in the parameters (this process's share of them, see
+    `set_llm_gateway_processes`).
+
+    Args:
+        parameters (dict): Application parameters.
+
+    Returns:
+        LLMGateway: The shared gateway.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(
+                requests_per_minute=float(
+                    parameters.get("llm_requests_per_minute", 500)
+                )
+                / _gateway_processes,
+                tokens_per_minute=float(
+                    parameters.get("llm_tokens_per_minute", 200_000)
+                )
+                / _gateway_processes,
+                max_concurrency=max(
+                    1, int(parameters.get("llm_max_concurrency", 8)) // _gateway_processes
+                ),
+                max_retries=int(parameters.get("llm_max_retries", 5)),
+                backoff_base=float(parameters.get("llm_backoff_base", 1)),
+                backoff_max=float(parameters.get("llm_backoff_max", 60)),
+                expected_output_tokens=int(
+                    parameters.get("llm_expected_output_tokens", 500)
+                ),
+                usage_history=int(parameters.get("llm_usage_history", 200)),
+            )
+        return _gateway
+
+
+def get_llm_gateway_stats() -> dict:
+    """Returns the metrics of the process-wide gateway (empty if not created yet)."""
+    with _gateway_lock:
+        gateway = _gateway
+    return gateway.stats() if gateway else {}
+
+
+def get_llm_gateway_usage() -> List[dict]:
+    """Returns the token usage of the most recent calls of the process-wide gateway."""
+    with _gateway_lock:
+        gateway = _gateway
+    return gateway.usage() if gateway else []
@@ -1,6 +1,6 @@
 from cryptography.fernet import Fernet
 from langchain.schema import Document
-from openai import OpenAI
+from helper_llm import get_llm_gateway, PRIORITY_INTERACTIVE
 import odf.opendocument
 import streamlit as st
 from io import BytesIO
@@ -10,6 +10,7 @@ import subprocess
 import platform
 import odf.text
 import zipfile
+import requests
 import PyPDF2
 import base64
 import time
@@ -20,11 +21,22 @@ import cv2
 import re
 import os
 
-# projects dir
+# projects dir (overridable, so the API and the Streamlit app share the same projects)
 if platform.system() == "Windows":
-    PROJECTS_DIR = "projects"
+    PROJECTS_DIR = os.getenv("PROJECTS_DIR", "projects")
 else:
-    PROJECTS_DIR = os.path.join(os.getcwd(), "projects")
+    PROJECTS_DIR = os.getenv("PROJECTS_DIR", os.path.join(os.getcwd(), "projects"))
+
+# cache dir (persistent caches shared across sessions and processes)
+if platform.system() == "Windows":
+    CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+else:
+    CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.getcwd(), "cache"))
+
+# application parameters (resolved from this file, so it works from any working dir)
+PARAMETERS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "parameters", "artifacts.yaml"
+)
 
 # Set environment variable explicitly for Tesseract (make sure it's correct for Windows)
 if platform.system() == "Windows":
@@ -38,17 +50,9 @@ def initialize_application():
     if "flag_init" not in st.session_state or not st.session_state["flag_init"]:
         os.environ["STREAMLIT_WATCH_SYSTEM_FILES"] = "false"
 
-        # read application parameters
-        data = read_yaml_file("parameters/artifacts.yaml")
-
-        # Flatten the dictionary by taking only the last level keys and values
-        parameters = {
-            key: value for subdict in data.values() for key, value in subdict.items()
-        }
-
         # Store in Streamlit session state
-        st.session_state["parameters"] = parameters
-        st.session_state["chatbots"] = {}
+        st.session_state["parameters"] = load_parameters()
+        st.session_state["chats"] = {}
 
         # set configs
         st.set_page_config(
@@ -59,6 +63,20 @@ def initialize_application():
         st.session_state["flag_init"] = True
 
 
+def load_parameters(file_path: str = PARAMETERS_PATH) -> dict:
+    """
+    Reads the application parameters, flattened to their last-level keys.
+
+    Args:
+        file_path (str): Path to the parameters YAML file.
+
+    Returns:
+        dict: The application parameters.
+    """
+    data = read_yaml_file(file_path)
+    return {key: value for subdict in data.values() for key, value in subdict.items()}
+
+
 def read_yaml_file(file_path):
     """Reads a YAML file and returns its contents as a dictionary."""
     with open(file_path, "r", encoding="utf-8") as file:
@@ -66,26 +84,40 @@ def read_yaml_file(file_path):
     return data
 
 
-def get_llm_response(prompt: str, parameters: dict, temperature: float = 0) -> str:
+def get_llm_response(
+    prompt: str,
+    parameters: dict,
+    temperature: float = 0,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> str:
     """
-    Sends a prompt to the OpenAI API and returns the response.
+    Sends a prompt to the OpenAI API through the process-wide LLM gateway
+    (rate limits, concurrency control and retries) and returns the response.
 
     Args:
         prompt (str): The prompt to send to the API.
         parameters (dict): The parameters to use for the API request.
         temperature (float): The temperature setting for the API request.
+        priority (int): PRIORITY_INTERACTIVE or PRIORITY_BULK.
 
     Returns:
         str: The response from the OpenAI API.
     """
-    client = OpenAI(api_key=parameters["key"])
-    response = client.chat.completions.create(
-        model=parameters["model_name"],
-        temperature=temperature,
-        messages=[{"role": "user", "content": prompt}],
+    return get_llm_gateway(parameters).complete_sync(
+        [{"role": "user", "content": prompt}], parameters, temperature, priority
+    )
+
+
+async def aget_llm_response(
+    prompt: str,
+    parameters: dict,
+    temperature: float = 0,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> str:
+    """Async version of `get_llm_response`, for callers running on an event loop."""
+    return await get_llm_gateway(parameters).acomplete(
+        [{"role": "user", "content": prompt}], parameters, temperature, priority
     )
-    response = response.choices[0].message.content
-    return response
 
 
 def show_sidebar():
@@ -163,10 +195,11 @@ def encrypt_password(password: str) -> str:
         return ""
 
 
-def decrypt_password(password_b64: str) -> str:
+def decrypt_password(password_b64: str, parameters: dict = None) -> str:
     """Retrieve and decrypt the Base64-encoded password."""
     try:
-        parameters = st.session_state["parameters"]
+        if parameters is None:
+            parameters = st.session_state["parameters"]
         key = parameters["secret"]
         fernet = Fernet(key)
 
@@ -397,3 +430,51 @@ def download_excel(df: pd.DataFrame) -> BytesIO:
     df.to_excel(excel_file, index=False)
     excel_file.seek(0)
     return excel_file
+
+
+def follow_job(api_url: str, job_id: str, poll_seconds: float = 2.0) -> dict:
+    """
+    Shows the progress of an API background job until it finishes. The job id
+    is kept in the page URL, so a reloaded page keeps following the same job.
+
+    Args:
+        api_url (str): URL of the API.
+        job_id (str): Id of the job.
+        poll_seconds (float): Interval between progress requests.
+
+    Returns:
+        dict: The job result (`summaries` or `data`), or None if the job failed
+        or does not exist.
+    """
+    st.query_params["job"] = job_id
+    progress = st.progress(0.0, text="Na fila...")
+    while True:
+        try:
+            response = requests.get(f"{api_url}/jobs/{job_id}", timeout=30)
+        except requests.exceptions.RequestException as e:
+            st.error(f"Erro na comunicação com o backend: {e}")
+            return None
+        job = response.json()
+        if response.status_code != 200:
+            del st.query_params["job"]
+            st.error(job.get("error", "Tarefa não encontrada."))
+            return None
+        if job["status"] == "failed":
+            del st.query_params["job"]
+            st.error(f"Erro no processamento dos arquivos: {job['error']}")
+            return None
+        if job["status"] == "done":
+            progress.progress(1.0, text=f"Concluído: {job['completed']}/{job['total']}")
+            break
+        if job["total"]:
+            progress.progress(
+                job["completed"] / job["total"],
+                text=f"Processando: {job['completed']}/{job['total']}",
+            )
+        time.sleep(poll_seconds)
+
+    try:
+        return requests.get(f"{api_url}/jobs/{job_id}/result", timeout=60).json()
+    except requests.exceptions.RequestException as e:
+        st.error(f"Erro na comunicação com o backend: {e}")
+        return None
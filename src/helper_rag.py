@@ -3,21 +3,92 @@ from prompts.prompts import (
     PROMPT_GUARDRAIL,
     PROMPT_REGULAR_REPLY,
     PROMPT_KB,
+    PROMPT_KB_SECTIONS,
     TEXT_END_PROMPT,
+    TEXT_KB_SECTIONS,
+    TEXT_QUESTION,
     TEXT_CANT_REPLY,
     TEXT_ENTER_CHAT,
 )
-from helper_methods import PROJECTS_DIR
-from parameters.offensive_words import LIST_OFFENSIVE_WORDS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from helper_methods import PROJECTS_DIR, CACHE_DIR, load_parameters
+from helper_llm import PRIORITY_BULK, PRIORITY_INTERACTIVE, get_llm_gateway
+from helper_context import KBIndex, pack_context, repair_kb_text
+from helper_registry import INDEX_REGISTRY
+from helper_index import (
+    ProjectIndex,
+    dense_search,
+    dense_search_batch,
+    fuse_hits,
+    normalized_similarity,
+    set_search_parameters,
+)
+from helper_cache import (
+    QUERY_EMBEDDING_CACHE,
+    RERANK_SCORE_CACHE,
+    SemanticAnswerCache,
+    get_semantic_cache,
+    normalize_text,
+)
+from helper_guardrail import (
+    GUARDRAIL_METRICS,
+    GuardrailVerdictCache,
+    get_embedding_guardrail,
+    get_offensive_matcher,
+    get_verdict_cache,
+    guardrail_prompt_version,
+)
 from unidecode import unidecode
-from typing import List
-from openai import OpenAI
-import streamlit as st
-import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+import numpy as np
+import hashlib
+import copy
 import os
 
+# Shared pool for the speculative guardrail / generation calls
+SPECULATIVE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=16, thread_name_prefix="rag-speculative"
+)
+
+# Pool for the per-project searches of federated queries
+FEDERATED_EXECUTOR = ThreadPoolExecutor(
+    max_workers=16, thread_name_prefix="rag-federated"
+)
+
+# Small pool for the cross-encoder passes (CPU bound, already multi-threaded by torch)
+RERANK_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-rerank")
+
+DEFAULT_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+class ResponseStream:
+    """
+    Iterable over the tokens of a streamed chatbot response.
+    Once fully consumed, `result` holds the final response dict.
+    """
+
+    def __init__(self, tokens: Iterator[str], finalize: Callable[[str], dict]) -> None:
+        """
+        Args:
+            tokens (Iterator[str]): Iterator over the response tokens.
+            finalize (Callable[[str], dict]): Builds the response dict from the full text.
+        """
+        self.tokens = tokens
+        self.finalize = finalize
+        self.result = None
+
+    def __iter__(self) -> Iterator[str]:
+        parts = []
+        try:
+            for token in self.tokens:
+                parts.append(token)
+                yield token
+        finally:
+            # abandoned by the consumer (e.g. client disconnected): stop the request
+            if hasattr(self.tokens, "close"):
+                self.tokens.close()
+        self.result = self.finalize("".join(parts).strip())
+
 
 class ChatBot:
     """
@@ -25,56 +96,94 @@ class ChatBot:
     and generating AI responses using OpenAI's LLM and FAISS for vector-based retrieval.
     """
 
-    def __init__(self, project_name: str) -> None:
+    # priority of the LLM calls in the gateway (bulk for batch answering)
+    priority = PRIORITY_INTERACTIVE
+
+    def __init__(self, project_name: str, parameters: dict = None) -> None:
         """
         Initializes the ChatBot with project-specific settings.
 
         Args:
             project_name (str): Name of the project to load FAISS database.
+            parameters (dict): Application parameters (read from `artifacts.yaml` if None).
         """
         self.PROJECTS_DIR = PROJECTS_DIR
         self.project_name = project_name
-        self.parameters = st.session_state["parameters"]
+        self.parameters = parameters if parameters is not None else load_parameters()
         self.kb_path = os.path.join(self.PROJECTS_DIR, project_name, "KB.txt")
         self.faiss_path = os.path.join(self.PROJECTS_DIR, project_name, "faiss_db")
         self.prompt_path = os.path.join(
             self.PROJECTS_DIR, project_name, "prompts", "prompt_app.txt"
         )
+        self.offensive_words_path = os.path.join(
+            self.PROJECTS_DIR, project_name, "offensive_words.txt"
+        )
         self.TEXT_ENTER_CHAT = TEXT_ENTER_CHAT
         self.flag_debug = self.parameters["debug"]
+        self.debug_messages: List[str] = []
         self.prompt_bot = self.get_prompt()
 
-        try:
-            with st.spinner("Carregando..."):
+        if not os.path.isdir(os.path.join(self.PROJECTS_DIR, project_name)):
+            raise FileNotFoundError(f"Projeto não encontrado: {project_name}")
 
-                # KB
-                if os.path.exists(self.kb_path):
-                    with open(self.kb_path, "r", encoding="utf-8") as file:
-                        self.KB = str(file.read()).strip()
-                    self.embedding_model = None
-                    self.vectorstore = None
+        # KB
+        if os.path.exists(self.kb_path):
+            with open(self.kb_path, "r", encoding="utf-8") as file:
+                self.KB = repair_kb_text(str(file.read()).strip())
+            self.embedding_model = None
 
-                # Context (vector DB)
-                else:
-                    self.KB = None
-                    encode_kwargs = {"normalize_embeddings": False}
-                    self.embedding_model = HuggingFaceEmbeddings(
-                        model_name=self.parameters["embedding"],
-                        encode_kwargs=encode_kwargs,
+            # section index (only the relevant sections are sent)
+            if self.parameters.get("kb_section_selection", True):
+                if self.parameters.get("kb_section_embeddings", True):
+                    self.embedding_model = INDEX_REGISTRY.get_embedding_model(
+                        self.parameters["embedding"]
                     )
+                self.get_kb_index()
 
-                    self.vectorstore = FAISS.load_local(
-                        self.faiss_path,
-                        self.embedding_model,
-                        allow_dangerous_deserialization=True,
-                    )
-        except Exception as e:
-            st.error(f"Erro ao carregar o chatbot: {project_name} | {e}")
+        # Context (vector DB), shared by all sessions
+        else:
+            self.KB = None
+            INDEX_REGISTRY.set_memory_budget(
+                self.parameters.get("registry_max_memory_mb", 2048)
+            )
+            self.embedding_model = INDEX_REGISTRY.get_embedding_model(
+                self.parameters["embedding"]
+            )
+            QUERY_EMBEDDING_CACHE.resize(
+                self.parameters.get("query_cache_size", 1024)
+            )
+            INDEX_REGISTRY.get_project_index(self.faiss_path)
+            if self.parameters.get("rerank", False):
+                RERANK_SCORE_CACHE.resize(
+                    self.parameters.get("rerank_cache_size", 10_000)
+                )
+                INDEX_REGISTRY.get_cross_encoder(
+                    self.parameters.get("rerank_model", DEFAULT_RERANK_MODEL)
+                )
+
+    @property
+    def project_index(self) -> ProjectIndex:
+        """
+        Returns the project's index (FAISS index, chunk store and BM25 index) from
+        the process-wide registry, so it is shared across sessions and reloaded
+        when rebuilt on disk.
+
+        Returns:
+            ProjectIndex: The project index, or None for KB projects.
+        """
+        if getattr(self, "KB", None) is not None:
+            return None
+        try:
+            return INDEX_REGISTRY.get_project_index(self.faiss_path)
+        except Exception:
+            return None
 
     def get_prompt(self) -> str:
         """
         Retrieves the prompt for the chatbot from a file or returns a default prompt.
         If the prompt file does not exist, it returns a default prompt defined in `PROMPT_CHATBOT`.
+        The prompt is sent unchanged as the system message; the context and the
+        question go in the user message (`TEXT_END_PROMPT`).
 
         Returns:
             str: The prompt string.
@@ -82,9 +191,7 @@ class ChatBot:
         try:
             if os.path.exists(self.prompt_path):
                 with open(self.prompt_path, "r", encoding="utf-8") as file:
-                    prompt_app = str(file.read()).strip()
-                    prompt_app = f"{prompt_app}\n{TEXT_END_PROMPT}"
-                    return prompt_app
+                    return str(file.read()).strip()
             return PROMPT_CHATBOT
         except Exception:
             return PROMPT_CHATBOT
@@ -99,117 +206,469 @@ class ChatBot:
         Returns:
             bool: True if the text is safe, False if it violates guidelines.
         """
-        text_clean = unidecode(text.lower())
+        if self.has_offensive_words(text):
+            GUARDRAIL_METRICS.record("word_blocked")
+            return False
 
-        for word in LIST_OFFENSIVE_WORDS:
-            if re.search(rf"\b{word}\b", text_clean):
-                return False
+        # verdicts already given for the same input (shared across processes)
+        verdict_cache = self.get_verdict_cache()
+        prompt_version = guardrail_prompt_version(self.parameters["model_name"])
+        if verdict_cache:
+            cached_verdict = verdict_cache.get(text, prompt_version)
+            if cached_verdict is not None:
+                GUARDRAIL_METRICS.record("cache_hit")
+                return cached_verdict
 
-        client = OpenAI(api_key=self.parameters["key"])
-        response = client.chat.completions.create(
-            model=self.parameters["model_name"],
+        # local tier: only ambiguous inputs escalate to the LLM guardrail
+        local_verdict = self.check_guardrail_local(text)
+        if local_verdict is not None:
+            GUARDRAIL_METRICS.record(
+                "local_allowed" if local_verdict else "local_blocked"
+            )
+            return local_verdict
+
+        response = get_llm_gateway(self.parameters).complete_sync(
+            [{"role": "user", "content": PROMPT_GUARDRAIL.format(text=text)}],
+            self.parameters,
             temperature=0,
-            messages=[{"role": "user", "content": PROMPT_GUARDRAIL.format(text=text)}],
+            priority=self.priority,
         )
-        llm_decision = response.choices[0].message.content.strip()
-        return llm_decision == "SIM"
+        # "SIM" means the text contains offensive or malicious content
+        llm_decision = unidecode(response.strip().upper())
+        is_safe = not llm_decision.startswith("SIM")
+        GUARDRAIL_METRICS.record("llm_allowed" if is_safe else "llm_blocked")
+
+        if verdict_cache:
+            verdict_cache.put(text, prompt_version, is_safe)
+        return is_safe
+
+    def check_guardrail_local(self, text: str) -> bool:
+        """
+        Classifies the input with the local embedding tier, comparing it with the
+        allowed and blocked exemplars using the shared embedding model.
+
+        Args:
+            text (str): The user's input text.
+
+        Returns:
+            bool: True (allowed), False (blocked) or None if ambiguous or disabled.
+        """
+        if not self.parameters.get("guardrail_local_tier", True):
+            return None
+        try:
+            model_name = self.parameters["embedding"]
+            embedding_model = INDEX_REGISTRY.get_embedding_model(model_name)
+            guardrail = get_embedding_guardrail(model_name, embedding_model)
+            query_vector = QUERY_EMBEDDING_CACHE.get_or_compute(
+                model_name, text, embedding_model.embed_query
+            )
+            return guardrail.classify(
+                query_vector,
+                float(self.parameters.get("guardrail_local_allow_below", -0.1)),
+                float(self.parameters.get("guardrail_local_block_above", 0.15)),
+            )
+        except Exception:
+            return None
 
-    def get_relevant_documents(self, query: str) -> List[str]:
+    def get_verdict_cache(self) -> GuardrailVerdictCache:
         """
-        Retrieves relevant documents from the FAISS vector store based on similarity search.
+        Returns the persistent guardrail verdict cache.
+
+        Returns:
+            GuardrailVerdictCache: The cache, or None if disabled or unavailable.
+        """
+        if not self.parameters.get("guardrail_cache", True):
+            return None
+        try:
+            return get_verdict_cache(
+                os.path.join(CACHE_DIR, "guardrail_verdicts.sqlite"),
+                float(self.parameters.get("guardrail_cache_ttl_hours", 24)) * 3600,
+                self.parameters.get("guardrail_cache_max_entries", 100_000),
+            )
+        except Exception:
+            return None
+
+    def has_offensive_words(self, text: str) -> bool:
+        """
+        Checks the input text against the list of offensive words (local, no LLM call),
+        including the project's extra words in `offensive_words.txt`, if any.
+
+        Args:
+            text (str): The user's input text.
+
+        Returns:
+            bool: True if the text contains an offensive word.
+        """
+        return get_offensive_matcher(self.offensive_words_path).search(text)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embeds a query through the shared query-embedding cache.
+
+        Args:
+            query (str): The user's query.
+
+        Returns:
+            np.ndarray: The query embedding.
+        """
+        return QUERY_EMBEDDING_CACHE.get_or_compute(
+            self.parameters["embedding"], query, self.embedding_model.embed_query
+        )
+
+    def answer_version(self) -> str:
+        """Returns a short hash identifying the chat prompt and model (answer cache version)."""
+        payload = f"{self.parameters['model_name']}\n{self.prompt_bot}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def get_answer_cache(self) -> SemanticAnswerCache:
+        """
+        Returns the project's semantic answer cache, which is reset automatically
+        when the project's index is rebuilt or its prompt or model change.
+
+        Returns:
+            SemanticAnswerCache: The cache, or None if disabled or not applicable.
+        """
+        if self.KB or not self.embedding_model:
+            return None
+        if not self.parameters.get("semantic_cache", True):
+            return None
+        signature = INDEX_REGISTRY.get_signature(self.faiss_path)
+        if signature is None:
+            return None
+        return get_semantic_cache(
+            self.faiss_path,
+            (signature, self.answer_version()),
+            self.parameters.get("semantic_cache_max_entries", 500),
+        )
+
+    def list_sources(self) -> List[str]:
+        """Returns the source files of the project's chunks (for filtering)."""
+        project_index = self.project_index
+        return sorted(project_index.sources) if project_index else []
+
+    def embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """
+        Embeds several queries with a single batched encoder call (cached ones are
+        reused and the new ones are added to the shared query-embedding cache).
+
+        Args:
+            queries (List[str]): The queries.
+
+        Returns:
+            List[np.ndarray]: The query embeddings, in input order.
+        """
+        return QUERY_EMBEDDING_CACHE.get_or_compute_many(
+            self.parameters["embedding"], queries, self.embedding_model.embed_documents
+        )
+
+    def get_relevant_documents(
+        self, query: str, sources: List[str] = None
+    ) -> List[dict]:
+        """
+        Retrieves relevant documents from the project index. With `hybrid_search`,
+        the dense (FAISS) and lexical (BM25) rankings are fused with reciprocal
+        rank fusion, so exact terms such as codes and names are not missed.
+        With `rerank`, more candidates are fetched and reordered by a cross-encoder.
 
         Args:
             query (str): The user's query.
+            sources (List[str]): Restricts the search to these source files (None: all).
 
         Returns:
-            List[str]: A list of relevant document contents.
+            List[dict]: The relevant chunks (document, content, score, relevance and chunk id).
+        """
+        return self.get_relevant_documents_batch([query], sources)[0]
+
+    def get_relevant_documents_batch(
+        self, queries: List[str], sources: List[str] = None
+    ) -> List[List[dict]]:
+        """
+        Retrieves the relevant documents of several queries (see
+        `get_relevant_documents`): the queries are embedded in one batched call
+        and the FAISS index is searched once for all of them.
+
+        Args:
+            queries (List[str]): The user's queries.
+            sources (List[str]): Restricts the search to these source files (None: all).
+
+        Returns:
+            List[List[dict]]: The relevant chunks of each query (None on error), in input order.
         """
         num_docs_max = int(self.parameters["MAX_DOCS"])
         try:
-            if not self.vectorstore:
-                return []
+            project_index = self.project_index
+            if not project_index:
+                return [[] for _ in queries]
 
-            docs_with_scores = self.vectorstore.similarity_search_with_score(
-                query, k=num_docs_max
+            # chunk ids of the selected files, from the precomputed ranges
+            subset = project_index.ids_for_sources(sources) if sources else None
+
+            hybrid = self.parameters.get("hybrid_search", True)
+            rerank = self.parameters.get("rerank", False)
+            num_candidates = (
+                max(num_docs_max, int(self.parameters.get("rerank_candidates", 20)))
+                if rerank
+                else num_docs_max
             )
+            fetch_k = max(num_candidates, int(self.parameters.get("hybrid_fetch_k", 20)))
+            dense_k = fetch_k if hybrid else num_candidates
+            rescore_factor = self.parameters.get("compression_rescore_factor", 4)
 
-            # filtered docs
-            filtered_docs = [
-                [doc, score]
-                for doc, score in docs_with_scores
-                if score <= self.parameters["similarity_threshold"]
-            ]
+            # dense rankings (cached query embeddings skip the model forward pass on repeats)
+            query_vectors = np.vstack(self.embed_queries(queries)).astype(np.float32)
+            set_search_parameters(project_index.index, self.parameters)
+            if subset is None:
+                all_hits = dense_search_batch(
+                    project_index.index,
+                    query_vectors,
+                    dense_k,
+                    project_index.float_vectors,
+                    rescore_factor,
+                )
+            else:
+                all_hits = [
+                    dense_search(
+                        project_index.index,
+                        query_vector,
+                        dense_k,
+                        project_index.float_vectors,
+                        rescore_factor,
+                        subset,
+                    )
+                    for query_vector in query_vectors
+                ]
 
-            # top docs
-            top_docs = [
-                {
-                    "document": doc.metadata["source"],
-                    "content": doc.page_content,
-                    "score": score,
-                }
-                for doc, score in sorted(filtered_docs, key=lambda x: x[1])[
-                    :num_docs_max
+            rrf_k = int(self.parameters.get("rrf_k", 60))
+            rankings_by_query = []
+            for query, hits in zip(queries, all_hits):
+                # lexical ranking, fused with the dense one
+                lexical = None
+                if hybrid:
+                    lexical = project_index.lexical.search(
+                        query,
+                        fetch_k,
+                        k1=self.parameters.get("bm25_k1", 1.2),
+                        b=self.parameters.get("bm25_b", 0.75),
+                        subset=subset,
+                    )
+                dense, fused, relevance = fuse_hits(
+                    hits,
+                    lexical,
+                    self.parameters["similarity_threshold"],
+                    float(self.parameters.get("bm25_min_score", 6.0)),
+                    rrf_k,
+                )
+                ranking = [idx for idx, _ in fused][:num_candidates]
+                rankings_by_query.append((dense, relevance, ranking))
+
+            # candidate docs (only these rows are read from the chunk store, at once)
+            chunks = project_index.chunks.get(
+                sorted({idx for _, _, ranking in rankings_by_query for idx in ranking})
+            )
+
+            results = []
+            for query, (dense, relevance, ranking) in zip(queries, rankings_by_query):
+                candidates = [
+                    {
+                        "id": idx,
+                        "document": chunks[idx]["source"],
+                        "content": chunks[idx]["content"],
+                        "score": dense.get(idx),
+                        "relevance": relevance[idx],
+                    }
+                    for idx in ranking
+                    if idx in chunks
                 ]
-            ]
 
-            return top_docs
+                # top docs
+                if rerank and len(candidates) > 1:
+                    candidates = self.rerank_documents(
+                        query,
+                        candidates,
+                        int(self.parameters.get("rerank_top_k", num_docs_max)),
+                    )
+                else:
+                    candidates = candidates[:num_docs_max]
+                results.append(candidates)
+            return results
         except Exception:
-            return None
+            return [None for _ in queries]
+
+    def rerank_documents(
+        self, query: str, candidates: List[dict], top_k: int
+    ) -> List[dict]:
+        """
+        Reorders the candidate chunks with a cross-encoder, scoring all uncached
+        (query, chunk) pairs in a single batched CPU pass. If the pass does not
+        finish within `rerank_budget_ms`, the retrieval order is kept.
+
+        Args:
+            query (str): The user's query.
+            candidates (List[dict]): Candidate chunks in retrieval order.
+            top_k (int): Number of chunks to keep.
+
+        Returns:
+            List[dict]: The best `top_k` chunks, with their `rerank_score`.
+        """
+        model_name = self.parameters.get("rerank_model", DEFAULT_RERANK_MODEL)
+        query_norm = normalize_text(query)
+        keys = [
+            (
+                model_name,
+                query_norm,
+                hashlib.sha1(doc["content"].encode("utf-8")).hexdigest(),
+            )
+            for doc in candidates
+        ]
+        scores = [RERANK_SCORE_CACHE.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing:
 
-    def llm_regular_reply(self, text: str, temperature: float) -> str:
+            def score_missing() -> List[float]:
+                cross_encoder = INDEX_REGISTRY.get_cross_encoder(model_name)
+                values = cross_encoder.predict(
+                    [(query, candidates[i]["content"]) for i in missing],
+                    batch_size=len(missing),
+                    show_progress_bar=False,
+                )
+                # cached even when the budget expired, so a repeat is reranked
+                for i, value in zip(missing, values):
+                    RERANK_SCORE_CACHE.put(keys[i], float(value))
+                return [float(value) for value in values]
+
+            future = RERANK_EXECUTOR.submit(score_missing)
+            try:
+                values = future.result(
+                    timeout=float(self.parameters.get("rerank_budget_ms", 300)) / 1000
+                )
+            except Exception:
+                # budget exceeded (or model error): keep the retrieval order
+                return candidates[:top_k]
+            for i, value in zip(missing, values):
+                scores[i] = value
+
+        ranked = sorted(zip(candidates, scores), key=lambda x: x[1], reverse=True)
+        return [{**doc, "rerank_score": score} for doc, score in ranked[:top_k]]
+
+    def llm_regular_reply(
+        self, text: str, temperature: float, stream: bool = False
+    ) -> Union[str, Iterator[str]]:
         """
         Generates a response from the LLM without additional context.
 
         Args:
             text (str): The user's input text.
             temperature (float): Temperature setting for the LLM response.
+            stream (bool): If True, returns an iterator over the response tokens.
 
         Returns:
-            str: The AI-generated response.
-        """
-        parameters = st.session_state["parameters"]
-        client = OpenAI(api_key=self.parameters["key"])
-        response = client.chat.completions.create(
-            model=parameters["model_name"],
-            temperature=temperature,
-            messages=[
-                {"role": "user", "content": PROMPT_REGULAR_REPLY.format(question=text)}
-            ],
-        )
-        # return response.choices[0].message.content.strip()
+            Union[str, Iterator[str]]: The AI-generated response (or its tokens).
+        """
+        messages = [
+            {"role": "system", "content": PROMPT_REGULAR_REPLY},
+            {"role": "user", "content": TEXT_QUESTION.format(question=text)},
+        ]
         self.used_gpt_api = True
-        self.api_raw_output = response.choices[0].message.content.strip()
+        if stream:
+            return get_llm_gateway(self.parameters).stream_sync(
+                messages, self.parameters, temperature, self.priority
+            )
+        response = get_llm_gateway(self.parameters).complete_sync(
+            messages, self.parameters, temperature, self.priority
+        )
+        self.api_raw_output = response.strip()
         return self.api_raw_output
 
-    def llm_kb_reply(self, input_text: str, temperature: float) -> str:
+    def get_kb_index(self) -> KBIndex:
+        """Returns the shared section index of the project's KB."""
+        return INDEX_REGISTRY.get_kb_index(
+            self.kb_path,
+            self.parameters["model_name"],
+            (
+                self.parameters["embedding"]
+                if self.parameters.get("kb_section_embeddings", True)
+                else None
+            ),
+            int(self.parameters.get("kb_section_max_chars", 1200)),
+            int(self.parameters.get("kb_section_min_chars", 200)),
+        )
+
+    def select_kb(self, input_text: str) -> Tuple[str, Dict[str, int]]:
+        """
+        Selects the KB sections relevant to the question, falling back to the
+        full KB when it is small or no section is a confident match.
+
+        Args:
+            input_text (str): The user's input text.
+
+        Returns:
+            Tuple[str, Dict[str, int]]: The KB text to send and the selection stats
+            (None when the full KB is sent).
+        """
+        if not self.parameters.get("kb_section_selection", True):
+            return self.KB, None
+        try:
+            kb_index = self.get_kb_index()
+            query_vector = (
+                self.embed_query(input_text) if kb_index.vectors is not None else None
+            )
+            selection = kb_index.select(
+                input_text,
+                query_vector,
+                int(self.parameters.get("kb_token_budget", 2000)),
+                float(self.parameters.get("kb_min_similarity", 0.35)),
+                float(self.parameters.get("kb_min_lexical_score", 3.0)),
+            )
+        except Exception:
+            selection = None
+        return selection if selection else (self.KB, None)
+
+    def llm_kb_reply(
+        self,
+        input_text: str,
+        temperature: float,
+        stream: bool = False,
+        kb_text: str = None,
+    ) -> Union[str, Iterator[str]]:
         """
         Generates a response from the LLM using the provided context.
 
         Args:
             input_text (str): The user's input text.
             temperature (float): Temperature setting for the LLM response.
+            stream (bool): If True, returns an iterator over the response tokens.
+            kb_text (str): KB sections to send (defaults to the full KB).
 
         Returns:
-            str: The AI-generated response.
-        """
-        parameters = st.session_state["parameters"]
-        client = OpenAI(api_key=self.parameters["key"])
-        response = client.chat.completions.create(
-            model=parameters["model_name"],
-            temperature=temperature,
-            messages=[
+            Union[str, Iterator[str]]: The AI-generated response (or its tokens).
+        """
+        if kb_text is None or kb_text == self.KB:
+            # full KB: identical system message on every call (cacheable prefix)
+            messages = [
+                {"role": "system", "content": PROMPT_KB.format(KB=self.KB)},
+                {"role": "user", "content": TEXT_QUESTION.format(question=input_text)},
+            ]
+        else:
+            messages = [
+                {"role": "system", "content": PROMPT_KB_SECTIONS},
                 {
                     "role": "user",
-                    "content": PROMPT_KB.format(question=input_text, KB=self.KB),
-                }
-            ],
+                    "content": TEXT_KB_SECTIONS.format(KB=kb_text, question=input_text),
+                },
+            ]
+        if stream:
+            return get_llm_gateway(self.parameters).stream_sync(
+                messages, self.parameters, temperature, self.priority
+            )
+        response = get_llm_gateway(self.parameters).complete_sync(
+            messages, self.parameters, temperature, self.priority
         )
-
-        return response.choices[0].message.content.strip()
+        return response.strip()
 
     def llm_context_reply(
-        self, input_text: str, context: str, temperature: float
-    ) -> str:
+        self, input_text: str, context: str, temperature: float, stream: bool = False
+    ) -> Union[str, Iterator[str]]:
         """
         Generates a response from the LLM using the provided context.
 
@@ -217,28 +676,70 @@ class ChatBot:
             input_text (str): The user's input text.
             context (str): Additional contextual information retrieved from documents.
             temperature (float): Temperature setting for the LLM response.
+            stream (bool): If True, returns an iterator over the response tokens.
 
         Returns:
-            str: The AI-generated response.
-        """
-        parameters = st.session_state["parameters"]
-        client = OpenAI(api_key=self.parameters["key"])
-        prompt_format = self.prompt_bot.format(question=input_text, context=context)
-        response = client.chat.completions.create(
-            model=parameters["model_name"],
-            temperature=temperature,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt_format,
-                }
-            ],
+            Union[str, Iterator[str]]: The AI-generated response (or its tokens).
+        """
+        messages = [
+            {"role": "system", "content": self.prompt_bot},
+            {
+                "role": "user",
+                "content": TEXT_END_PROMPT.format(question=input_text, context=context),
+            },
+        ]
+        if stream:
+            return get_llm_gateway(self.parameters).stream_sync(
+                messages, self.parameters, temperature, self.priority
+            )
+        response = get_llm_gateway(self.parameters).complete_sync(
+            messages, self.parameters, temperature, self.priority
         )
-        return response.choices[0].message.content.strip()
+        return response.strip()
+
+    def debug(self, debug_mode: str, message: str) -> None:
+        """Records a debug message of the current call (when debugging is on)."""
+        if self.flag_debug or debug_mode == "Sim":
+            self.debug_messages.append(message)
+
+    def build_result(
+        self,
+        reply: Union[str, Iterator[str]],
+        stream: bool,
+        finalize: Callable[[str], dict],
+    ) -> Union[dict, ResponseStream]:
+        """
+        Builds the response dict from a reply, or wraps the reply in a
+        `ResponseStream` that builds it once the tokens are consumed. The debug
+        messages of the call are added to the response (`Debug`).
+
+        Args:
+            reply (Union[str, Iterator[str]]): The full reply or its tokens.
+            stream (bool): Whether the caller asked for a streamed response.
+            finalize (Callable[[str], dict]): Builds the response dict from the full text.
+
+        Returns:
+            Union[dict, ResponseStream]: The response dict or the token stream.
+        """
+        debug_messages = list(self.debug_messages)
+
+        def finalize_with_debug(text: str) -> dict:
+            return {**finalize(text), "Debug": debug_messages}
+
+        if stream:
+            tokens = iter([reply]) if isinstance(reply, str) else reply
+            return ResponseStream(tokens, finalize_with_debug)
+        return finalize_with_debug(reply)
 
     def generate_response(
-        self, input_text: str, temperature: float, debug_mode: str
-    ) -> str:
+        self,
+        input_text: str,
+        temperature: float,
+        debug_mode: str,
+        stream: bool = False,
+        sources: List[str] = None,
+        relevant_contexts: List[dict] = None,
+    ) -> Union[dict, ResponseStream]:
         """
         Generates a chatbot response based on user input, applying guardrails and context retrieval if needed.
 
@@ -246,78 +747,384 @@ class ChatBot:
             input_text (str): The user's query.
             temperature (float): Temperature setting for the LLM response.
             debug_mode (str): Debug mode flag to control debug output.
+            stream (bool): If True, returns a `ResponseStream` that yields the tokens
+                as they arrive and exposes the final response dict in `result`.
+            sources (List[str]): Restricts the retrieval to these source files (None: all).
+            relevant_contexts (List[dict]): Documents already retrieved for this query
+                (batch answering); retrieved here if None.
 
         Returns:
-            str: The chatbot's response or a fallback message if the input is deemed unsafe.
+            Union[dict, ResponseStream]: The chatbot's response or a fallback message if the input is deemed unsafe.
+            The debug messages of the call are available in `debug_messages` (and in
+            the response's `Debug`).
         """
-        if self.check_guardrail(input_text):
-            if self.flag_debug or debug_mode == "Sim":
-                st.write("🐞 Debug: Resposta bloqueada pelo guardrail!")
+        self.debug_messages = []
+
+        # speculative mode: the guardrail runs while retrieval (and optionally
+        # generation) proceeds; the answer is only released if the input is allowed
+        speculative = bool(self.parameters.get("speculative_execution", True))
+        speculative_generation = speculative and bool(
+            self.parameters.get("speculative_generation", False)
+        )
+        guardrail_future = None
+        if speculative:
+            guardrail_future = SPECULATIVE_EXECUTOR.submit(
+                self.check_guardrail, input_text
+            )
+        elif not self.check_guardrail(input_text):
+            return self.blocked_response(stream, debug_mode)
+
+        # semantic answer cache (near-duplicate questions), not used with file filters;
+        # a cached answer also waits for the guardrail verdict of this input
+        answer_cache = None if sources else self.get_answer_cache()
+        query_vector = None
+        if answer_cache:
+            query_vector = self.embed_query(input_text)
+            cached_response = answer_cache.lookup(
+                query_vector,
+                temperature,
+                float(self.parameters.get("semantic_cache_threshold", 0.92)),
+                float(self.parameters.get("semantic_cache_temperature_band", 0.1)),
+            )
+            if cached_response:
+                if guardrail_future is not None and not guardrail_future.result():
+                    return self.blocked_response(stream, debug_mode)
+                self.debug(debug_mode, "🐞 Debug: Resposta obtida do cache semântico.")
+                cached_response["Response_Type"] = "4_Semantic_Cache"
+                return self.build_result(
+                    cached_response["Response"],
+                    stream,
+                    lambda text: cached_response,
+                )
+
+        context = ""
+        if self.KB:
+            kb_text, kb_stats = self.select_kb(input_text)
+            self.debug(debug_mode, "🐞 Debug: Respondendo usando KB.")
+            if kb_stats:
+                self.debug(
+                    debug_mode,
+                    f"🐞 Debug: {kb_stats['sections_used']}/{kb_stats['sections']} seções da KB "
+                    f"({kb_stats['tokens']} tokens, {kb_stats['tokens_saved']} tokens economizados).",
+                )
+            else:
+                self.debug(debug_mode, "🐞 Debug: KB enviada completa.")
 
+            def generate():
+                return self.llm_kb_reply(input_text, temperature, stream, kb_text)
+
+            def finalize(text: str) -> dict:
                 return {
-                    "Response_Type": "0_GUARDRAIL_BLOCK",
-                    "Response": TEXT_CANT_REPLY,
+                    "Response_Type": "1_KB",
+                    "Response": text,
                     "Context": "",
                     "Documents": [],
                 }
 
-        if self.KB:
-            if self.flag_debug or debug_mode == "Sim":
-                st.write("🐞 Debug: Respondendo usando KB.")
+        else:
+            # get relevant documents
+            if relevant_contexts is None:
+                relevant_contexts = self.get_relevant_documents(input_text, sources)
 
-            return {
-                "Response_Type": "1_KB",
-                "Response": self.llm_kb_reply(input_text, temperature),
-                "Context": "",
-                "Documents": [],
-            }
+            if not relevant_contexts:
+                self.debug(debug_mode, "🐞 Debug: Respondendo sem contexto específico.")
+
+                def generate():
+                    return self.llm_regular_reply(input_text, temperature, stream)
+
+                def finalize(text: str) -> dict:
+                    return {
+                        "Response_Type": "2_Regular",
+                        "Response": text,
+                        "Context": "",
+                        "Documents": [],
+                    }
+
+            else:
+                # build context (token budget)
+                context, relevant_contexts, context_stats = self.build_context(
+                    relevant_contexts
+                )
+                self.debug(
+                    debug_mode,
+                    f"🐞 Debug: Contexto com {context_stats['tokens']} tokens "
+                    f"({context_stats['chunks_used']}/{context_stats['chunks']} trechos, "
+                    f"{context_stats['tokens_saved']} tokens economizados).",
+                )
+                self.debug(debug_mode, f"🐞 Debug: Contexto encontrado:\n\n{context}\n\n")
+
+                def generate():
+                    return self.llm_context_reply(
+                        input_text, context, temperature, stream
+                    )
 
-        # get relevant documents
-        relevant_contexts = self.get_relevant_documents(input_text)
+                def finalize(response: str) -> dict:
+                    if (
+                        response.strip()
+                        == "Desculpe, não consigo te ajudar com essa informação."
+                    ):
+                        list_documents = []
+                        context_used = ""
+                    else:
+                        list_documents = self.list_documents(relevant_contexts)
+                        context_used = context
 
-        if not relevant_contexts:
-            if self.flag_debug or debug_mode == "Sim":
-                st.write("🐞 Debug: Respondendo sem contexto específico.")
+                    result = {
+                        "Response_Type": "3_Contextual",
+                        "Response": response,
+                        "Context": context_used,
+                        "Documents": list_documents,
+                    }
 
-            return {
-                "Response_Type": "2_Regular",
-                "Response": self.llm_regular_reply(input_text, temperature),
+                    # only answers grounded on documents are reused
+                    if answer_cache and query_vector is not None and list_documents:
+                        answer_cache.add(query_vector, temperature, result)
+
+                    # return the response with context and documents
+                    return result
+
+        reply_future = None
+        if speculative_generation:
+            reply_future = SPECULATIVE_EXECUTOR.submit(generate)
+
+        # release the answer only if the guardrail allows the input
+        if guardrail_future is not None and not guardrail_future.result():
+            self.discard(reply_future)
+            return self.blocked_response(stream, debug_mode)
+
+        # generate response
+        reply = reply_future.result() if reply_future else generate()
+        return self.build_result(reply, stream, finalize)
+
+    def generate_batch(
+        self,
+        questions: List[str],
+        temperature: float,
+        sources: List[str] = None,
+        max_concurrency: int = None,
+    ) -> Iterator[dict]:
+        """
+        Answers several questions (evaluation sets, FAQs): all questions are
+        embedded in one batched encoder call and searched in one multi-query
+        FAISS search; guardrail and generation then run with bounded concurrency
+        as bulk requests in the LLM gateway.
+
+        Args:
+            questions (List[str]): The questions.
+            temperature (float): Temperature setting for the LLM responses.
+            sources (List[str]): Restricts the retrieval to these source files (None: all).
+            max_concurrency (int): Questions answered at once (`batch_max_concurrency` if None).
+
+        Returns:
+            Iterator[dict]: The response dicts (with `index` and `question`, or `error`),
+            in input order, each yielded as soon as it and the previous ones are done.
+        """
+        if max_concurrency is None:
+            max_concurrency = int(self.parameters.get("batch_max_concurrency", 4))
+
+        # one encoder call and one index search for the whole batch
+        documents = [None for _ in questions]
+        if self.embedding_model is not None and questions:
+            self.embed_queries(questions)
+        if not self.KB and questions:
+            documents = self.get_relevant_documents_batch(questions, sources)
+
+        def answer(question: str, relevant_contexts: List[dict]) -> dict:
+            # own copy per question: the call state (debug messages) is not shared
+            bot = copy.copy(self)
+            bot.priority = PRIORITY_BULK
+            return bot.generate_response(
+                question,
+                temperature,
+                "Não",
+                sources=sources,
+                relevant_contexts=relevant_contexts,
+            )
+
+        with ThreadPoolExecutor(
+            max_workers=max(1, int(max_concurrency)), thread_name_prefix="rag-batch"
+        ) as executor:
+            futures = [
+                executor.submit(answer, question, docs)
+                for question, docs in zip(questions, documents)
+            ]
+            try:
+                for index, (question, future) in enumerate(zip(questions, futures)):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"error": str(e)}
+                    yield {"index": index, "question": question, **result}
+            finally:
+                # consumer gone: drop the questions not started yet
+                for future in futures:
+                    future.cancel()
+
+    def blocked_response(
+        self, stream: bool, debug_mode: str
+    ) -> Union[dict, ResponseStream]:
+        """Returns the fallback response for inputs blocked by the guardrail."""
+        self.debug(debug_mode, "🐞 Debug: Resposta bloqueada pelo guardrail!")
+
+        return self.build_result(
+            TEXT_CANT_REPLY,
+            stream,
+            lambda text: {
+                "Response_Type": "0_GUARDRAIL_BLOCK",
+                "Response": text,
                 "Context": "",
                 "Documents": [],
-            }
+            },
+        )
 
-        # build context
-        context = self.build_context(relevant_contexts)
-        if self.flag_debug or debug_mode == "Sim":
-            st.write(f"🐞 Debug: Contexto encontrado:\n\n{context}\n\n")
+    @staticmethod
+    def discard(future: Future) -> None:
+        """Cancels speculative work, or closes its result once it finishes."""
+        if future is None or future.cancel():
+            return
 
-        # generate response
-        response = self.llm_context_reply(input_text, context, temperature)
-        if response.strip() == "Desculpe, não consigo te ajudar com essa informação.":
-            list_documents = []
-            context = ""
-        else:
-            documents = [doc["document"] for doc in relevant_contexts]
-            list_documents = list(dict.fromkeys(documents))
-
-        # return the response with context and documents
-        return {
-            "Response_Type": "3_Contextual",
-            "Response": response,
-            "Context": context,
-            "Documents": list_documents,
+        def close_reply(done: Future) -> None:
+            try:
+                reply = done.result()
+            except Exception:
+                return
+            if hasattr(reply, "close"):
+                reply.close()
+
+        future.add_done_callback(close_reply)
+
+    def list_documents(self, relevant_contexts: List[dict]) -> list:
+        """Returns the unique source documents of the retrieved chunks (`Documents`)."""
+        return list(dict.fromkeys(doc["document"] for doc in relevant_contexts))
+
+    def build_context(
+        self, relevant_contexts: List[dict]
+    ) -> Tuple[str, List[dict], Dict[str, int]]:
+        """
+        Builds the context from the relevant documents retrieved, packed into the
+        `context_token_budget` (adjacent chunks merged, overlaps removed).
+
+        Args:
+            relevant_contexts (List[dict]): The retrieved chunks, best first.
+
+        Returns:
+            Tuple[str, List[dict], Dict[str, int]]: The context, the chunks used and the token stats.
+        """
+        return pack_context(
+            relevant_contexts,
+            int(self.parameters.get("context_token_budget", 3000)),
+            self.parameters["model_name"],
+            int(self.parameters.get("chunk_overlap", 200)),
+        )
+
+
+class FederatedChatBot(ChatBot):
+    """
+    ChatBot that answers from several projects at once: each project's index
+    (shared through the registry) is searched in parallel and the results are
+    merged by their normalized dense similarity.
+    """
+
+    def __init__(self, project_names: List[str], parameters: dict = None) -> None:
+        """
+        Initializes the shards (one ChatBot per project with a vector index;
+        KB projects are skipped).
+
+        Args:
+            project_names (List[str]): Names of the projects to search.
+            parameters (dict): Application parameters (read from `artifacts.yaml` if None).
+        """
+        self.PROJECTS_DIR = PROJECTS_DIR
+        self.project_names = sorted(project_names)
+        self.project_name = " + ".join(self.project_names)
+        self.parameters = parameters if parameters is not None else load_parameters()
+        self.kb_path = None
+        self.faiss_path = None
+        self.prompt_path = None
+        self.offensive_words_path = None
+        self.TEXT_ENTER_CHAT = TEXT_ENTER_CHAT
+        self.flag_debug = self.parameters["debug"]
+        self.debug_messages: List[str] = []
+        self.prompt_bot = PROMPT_CHATBOT
+        self.KB = None
+
+        shards = {name: ChatBot(name, self.parameters) for name in self.project_names}
+        self.shards = {name: bot for name, bot in shards.items() if bot.KB is None}
+        self.embedding_model = INDEX_REGISTRY.get_embedding_model(
+            self.parameters["embedding"]
+        )
+
+    @property
+    def project_index(self) -> ProjectIndex:
+        return None
+
+    def get_answer_cache(self) -> SemanticAnswerCache:
+        """Returns the semantic answer cache of this set of projects."""
+        if not self.shards or not self.parameters.get("semantic_cache", True):
+            return None
+        signatures = tuple(
+            INDEX_REGISTRY.get_signature(bot.faiss_path) for bot in self.shards.values()
+        )
+        if None in signatures:
+            return None
+        return get_semantic_cache(
+            "federated:" + "|".join(self.shards),
+            (signatures, self.answer_version()),
+            self.parameters.get("semantic_cache_max_entries", 500),
+        )
+
+    def get_relevant_documents_batch(
+        self, queries: List[str], sources: List[str] = None
+    ) -> List[List[dict]]:
+        """
+        Searches all projects in parallel (latency of the slowest shard) and merges
+        each query's chunks by dense similarity (cross-encoder score when reranking is on).
+
+        Args:
+            queries (List[str]): The user's queries.
+            sources (List[str]): Not supported across projects (ignored).
+
+        Returns:
+            List[List[dict]]: The relevant chunks of each query, each with its `project`.
+        """
+        if not self.shards:
+            return [[] for _ in queries]
+
+        # embed once; the shards then hit the query-embedding cache
+        self.embed_queries(queries)
+
+        futures = {
+            name: FEDERATED_EXECUTOR.submit(bot.get_relevant_documents_batch, queries)
+            for name, bot in self.shards.items()
         }
+        documents = [[] for _ in queries]
+        for name, future in futures.items():
+            for position, docs in enumerate(future.result()):
+                for doc in docs or []:
+                    documents[position].append({**doc, "project": name})
 
-    def build_context(self, relevant_contexts):
-        """Builds a context string from the relevant documents retrieved."""
-        context = ""
-        if len(relevant_contexts) > 0:
-            for dict_items in relevant_contexts:
-                document = dict_items["document"]
-                content = dict_items["content"]
-                context += f"Documento: {document}\n"
-                context += (
-                    f"### Início do conteúdo do documento: {document}\n{content}\n"
-                )
-                context += f"### Fim do documento: {document}\n\n"
-        return context
+        rerank = self.parameters.get("rerank", False)
+        num_docs_max = int(
+            self.parameters.get("rerank_top_k", self.parameters["MAX_DOCS"])
+            if rerank
+            else self.parameters["MAX_DOCS"]
+        )
+        # RRF relevance only reflects ranks (every shard's best chunk gets 1.0),
+        # so shards are merged by their dense similarity, relevance breaking ties
+        threshold = float(self.parameters["similarity_threshold"])
+        for docs in documents:
+            by_rerank_score = rerank and all("rerank_score" in doc for doc in docs)
+            docs.sort(
+                key=lambda doc: (
+                    (doc["rerank_score"],)
+                    if by_rerank_score
+                    else (normalized_similarity(doc["score"], threshold), doc["relevance"])
+                ),
+                reverse=True,
+            )
+        return [docs[:num_docs_max] for docs in documents]
+
+    def list_documents(self, relevant_contexts: List[dict]) -> list:
+        """Returns the unique source documents, attributed to their projects."""
+        keys = dict.fromkeys((doc["project"], doc["document"]) for doc in relevant_contexts)
+        return [{"project": project, "document": document} for project, document in keys]
@@ -0,0 +1,275 @@
+from langchain_huggingface import HuggingFaceEmbeddings
+from sentence_transformers import CrossEncoder
+from helper_context import KBIndex, repair_kb_text
+from helper_index import (
+    CHUNKS_FILE,
+    FLOAT_VECTORS_FILE,
+    ProjectIndex,
+    directory_signature,
+)
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+import threading
+import os
+
+
+class IndexRegistry:
+    """
+    Process-wide registry that loads embedding models and project indexes
+    once and shares them across all ChatBot sessions.
+
+    Indexes are kept in LRU order under a memory budget and are reloaded
+    automatically when their files change on disk.
+    """
+
+    def __init__(self, max_memory_mb: float = 2048) -> None:
+        """
+        Initializes an empty registry.
+
+        Args:
+            max_memory_mb (float): Memory budget (in MB) for the loaded indexes.
+        """
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._models: Dict[str, HuggingFaceEmbeddings] = {}
+        self._cross_encoders: Dict[str, CrossEncoder] = {}
+        self._indexes: "OrderedDict[str, dict]" = OrderedDict()
+        self._kb_indexes: Dict[Tuple, Tuple[Tuple, KBIndex]] = {}
+
+    def set_memory_budget(self, max_memory_mb: float) -> None:
+        """Updates the memory budget and evicts indexes that no longer fit."""
+        with self._lock:
+            self.max_memory_bytes = int(float(max_memory_mb) * 1024 * 1024)
+            self._evict_over_budget()
+
+    def get_embedding_model(self, model_name: str) -> HuggingFaceEmbeddings:
+        """
+        Returns the shared embedding model, loading it on first use.
+
+        Args:
+            model_name (str): Name of the sentence-transformers model.
+
+        Returns:
+            HuggingFaceEmbeddings: The shared embedding model.
+        """
+        return self._get_or_load_model(
+            "embedding",
+            self._models,
+            model_name,
+            lambda: HuggingFaceEmbeddings(
+                model_name=model_name,
+                encode_kwargs={"normalize_embeddings": False},
+            ),
+        )
+
+    def get_cross_encoder(self, model_name: str) -> CrossEncoder:
+        """
+        Returns the shared cross-encoder used for reranking, loading it on first use.
+
+        Args:
+            model_name (str): Name of the cross-encoder model.
+
+        Returns:
+            CrossEncoder: The shared cross-encoder (CPU).
+        """
+        return self._get_or_load_model(
+            "cross-encoder",
+            self._cross_encoders,
+            model_name,
+            lambda: CrossEncoder(model_name, device="cpu"),
+        )
+
+    def get_project_index(self, faiss_path: str) -> ProjectIndex:
+        """
+        Returns the shared search structures of a project (FAISS index, chunk
+        store, BM25 index), (re)loading them when they are not cached or when
+        their files changed on disk.
+
+        Args:
+            faiss_path (str): Path to the project's `faiss_db` directory.
+
+        Returns:
+            ProjectIndex: The shared project index.
+        """
+        signature = self.get_signature(faiss_path)
+        if signature is None:
+            self.evict(faiss_path)
+            raise FileNotFoundError(f"Índice não encontrado: {faiss_path}")
+
+        entry = self._lookup(faiss_path, signature)
+        if entry is not None:
+            return entry["project"]
+
+        # load outside the global lock, so other projects are not blocked
+        with self._get_load_lock(faiss_path):
+            entry = self._lookup(faiss_path, signature)
+            if entry is not None:
+                return entry["project"]
+
+            project = ProjectIndex(faiss_path)
+            with self._lock:
+                self._indexes[faiss_path] = {
+                    "project": project,
+                    # taken with the files loaded (legacy projects are upgraded on load)
+                    "signature": project.signature,
+                    "memory": self._estimate_memory(faiss_path),
+                }
+                self._indexes.move_to_end(faiss_path)
+                self._evict_over_budget()
+            return project
+
+    def get_kb_index(
+        self,
+        kb_path: str,
+        model_name: str,
+        embedding_model_name: str = None,
+        max_chars: int = 1200,
+        min_chars: int = 200,
+    ) -> KBIndex:
+        """
+        Returns the shared section index of a KB project, rebuilt when `KB.txt` changes.
+
+        Args:
+            kb_path (str): Path to the project's `KB.txt`.
+            model_name (str): LLM whose tokenizer counts the section tokens.
+            embedding_model_name (str): Embedding model for the sections (None: lexical only).
+            max_chars (int): Maximum section length.
+            min_chars (int): Minimum section length.
+
+        Returns:
+            KBIndex: The KB section index.
+        """
+        stat = os.stat(kb_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        key = (kb_path, model_name, embedding_model_name, max_chars, min_chars)
+        with self._lock:
+            cached = self._kb_indexes.get(key)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        with self._get_load_lock(kb_path):
+            with self._lock:
+                cached = self._kb_indexes.get(key)
+                if cached and cached[0] == signature:
+                    return cached[1]
+
+            with open(kb_path, "r", encoding="utf-8") as file:
+                text = repair_kb_text(str(file.read()).strip())
+            embedding_model = (
+                self.get_embedding_model(embedding_model_name)
+                if embedding_model_name
+                else None
+            )
+            kb_index = KBIndex(
+                text,
+                model_name,
+                embedding_model.embed_documents if embedding_model else None,
+                max_chars,
+                min_chars,
+            )
+            with self._lock:
+                self._kb_indexes[key] = (signature, kb_index)
+            return kb_index
+
+    def get_signature(self, faiss_path: str) -> Tuple:
+        """Returns the signature of an index directory (None if it does not exist)."""
+        return directory_signature(faiss_path)
+
+    def evict(self, faiss_path: str) -> None:
+        """Removes a project index from the registry."""
+        with self._lock:
+            self._indexes.pop(faiss_path, None)
+
+    def after_fork(self) -> None:
+        """
+        Prepares the registry inherited from a preloading parent (pre-fork
+        servers): the models and indexes are kept, shared copy-on-write, but
+        locks and SQLite connections are recreated in the child.
+        """
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        for entry in self._indexes.values():
+            entry["project"].chunks.reset_connections()
+
+    def clear(self) -> None:
+        """Removes all indexes from the registry (models are kept)."""
+        with self._lock:
+            self._indexes.clear()
+            self._kb_indexes.clear()
+
+    def stats(self) -> dict:
+        """Returns the loaded models, indexes and memory usage of the registry."""
+        with self._lock:
+            return {
+                "models": list(self._models),
+                "cross_encoders": list(self._cross_encoders),
+                "indexes": {
+                    path: entry["memory"] for path, entry in self._indexes.items()
+                },
+                "memory_bytes": sum(e["memory"] for e in self._indexes.values()),
+                "max_memory_bytes": self.max_memory_bytes,
+            }
+
+    def _lookup(self, faiss_path: str, signature: Tuple) -> dict:
+        """Returns the cached entry if it is still up to date, marking it as recently used."""
+        with self._lock:
+            entry = self._indexes.get(faiss_path)
+            if entry is None:
+                return None
+            if entry["signature"] != signature:
+                del self._indexes[faiss_path]
+                return None
+            self._indexes.move_to_end(faiss_path)
+            return entry
+
+    def _get_or_load_model(
+        self, kind: str, models: dict, model_name: str, load: Callable
+    ):
+        """
+        Returns a shared model, loading it once. The (slow) load runs outside the
+        global lock, so indexes and other models are not blocked meanwhile.
+        """
+        with self._lock:
+            model = models.get(model_name)
+        if model is not None:
+            return model
+
+        with self._get_load_lock(f"{kind}:{model_name}"):
+            with self._lock:
+                model = models.get(model_name)
+            if model is None:
+                model = load()
+                with self._lock:
+                    models[model_name] = model
+            return model
+
+    def _get_load_lock(self, faiss_path: str) -> threading.Lock:
+        with self._lock:
+            return self._load_locks.setdefault(faiss_path, threading.Lock())
+
+    def _estimate_memory(self, faiss_path: str) -> int:
+        """
+        Estimates the memory used by an index from the size of its files (the
+        chunk and float stores are read on demand for the top hits, so not counted).
+        """
+        try:
+            return sum(
+                entry.stat().st_size
+                for entry in os.scandir(faiss_path)
+                if entry.is_file()
+                and entry.name not in (CHUNKS_FILE, FLOAT_VECTORS_FILE)
+            )
+        except FileNotFoundError:
+            return 0
+
+    def _evict_over_budget(self) -> None:
+        """Evicts least recently used indexes until the budget is respected."""
+        total = sum(entry["memory"] for entry in self._indexes.values())
+        while total > self.max_memory_bytes and len(self._indexes) > 1:
+            _, entry = self._indexes.popitem(last=False)
+            total -= entry["memory"]
+
+
+# Process-wide registry shared by all sessions
+INDEX_REGISTRY = IndexRegistry()
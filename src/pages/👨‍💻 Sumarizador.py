@@ -3,7 +3,12 @@ import tempfile
 import requests
 import os
 
-from helper_methods import initialize_application, show_sidebar, check_run_docker
+from helper_methods import (
+    initialize_application,
+    show_sidebar,
+    check_run_docker,
+    follow_job,
+)
 
 # Setup
 initialize_application()
@@ -42,31 +47,21 @@ if st.button("Gerar Resumo"):
                 with open(path, "rb") as f:
                     files_to_send.append(("files", (file.name, f.read())))
 
-            # api request
+            # api request (the summaries are generated in a background job, followed below)
             try:
                 response = requests.post(
-                    f"{API_URL}/summarize/",
+                    f"{API_URL}/jobs/summarize",
                     data={
                         "word_limit": word_limit,
                         "summarize_all": summarize_flag,
                         "additional_info": additional_info,
-                        "parameters": str(st.session_state["parameters"]),
                     },
                     files=files_to_send,
+                    timeout=120,  # upload only
                 )
 
                 if response.status_code == 200:
-                    summaries = response.json().get("summaries", {})
-                    if len(summaries) == 0:
-                        st.warning("Nenhum resumo encontrado.")
-                    else:
-                        st.subheader("Resumo")
-                        for doc, summary in summaries.items():
-                            if doc != "_All_Docs_":
-                                if "/" in doc:
-                                    doc = doc.split("/")[-1]
-                                st.markdown(f"**📝 {doc}**")
-                            st.write(summary)
+                    st.query_params["job"] = response.json()["id"]
                 else:
                     st.error("Erro ao processar documentos.")
 
@@ -74,3 +69,21 @@ if st.button("Gerar Resumo"):
                 st.error("Erro na API de processamento.")
     else:
         st.warning("Envie ao menos um arquivo.")
+
+# job in progress (also after a page reload)
+if "job" in st.query_params:
+    result = follow_job(API_URL, st.query_params["job"])
+    if result is not None:
+        summaries = result.get("summaries", {})
+        if len(summaries) == 0:
+            st.warning("Nenhum resumo encontrado.")
+        else:
+            st.subheader("Resumo")
+            for doc, summary in summaries.items():
+                if doc != "_All_Docs_":
+                    if "/" in doc:
+                        doc = doc.split("/")[-1]
+                    st.markdown(f"**📝 {doc}**")
+                st.write(summary)
+        for doc, error in result.get("errors", {}).items():
+            st.error(f"Erro ao processar {doc}: {error}")
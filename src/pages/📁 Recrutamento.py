@@ -4,6 +4,7 @@ from helper_methods import (
     check_run_docker,
     convert_data,
     download_excel,
+    follow_job,
 )
 import streamlit as st
 import requests
@@ -39,7 +40,7 @@ if st.button("Upload"):
     elif not uploaded_files:
         st.error("Por favor, carregue ao menos um arquivo.")
     else:
-        with st.spinner("Processando arquivos..."):
+        with st.spinner("Enviando arquivos..."):
             # Prepare files for POST request
             files_data = [
                 ("files", (f.name, f.getbuffer(), f.type)) for f in uploaded_files
@@ -48,41 +49,44 @@ if st.button("Upload"):
             payload = {
                 "job_title": job_title,
                 "job_description": job_description,
-                "parameters": str(st.session_state["parameters"]),
             }
 
+            # the CVs are evaluated in a background job, followed below
             try:
                 response = requests.post(
-                    f"{API_URL}/recrutamento/",
+                    f"{API_URL}/jobs/recrutamento",
                     data=payload,
                     files=files_data,
-                    timeout=120,  # adjust if needed
+                    timeout=120,  # upload only
                 )
             except requests.exceptions.RequestException as e:
                 st.error(f"Erro na comunicação com o backend: {e}")
                 st.stop()
 
             if response.status_code == 200:
-                resp_json = response.json()
-                if "data" in resp_json and resp_json["data"]:
-                    data = resp_json["data"]
-                    df = convert_data(data)
-                    if len(df) == 0:
-                        st.warning(
-                            "Nenhum candidato válido foi encontrado nos arquivos."
-                        )
-                        st.stop()
-                    else:
-                        st.dataframe(df)
-                        st.download_button(
-                            label="Download Excel",
-                            data=download_excel(df),
-                            file_name="avaliacao_candidatos.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        )
-                else:
-                    st.error("Nenhum dado retornado do backend.")
+                st.query_params["job"] = response.json()["id"]
             else:
                 st.error(
                     f"Erro no processamento dos arquivos: {response.status_code} - {response.text}"
                 )
+
+# job in progress (also after a page reload)
+if "job" in st.query_params:
+    resp_json = follow_job(API_URL, st.query_params["job"])
+    if resp_json is not None:
+        data = [item for item in resp_json.get("data", []) if "error" not in item]
+        if data:
+            df = convert_data(data)
+            if len(df) == 0:
+                st.warning("Nenhum candidato válido foi encontrado nos arquivos.")
+                st.stop()
+            else:
+                st.dataframe(df)
+                st.download_button(
+                    label="Download Excel",
+                    data=download_excel(df),
+                    file_name="avaliacao_candidatos.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                )
+        else:
+            st.error("Nenhum dado retornado do backend.")
@@ -1,8 +1,15 @@
-from helper_methods import initialize_application, show_sidebar, PROJECTS_DIR
+from helper_methods import (
+    initialize_application,
+    show_sidebar,
+    check_run_docker,
+    PROJECTS_DIR,
+)
+from helper_guardrail import GuardrailMetrics
 from matplotlib.ticker import MaxNLocator
 import matplotlib.pyplot as plt
 import streamlit as st
 import pandas as pd
+import requests
 import json
 import os
 
@@ -10,11 +17,27 @@ import os
 initialize_application()
 show_sidebar()
 
+# map origin
+if check_run_docker():
+    API_URL = os.getenv("API_URL", "http://fastapi:8000").split(",")[0]
+else:
+    API_URL = os.getenv("API_URL", "http://localhost:8000").split(",")[0]
+
 st.header("📊 Dashboard: Estatísticas dos Projetos")
 st.write("")
 st.write("")
 
 
+def load_api_metrics():
+    """Fetches the performance metrics of the API (summed across its workers)."""
+    try:
+        response = requests.get(f"{API_URL}/metrics", timeout=10)
+        response.raise_for_status()
+        return response.json()
+    except Exception:
+        return None
+
+
 def load_project_metadata():
     """Loads metadata for all projects from the projects directory."""
     try:
@@ -35,6 +58,7 @@ def load_project_metadata():
 
 # Load project data
 projects_metadata = load_project_metadata()
+api_metrics = load_api_metrics()
 
 if not projects_metadata:
     st.warning("Nenhum projeto foi cadastrado ainda.")
@@ -197,3 +221,97 @@ else:
             st.subheader("📁 Arquivos do Projeto")
             for file in selected_project["files"]:
                 st.write(f"- {file['file_name']} ({file['word_count']} palavras)")
+
+    # Index memory (before/after compression)
+    with st.expander("💾 Memória dos Índices", expanded=False):
+        st.write(
+            "Memória estimada de cada projeto: vetores sem compressão, índice FAISS efetivamente carregado e textos dos trechos. Use para dimensionar os containers."
+        )
+        memory_rows = [
+            {
+                "Nome do Projeto": metadata["project_name"],
+                "Tipo de Índice": metadata.get("index_type", "-"),
+                "Compressão": metadata.get("compression", "none"),
+                "Vetores sem compressão (MB)": metadata["memory"]["vectors_uncompressed_bytes"] / 2**20,
+                "Índice carregado (MB)": metadata["memory"]["index_bytes"] / 2**20,
+                "Trechos (MB)": metadata["memory"]["chunks_bytes"] / 2**20,
+            }
+            for metadata in projects_metadata
+            if "memory" in metadata
+        ]
+        if memory_rows:
+            df_memory = pd.DataFrame(memory_rows)
+            col1, col2 = st.columns(2)
+            col1.metric(
+                "📦 Sem compressão (total)",
+                f"{df_memory['Vetores sem compressão (MB)'].sum():.1f} MB",
+            )
+            col2.metric(
+                "🗜️ Índices carregados (total)",
+                f"{df_memory['Índice carregado (MB)'].sum():.1f} MB",
+            )
+            st.dataframe(df_memory.round(2))
+        else:
+            st.write("Nenhum projeto com informações de memória (recrie o índice do projeto).")
+
+        if api_metrics:
+            for registry_stats in api_metrics["registry"]:
+                st.write(
+                    f"**Índices em memória no processo {registry_stats['pid']} da API:** {registry_stats['indexes']} "
+                    f"({registry_stats['memory_bytes'] / 2**20:.1f} MB de {registry_stats['max_memory_bytes'] / 2**20:.0f} MB)"
+                )
+
+    # Performance metrics (API workers)
+    with st.expander("⚡ Desempenho do Chatbot", expanded=False):
+        if not api_metrics:
+            st.warning("Não foi possível obter as métricas da API.")
+            st.stop()
+        st.write(
+            "Métricas desde o último reinício da API, somadas entre os seus "
+            f"{api_metrics['workers']} processos: como as verificações do guardrail foram resolvidas e o uso do cache de embeddings de consultas."
+        )
+        guardrail_stats = api_metrics["guardrail"]
+        col1, col2, col3 = st.columns(3)
+        col1.metric("🛡️ Verificações do Guardrail", guardrail_stats["total"])
+        col2.metric("🏠 Resolvidas localmente", f"{guardrail_stats['local_rate']:.0%}")
+        col3.metric("💸 Sem chamada ao LLM", f"{guardrail_stats['no_llm_rate']:.0%}")
+        st.dataframe(
+            pd.DataFrame(
+                [
+                    {"Resultado": outcome, "Quantidade": guardrail_stats[outcome]}
+                    for outcome in GuardrailMetrics.OUTCOMES
+                ]
+            )
+        )
+
+        query_cache_stats = api_metrics["query_cache"]
+        col1, col2 = st.columns(2)
+        col1.metric("🔁 Consultas em cache", query_cache_stats["size"])
+        col2.metric("🎯 Taxa de acerto do cache", f"{query_cache_stats['hit_rate']:.0%}")
+
+        llm_stats = api_metrics["llm"]
+        if llm_stats:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("📨 Chamadas ao LLM", llm_stats["requests"])
+            col2.metric("⏳ Fila atual", llm_stats["queue_depth"])
+            col3.metric("⏱️ Espera média", f"{llm_stats['wait_time_avg']:.2f}s")
+            col4.metric("🔁 Novas tentativas", llm_stats["retries"])
+
+            col1, col2, col3 = st.columns(3)
+            col1.metric("🧾 Tokens de prompt", f"{llm_stats['prompt_tokens']:,}")
+            col2.metric("♻️ Tokens em cache", f"{llm_stats['cached_tokens']:,}")
+            col3.metric("🎯 Taxa de cache do prompt", f"{llm_stats['cache_hit_rate']:.0%}")
+
+            llm_usage = api_metrics["llm_usage"]
+            if llm_usage:
+                st.dataframe(
+                    pd.DataFrame(llm_usage).rename(
+                        columns={
+                            "model": "Modelo",
+                            "prompt_tokens": "Tokens de prompt",
+                            "cached_tokens": "Tokens em cache",
+                            "completion_tokens": "Tokens gerados",
+                            "latency": "Latência (s)",
+                        }
+                    ).round(2)
+                )
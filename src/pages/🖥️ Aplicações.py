@@ -7,14 +7,22 @@ from helper_methods import (
 )
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document as langchain_Document
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
 from helper_spingestion import SharePointDownloader
+from helper_registry import INDEX_REGISTRY
+from helper_index import (
+    CHUNKS_FILE,
+    COMPRESSION_MODES,
+    get_compression,
+    resolve_index_factory,
+    save_project_index,
+)
 from typing import Tuple, Dict
 from datetime import datetime
 from docx import Document
 import streamlit as st
 import pandas as pd
+import numpy as np
+import faiss
 import pdfplumber
 import tempfile
 import zipfile
@@ -125,8 +133,12 @@ def extract_text_and_word_count(file_path: str) -> Tuple[str, int]:
 
 
 def save_context_database(
-    project_name: str, dict_projects_text: Dict[str, str], total_word_count: int
-) -> None:
+    project_name: str,
+    dict_projects_text: Dict[str, str],
+    total_word_count: int,
+    index_factory: str = None,
+    compression: str = None,
+) -> Dict[str, any]:
     """
     Saves extracted text data either as a plain text file (if word count is small) or as a FAISS vector database.
 
@@ -134,6 +146,13 @@ def save_context_database(
         project_name (str): Name of the project.
         dict_projects_text (Dict[str, str]): Dictionary containing filenames and their corresponding extracted text.
         total_word_count (int): Total word count of all extracted text.
+        index_factory (str): FAISS index factory string; chosen by corpus size if empty.
+        compression (str): Vector compression mode (none, sq8, pq, opq, pca); defaults to `index_compression`.
+            Only used when `index_factory` is empty: an explicit factory string
+            already defines the compression (e.g. `IVF1024,PQ32`).
+
+    Returns:
+        Dict[str, any]: Index information for the project metadata (type, compression and memory).
     """
     parameters = st.session_state["parameters"]
     project_dir = os.path.join(PROJECTS_DIR, project_name)
@@ -146,7 +165,8 @@ def save_context_database(
         kb_path = os.path.join(project_dir, "KB.txt")
         with open(kb_path, "w", encoding="utf-8") as file:
             all_text = list(dict_projects_text.values())[0]
-            file.write("\n".join(all_text))
+            file.write(all_text)
+        return {"index_type": "KB"}
 
     # Context (vector DB)
     else:
@@ -170,18 +190,48 @@ def save_context_database(
                 )
                 split_documents.append(doc)
 
-        # embedding model
-        embedding_model = HuggingFaceEmbeddings(
-            model_name=parameters["embedding"],
-            encode_kwargs={"normalize_embeddings": False},
+        # embedding model (shared with the chatbots)
+        embedding_model = INDEX_REGISTRY.get_embedding_model(parameters["embedding"])
+
+        vectors = np.asarray(
+            embedding_model.embed_documents(
+                [doc.page_content for doc in split_documents]
+            ),
+            dtype=np.float32,
         )
 
-        vectorstore = FAISS.from_documents(split_documents, embedding_model)
-        vectorstore.save_local(faiss_path)
+        # index type: per-project override, or chosen by corpus size (+ compression)
+        index_factory, warnings = resolve_index_factory(
+            len(split_documents),
+            vectors.shape[1],
+            parameters,
+            index_factory,
+            compression,
+        )
+        for warning in warnings:
+            st.warning(warning)
+
+        # index, chunk store, lexical index, source ranges and float store
+        # (chunk ids are the positions in the index)
+        index = save_project_index(faiss_path, split_documents, vectors, index_factory)
+
+        return {
+            "index_type": index_factory,
+            "compression": get_compression(index_factory),
+            "memory": {
+                "vectors_uncompressed_bytes": int(vectors.nbytes),
+                "index_bytes": int(faiss.serialize_index(index).nbytes),
+                "chunks_bytes": os.path.getsize(os.path.join(faiss_path, CHUNKS_FILE)),
+            },
+        }
 
 
 def process_files_and_store_embeddings(
-    project_name: str, project_owner: str, password: str
+    project_name: str,
+    project_owner: str,
+    password: str,
+    index_factory: str = "",
+    compression: str = None,
 ) -> None:
     """
     Processes uploaded files, extracts content, and stores embeddings.
@@ -189,6 +239,8 @@ def process_files_and_store_embeddings(
     Args:
         project_name (str): Name of the project.
         project_owner (str): Owner of the project.
+        index_factory (str): FAISS index factory string (empty: chosen by corpus size).
+        compression (str): Vector compression mode (empty: `index_compression` parameter).
     """
     project_path = os.path.join(PROJECTS_DIR, project_name)
     files_path = os.path.join(project_path, "files")
@@ -210,6 +262,7 @@ def process_files_and_store_embeddings(
             "flag_password": flag_password,
             "password": encrypt_password(password),
             "creation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "index_factory": index_factory,
             "files": [],
         }
 
@@ -227,13 +280,21 @@ def process_files_and_store_embeddings(
             st.write(f"📝 Processando arquivo: {file_name} ({word_count} palavras)")
             metadata["files"].append({"file_name": file_name, "word_count": word_count})
 
-        # save metadata
         if qtd_projects > 0:
+            # save files
+            metadata.update(
+                save_context_database(
+                    project_name,
+                    dict_projects_text,
+                    total_word_count,
+                    index_factory,
+                    compression,
+                )
+            )
+
+            # save metadata
             with open(metadata_path, "w", encoding="utf-8") as f:
                 json.dump(metadata, f, indent=4)
-
-            # save files
-            save_context_database(project_name, dict_projects_text, total_word_count)
             return True
         else:
             return False
@@ -277,6 +338,7 @@ with tab1:
                 st.write(f"**Dono do Projeto:** {metadata['project_owner']}")
                 st.write(f"**Data de criação:** {metadata['creation_date']}")
                 st.write(f"**Arquivos submetidos:** {len(metadata['files'])}")
+                st.write(f"**Tipo de índice:** {metadata.get('index_type', 'Flat')}")
 
                 if len(metadata["files"]) <= 10:
 
@@ -306,6 +368,23 @@ with tab2:
                 "Prompt do projeto:", height=200, key="prompt_input_1"
             )
 
+        # index type
+        with st.expander("Índice vetorial (opcional)"):
+            index_factory = st.text_input(
+                "Tipo de índice FAISS (ex.: Flat, HNSW32,Flat, IVF1024,Flat):",
+                placeholder="Automático (pelo tamanho do corpus)",
+                key="index_input_1",
+            )
+            compression = st.selectbox(
+                "Compressão dos vetores:",
+                COMPRESSION_MODES,
+                index=COMPRESSION_MODES.index(
+                    st.session_state["parameters"].get("index_compression", "none")
+                ),
+                help="Ignorada quando o tipo de índice é informado (ex.: IVF1024,PQ32 já define a compressão).",
+                key="compression_input_1",
+            )
+
         # Choose upload mode
         upload_mode = st.radio(
             "Como deseja inserir os documentos?",
@@ -473,7 +552,7 @@ with tab2:
                 # processing files
                 with st.spinner(f"Processando {frase}..."):
                     flag_success = process_files_and_store_embeddings(
-                        project_name, project_owner, password
+                        project_name, project_owner, password, index_factory, compression
                     )
 
                 parameters = st.session_state["parameters"]
@@ -582,6 +661,29 @@ with tab3:
                 else:
                     password = ""
 
+                # index type
+                with st.expander("Índice vetorial (opcional)"):
+                    index_factory = st.text_input(
+                        "Tipo de índice FAISS (ex.: Flat, HNSW32,Flat, IVF1024,Flat):",
+                        value=metadata.get("index_factory", ""),
+                        placeholder="Automático (pelo tamanho do corpus)",
+                        key="index_input_2",
+                    )
+                    compression = st.selectbox(
+                        "Compressão dos vetores:",
+                        COMPRESSION_MODES,
+                        index=COMPRESSION_MODES.index(
+                            metadata.get(
+                                "compression",
+                                st.session_state["parameters"].get(
+                                    "index_compression", "none"
+                                ),
+                            )
+                        ),
+                        help="Ignorada quando o tipo de índice é informado (ex.: IVF1024,PQ32 já define a compressão).",
+                        key="compression_input_2",
+                    )
+
                 # Choose upload mode
                 upload_mode = st.radio(
                     "Como deseja inserir os documentos?",
@@ -767,7 +869,11 @@ with tab3:
                         # processing files
                         with st.spinner(f"Processando {frase}..."):
                             flag_success = process_files_and_store_embeddings(
-                                project_name, project_owner, project_password
+                                project_name,
+                                project_owner,
+                                project_password,
+                                index_factory,
+                                compression,
                             )
 
                         # Save file
@@ -1,14 +1,16 @@
 from helper_methods import (
     initialize_application,
     show_sidebar,
-    decrypt_password,
+    check_run_docker,
     PROJECTS_DIR,
 )
-from helper_rag import ChatBot
-from typing import List, Dict
+from prompts.prompts import TEXT_ENTER_CHAT
+from typing import Iterator, List, Dict
+from urllib.parse import quote
 from datetime import datetime
 import streamlit as st
 from gtts import gTTS
+import requests
 import json
 import os
 
@@ -17,6 +19,12 @@ import os
 initialize_application()
 show_sidebar()
 
+# map origin (the chatbot runs in the API)
+if check_run_docker():
+    API_URL = os.getenv("API_URL", "http://fastapi:8000").split(",")[0]
+else:
+    API_URL = os.getenv("API_URL", "http://localhost:8000").split(",")[0]
+
 # Cria diretório para áudios se não existir
 AUDIO_DIR = "static_audio"
 os.makedirs(AUDIO_DIR, exist_ok=True)
@@ -36,23 +44,85 @@ def get_projects() -> List[str]:
         return []
 
 
-def save_log(project_name, user_input, result_text) -> None:
-    """Logs a single chatbot interaction to a JSONL file."""
-    try:
-        log_path = os.path.join(PROJECTS_DIR, project_name, "logs")
-        os.makedirs(log_path, exist_ok=True)
-
-        log_file = os.path.join(log_path, f"chat_log_{datetime.now().date()}.jsonl")
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "user_input": user_input,
-            "bot_response": result_text,
-        }
-
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-    except Exception:
-        pass
+def get_federated_projects(projects: List[str]) -> List[str]:
+    """Returns the projects that can be searched together (vector index, no password)."""
+    federated_projects = []
+    for project_name in projects:
+        project_path = os.path.join(PROJECTS_DIR, project_name)
+        try:
+            with open(
+                os.path.join(project_path, "metadata.json"), "r", encoding="utf-8"
+            ) as f:
+                metadata = json.load(f)
+        except Exception:
+            continue
+        if not metadata.get("flag_password") and os.path.isdir(
+            os.path.join(project_path, "faiss_db")
+        ):
+            federated_projects.append(project_name)
+    return federated_projects
+
+
+def read_events(response: requests.Response) -> Iterator[tuple]:
+    """Parses a Server-Sent Events response into (event, data) pairs."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def chat_url(chat: dict) -> str:
+    """Returns the API endpoint of a chat (single project or federated)."""
+    if chat["projects"]:
+        return f"{API_URL}/chat"
+    return f"{API_URL}/chat/{quote(chat['project'], safe='')}"
+
+
+def api_timeout() -> tuple:
+    """Returns the (connect, read) timeouts of the chat API requests."""
+    parameters = st.session_state["parameters"]
+    return (
+        float(parameters.get("api_connect_timeout", 10)),
+        # maximum wait for the next bytes (e.g. the first token of an answer)
+        float(parameters.get("api_read_timeout", 120)),
+    )
+
+
+def start_chat(project: str, projects: List[str], password: str = "") -> dict:
+    """
+    Opens a chat with the API: checks the password and warms the project on the
+    server (returns the error message instead if it fails).
+    """
+    sources = []
+    if not projects:
+        try:
+            response = requests.post(
+                f"{API_URL}/chat/{quote(project, safe='')}/sources",
+                json={"password": password},
+                timeout=api_timeout(),
+            )
+        except requests.RequestException:
+            return {"error": "Não foi possível conectar à API do chatbot."}
+        if response.status_code != 200:
+            return {"error": response.json().get("error", "Erro ao iniciar o chatbot.")}
+        sources = response.json()["sources"]
+
+    return {
+        "project": project,
+        "projects": projects,
+        "password": password,
+        "sources": sources,
+        "messages": [{"role": "assistant", "content": TEXT_ENTER_CHAT}],
+        "last_docs": [],
+    }
 
 
 def chatbot_page() -> None:
@@ -63,64 +133,68 @@ def chatbot_page() -> None:
         )
         return
 
-    project_name = st.selectbox("Projeto:", [""] + projects)
-    if project_name == "":
-        st.write("\nPor favor, selecione um projeto para começar.")
-        return
-
     # parameters
     parameters = st.session_state["parameters"]
 
-    if "chatbots" not in st.session_state:
-        st.session_state["chatbots"] = {}
+    if "chats" not in st.session_state:
+        st.session_state["chats"] = {}
 
-    if project_name not in st.session_state["chatbots"]:
-        project_path = os.path.join(PROJECTS_DIR, project_name)
-        metadata_path = os.path.join(project_path, "metadata.json")
-        PASSWORD_ADMIN = parameters["admin"]
-
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
-            flag_password = metadata["flag_password"]
-            project_password = decrypt_password(metadata["password"].strip()).strip()
-
-        # if password
-        if flag_password:
-            password = st.text_input("Senha do projeto:", type="password")
-        else:
-            password = ""
-
-        if st.button("Iniciar Chatbot"):
-            password_input = password.strip()
-
-            # Check if the password is required and if it is empty
-            if flag_password and password_input == "":
-                st.error("Por favor, digite a senha do projeto.")
-                return
-
-            # Check if the password is correct
-            if (
-                flag_password
-                and password_input != project_password
-                and password_input != PASSWORD_ADMIN
-            ):
-                st.error("Senha incorreta.")
-                return
-
-            # Initialize the chatbot application
-            chatbot = ChatBot(project_name)
-            st.session_state["chatbots"][project_name] = {
-                "chatbot": chatbot,
-                "messages": [
-                    {
-                        "role": "assistant",
-                        "content": chatbot.TEXT_ENTER_CHAT,
-                    }
-                ],
-                "last_docs": [],  # Inicializa vazio
-            }
-
-    if project_name in st.session_state["chatbots"]:
+    query_mode = st.radio(
+        "Modo de consulta:",
+        ["Projeto único", "Vários projetos"],
+        horizontal=True,
+        key="radio_query_mode",
+    )
+
+    # Federated mode: several projects searched at once
+    if query_mode == "Vários projetos":
+        selected_projects = st.multiselect(
+            "Projetos (sem senha):", get_federated_projects(projects)
+        )
+        if len(selected_projects) < 2:
+            st.write("\nPor favor, selecione ao menos dois projetos para começar.")
+            return
+
+        project_name = "federado:" + "|".join(sorted(selected_projects))
+        if project_name not in st.session_state["chats"] and st.button(
+            "Iniciar Chatbot"
+        ):
+            st.session_state["chats"][project_name] = start_chat(
+                project_name, sorted(selected_projects)
+            )
+
+    else:
+        project_name = st.selectbox("Projeto:", [""] + projects)
+        if project_name == "":
+            st.write("\nPor favor, selecione um projeto para começar.")
+            return
+
+        if project_name not in st.session_state["chats"]:
+            metadata_path = os.path.join(PROJECTS_DIR, project_name, "metadata.json")
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                flag_password = json.load(f)["flag_password"]
+
+            # if password
+            if flag_password:
+                password = st.text_input("Senha do projeto:", type="password")
+            else:
+                password = ""
+
+            if st.button("Iniciar Chatbot"):
+                # the password is checked by the API
+                with st.spinner("Carregando..."):
+                    try:
+                        chat = start_chat(project_name, [], password.strip())
+                    except Exception:
+                        st.error("Erro na API do chatbot.")
+                        return
+                if "error" in chat:
+                    st.error(chat["error"])
+                    return
+                st.session_state["chats"][project_name] = chat
+
+    if project_name in st.session_state["chats"]:
+        chat = st.session_state["chats"][project_name]
 
         # Create two columns for temperature and debug mode side by side
         col1, col2, _, _, _ = st.columns([1, 1, 1, 1, 1])
@@ -141,10 +215,16 @@ def chatbot_page() -> None:
             )
             temperature = float(temperature)
 
-        bot: ChatBot = st.session_state["chatbots"][project_name]["chatbot"]
-        list_messages: List[Dict[str, str]] = st.session_state["chatbots"][
-            project_name
-        ]["messages"]
+        # restrict the answers to some files of the project
+        sources = None
+        if len(chat["sources"]) > 1:
+            sources = st.multiselect(
+                "📁 Filtrar por arquivos (opcional):",
+                chat["sources"],
+                key=f"sources_{project_name}",
+            )
+
+        list_messages: List[Dict[str, str]] = chat["messages"]
 
         for message in list_messages:
             with st.chat_message(message["role"]):
@@ -153,52 +233,84 @@ def chatbot_page() -> None:
         user_input = st.chat_input("Digite sua mensagem...")
 
         if user_input and user_input != "":
-            st.session_state["chatbots"][project_name]["messages"].append(
-                {"role": "user", "content": user_input}
-            )
+            chat["messages"].append({"role": "user", "content": user_input})
             with st.chat_message("user"):
                 st.write(user_input)
 
-        list_messages = st.session_state["chatbots"][project_name]["messages"]
+        list_messages = chat["messages"]
         if list_messages[-1]["role"] != "assistant":
             with st.chat_message("assistant"):
-                with st.spinner("Gerando resposta..."):
-                    result_dict = bot.generate_response(
-                        user_input, temperature, debug_mode
-                    )
-                    response = result_dict["Response"]
-                    st.write(response)
-
-                    # Update documents
-                    docs = result_dict.get("Documents", [])
-                    st.session_state["chatbots"][project_name]["last_docs"] = docs
+                result_dict = {}
+
+                def tokens() -> Iterator[str]:
+                    """Streams the answer from the API (the log is saved by the API)."""
+                    with requests.post(
+                        chat_url(chat),
+                        json={
+                            "message": user_input,
+                            "temperature": temperature,
+                            "debug": debug_mode == "Sim",
+                            "password": chat["password"],
+                            "sources": sources or None,
+                            "projects": chat["projects"],
+                        },
+                        stream=True,
+                        timeout=api_timeout(),
+                    ) as response:
+                        if response.status_code != 200:
+                            yield response.json().get("error", "Erro na API do chatbot.")
+                            return
+                        for event, data in read_events(response):
+                            if event == "debug":
+                                st.write(data)
+                            elif event == "token":
+                                yield data
+                            elif event == "result":
+                                result_dict.update(data)
+                            elif event == "error":
+                                st.error(f"Erro ao gerar resposta: {data}")
+
+                # render tokens as they arrive
+                try:
+                    streamed = st.write_stream(tokens())
+                except Exception:
+                    streamed = "Erro na API do chatbot."
+                    st.error(streamed)
+                response = result_dict.get("Response", streamed)
 
-                    # Save log to text
-                    save_log(project_name, user_input, result_dict)
+                # Update documents
+                chat["last_docs"] = result_dict.get("Documents", [])
 
-            st.session_state["chatbots"][project_name]["messages"].append(
-                {"role": "assistant", "content": response}
-            )
+            chat["messages"].append({"role": "assistant", "content": response})
 
             st.session_state["last_response_text"] = response
 
         # Mostrar documentos relacionados SOMENTE se houver
-        docs = st.session_state["chatbots"][project_name].get("last_docs", [])
+        docs = chat.get("last_docs", [])
         if docs:
             frase = (
                 "Documento relacionado" if len(docs) == 1 else "Documentos relacionados"
             )
             with st.expander(frase, expanded=False):
-                for path in docs:
+                for doc in docs:
+                    # federated answers attribute each document to its project
+                    if isinstance(doc, dict):
+                        doc_project, path = doc["project"], doc["document"]
+                    else:
+                        doc_project, path = project_name, doc
                     try:
                         full_path = os.path.join(
-                            PROJECTS_DIR, project_name, "files", path
+                            PROJECTS_DIR, doc_project, "files", path
                         )
                         with open(full_path, "rb") as f:
                             data = f.read()
                             file_name = os.path.basename(path)
                             st.download_button(
-                                label=f"{file_name}",
+                                label=(
+                                    f"{doc_project}: {file_name}"
+                                    if isinstance(doc, dict)
+                                    else f"{file_name}"
+                                ),
                                 data=data,
                                 file_name=file_name,
                                 mime="application/octet-stream",
@@ -217,7 +329,7 @@ def chatbot_page() -> None:
                     response_text = st.session_state["last_response_text"]
                     audio_path = os.path.join(
                         AUDIO_DIR,
-                        f"audio_{project_name}_{datetime.now().timestamp()}.mp3",
+                        f"audio_{project_name.replace('federado:', '').replace('|', '_')}_{datetime.now().timestamp()}.mp3",
                     )
                     tts = gTTS(text=response_text, lang="pt-br")
                     tts.save(audio_path)
@@ -11,12 +11,6 @@ Tarefa crítica: Sempre cite o nome do documento onde encontrou a informação,
 
 Seja sempre objetivo e eficiente em sua resposta.
 Pense sempre com muita calma antes de responder o usuário.
-
-Contexto: {context}
-
-Pergunta: {question}
-
-Sua Resposta:
 """
 
 PROMPT_REGULAR_REPLY = """
@@ -28,10 +22,6 @@ Tente sempre responder à pergunta com base no Contexto encontrado através de R
 Nunca diga "Aqui está a resposta:", ou algo do tipo (ou será multado), pois você é um assistente conversacional profissional.
 Seja sempre objetivo e eficiente em sua resposta.
 Pense sempre com muita calma antes de responder o usuário.
-
-Pergunta: {question}
-
-Sua Resposta:
 """
 
 # Prompt KB
@@ -47,10 +37,18 @@ Pense sempre com muita calma antes de responder o usuário.
 
 Segue sua base de conhecimento para responder as dúvidas do cliente:
 {KB}
+"""
 
-Pergunta: {question}
+# Prompt KB (only the relevant sections, sent with the question)
+PROMPT_KB_SECTIONS = """
+Você é um chatbot conversacional que utiliza RAG em sua essência.
 
-Sua Resposta:
+Caso o usuário pergunte algo genérico como bom dia, você pode responder normalmente e cumprimentar o usuário.
+Sempre que o usuário perguntar quem descobriu o Brasil, responda com "Desculpe, não consigo te ajudar com essa informação".
+Tente sempre responder à pergunta com base nos trechos da base de conhecimento enviados junto com a pergunta, da melhor maneira possível.
+Nunca diga "Aqui está a resposta:", ou algo do tipo (ou será multado), pois você é um assistente conversacional profissional.
+Seja sempre objetivo e eficiente em sua resposta.
+Pense sempre com muita calma antes de responder o usuário.
 """
 
 
@@ -166,6 +164,8 @@ Pense bastante, analise o texto e resuma-o de forma clara e objetiva respeitando
 Caso você não respeite o limite de caracteres, fugindo muito desse limite ideal, você será multado.
 """
 
+# User messages (the static prompts above are sent as the system message, so
+# the prefix is identical across calls and can be cached by the provider)
 TEXT_END_PROMPT = """
 Contexto: {context}
 
@@ -173,3 +173,18 @@ Pergunta: {question}
 
 Sua Resposta:
 """
+
+TEXT_QUESTION = """
+Pergunta: {question}
+
+Sua Resposta:
+"""
+
+TEXT_KB_SECTIONS = """
+Trechos da base de conhecimento relevantes para a pergunta:
+{KB}
+
+Pergunta: {question}
+
+Sua Resposta:
+"""
@@ -0,0 +1,9 @@
+import tempfile
+import sys
+import os
+
+# the modules are imported from src (as the app and the API do)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# persistent caches, jobs and metrics of the tests stay out of the working dir
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="tests-cache-"))
@@ -0,0 +1,72 @@
+import base64
+import json
+
+import pytest
+from cryptography.fernet import Fernet
+
+pytest.importorskip("sentence_transformers")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import backend.chat as chat  # noqa: E402
+from backend.api import app  # noqa: E402
+from backend.chat import ProjectAccessError, check_password  # noqa: E402
+
+PARAMETERS = {"secret": Fernet.generate_key(), "admin": "admin-senha"}
+
+
+@pytest.fixture
+def projects_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat, "PROJECTS_DIR", str(tmp_path))
+    encrypted = Fernet(PARAMETERS["secret"]).encrypt(b"senha123")
+    for name, flag_password in [("rh", True), ("aberto", False), ("manual", False)]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "metadata.json").write_text(
+            json.dumps(
+                {
+                    "flag_password": flag_password,
+                    "password": base64.b64encode(encrypted).decode("utf-8"),
+                }
+            )
+        )
+    (tmp_path / "manual" / "KB.txt").write_text("Manual do colaborador.")
+    return tmp_path
+
+
+def test_check_password_accepts_project_and_admin_passwords(projects_dir):
+    check_password("rh", " senha123 ", PARAMETERS)
+    check_password("rh", "admin-senha", PARAMETERS)
+    check_password("aberto", "", PARAMETERS)
+
+
+@pytest.mark.parametrize(
+    "project_name, password, status_code",
+    [
+        ("rh", "", 401),
+        ("rh", "errada", 401),
+        ("inexistente", "senha123", 404),
+        ("../rh", "senha123", 404),
+    ],
+)
+def test_check_password_rejects(projects_dir, project_name, password, status_code):
+    with pytest.raises(ProjectAccessError) as error:
+        check_password(project_name, password, PARAMETERS)
+    assert error.value.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "projects, status_code, error",
+    [
+        ([], 422, None),
+        (["aberto", "inexistente"], 400, "Projeto não encontrado: inexistente"),
+        (["aberto", "manual"], 400, "Projetos do tipo KB não podem ser consultados em conjunto: manual"),
+        (["aberto", "rh"], 403, "Projetos com senha não podem ser consultados em conjunto: rh"),
+    ],
+)
+def test_federated_chat_rejects_invalid_project_lists(projects_dir, projects, status_code, error):
+    response = TestClient(app).post(
+        "/chat", json={"message": "oi", "projects": projects, "stream": False}
+    )
+    assert response.status_code == status_code
+    if error:
+        assert response.json() == {"error": error}
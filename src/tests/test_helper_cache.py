@@ -0,0 +1,25 @@
+import numpy as np
+
+from helper_cache import get_semantic_cache
+
+RESPONSE = {"answer": "O RH funciona das 8h às 17h.", "documents": []}
+
+
+def test_semantic_cache_reuses_similar_queries_within_the_temperature_band():
+    cache = get_semantic_cache("test:band", ("index", "v1"))
+    cache.add(np.array([1.0, 0.0, 0.0]), 0.2, RESPONSE)
+
+    assert cache.lookup(np.array([0.99, 0.05, 0.0]), 0.25, 0.95, 0.1) == RESPONSE
+    assert cache.lookup(np.array([0.99, 0.05, 0.0]), 0.8, 0.95, 0.1) is None
+    assert cache.lookup(np.array([0.0, 1.0, 0.0]), 0.2, 0.95, 0.1) is None
+
+
+def test_semantic_cache_is_reset_when_the_prompt_or_model_change():
+    cache = get_semantic_cache("test:signature", ("index", "v1"))
+    cache.add(np.array([1.0, 0.0]), 0.2, RESPONSE)
+    assert get_semantic_cache("test:signature", ("index", "v1")) is cache
+
+    # same index, answers built with another prompt/model version
+    new = get_semantic_cache("test:signature", ("index", "v2"))
+    assert new is not cache
+    assert new.lookup(np.array([1.0, 0.0]), 0.2, 0.95, 0.1) is None
@@ -0,0 +1,66 @@
+import numpy as np
+
+from helper_context import KBIndex, pack_context, strip_overlap
+
+SECTIONS = [
+    f"Seção {i}: procedimentos gerais da empresa sobre o tema número {i} "
+    "e regras internas aplicáveis aos colaboradores."
+    for i in range(12)
+]
+SECTIONS[3] = "Reembolso de despesas de viagem: o prazo para pedir o reembolso é de 30 dias."
+SECTIONS[7] = "Férias: o colaborador pode dividir as férias em até três períodos."
+KB = "\n\n".join(SECTIONS)
+
+
+def build_index(embed_documents=None):
+    return KBIndex(KB, "gpt-4o-mini", embed_documents, max_chars=200, min_chars=10)
+
+
+def test_select_sends_the_matching_sections_in_document_order():
+    index = build_index()
+    text, stats = index.select("qual o prazo do reembolso?", None, 60, 0.35)
+    assert text.startswith(SECTIONS[3])
+    assert stats["sections_used"] < stats["sections"]
+    assert stats["tokens"] <= 60
+
+
+def test_select_sends_the_full_kb_on_weak_lexical_matches():
+    index = build_index()
+    # "empresa" is in almost every section: a match, but not a confident one
+    assert index.select("qual a política da empresa para bolo?", None, 60, 0.35) is None
+    assert index.select("receita de bolo de fubá", None, 60, 0.35) is None
+
+
+def test_select_trusts_a_close_section_without_lexical_match():
+    vectors = np.eye(len(SECTIONS), dtype=np.float32)
+    index = build_index(lambda sections: vectors[: len(sections)])
+    query_vector = vectors[7] + 0.1
+    text, _ = index.select("quantos períodos de descanso?", query_vector, 60, 0.35)
+    assert SECTIONS[7] in text
+    assert index.select("empresa", np.ones(len(SECTIONS)), 60, 0.35) is None
+
+
+def test_strip_overlap_removes_only_the_duplicated_prefix():
+    previous = "O prazo de reembolso é de 30 dias corridos a partir da viagem."
+    assert strip_overlap(previous, "30 dias corridos a partir da viagem. Anexe a nota.", 200) == "Anexe a nota."
+    # short shared prefixes are kept (coincidences)
+    assert strip_overlap("termina em viagem.", "viagem. Outro assunto.", 200) == "viagem. Outro assunto."
+
+
+def test_pack_context_merges_adjacent_chunks_and_respects_the_budget():
+    overlap = "a partir da data da viagem de trabalho"
+    chunks = [
+        {"id": 4, "document": "reembolso.pdf", "content": f"O prazo é de 30 dias {overlap}"},
+        {"id": 9, "document": "ferias.pdf", "content": "Férias podem ser divididas em três períodos."},
+        {"id": 5, "document": "reembolso.pdf", "content": f"{overlap}, com nota fiscal."},
+        {"id": 1, "document": "outro.pdf", "content": "texto longo " * 200},
+    ]
+    context, used, stats = pack_context(chunks, 80, "gpt-4o-mini", 200)
+
+    assert context == (
+        f"### Documento: reembolso.pdf\nO prazo é de 30 dias {overlap}\n, com nota fiscal.\n\n"
+        "### Documento: ferias.pdf\nFérias podem ser divididas em três períodos.\n\n"
+    )
+    assert [chunk["id"] for chunk in used] == [4, 9, 5]  # the long chunk does not fit
+    assert stats["chunks_used"] == 3 and stats["tokens"] <= 80
+    assert stats["tokens_saved"] > 0
@@ -0,0 +1,38 @@
+import time
+
+from helper_guardrail import GuardrailVerdictCache, OffensiveWordMatcher
+from parameters.offensive_words import LIST_OFFENSIVE_WORDS
+
+
+def test_matcher_matches_whole_words_and_phrases_without_accents():
+    matcher = OffensiveWordMatcher(["merda", "vai se ferrar", "cão"])
+    assert matcher.search("Esse sistema é uma MERDA")
+    assert matcher.search("vai   se ferrar!")
+    assert matcher.search("que cao")
+    assert not matcher.search("merdas e cãozinho")  # word boundaries
+    assert not matcher.search("vai se")
+    assert not OffensiveWordMatcher([]).search("merda")
+
+
+def test_matcher_matches_every_default_word():
+    matcher = OffensiveWordMatcher(LIST_OFFENSIVE_WORDS)
+    assert not matcher.search("Qual o horário de funcionamento do RH durante o feriado?")
+    for word in LIST_OFFENSIVE_WORDS:  # accented ones too (e.g. "desgraça")
+        assert matcher.search(f"isso é {word.upper()} mesmo"), word
+
+
+def test_verdict_cache_normalizes_versions_and_expires(tmp_path, monkeypatch):
+    cache = GuardrailVerdictCache(str(tmp_path / "verdicts.db"), ttl_seconds=60, max_entries=2)
+    cache.put("Posso  usar o VPN?", "v1", True)
+    cache.put("texto bloqueado", "v1", False)
+    assert cache.get("posso usar o vpn?", "v1") is True
+    assert cache.get("texto bloqueado", "v1") is False
+    assert cache.get("posso usar o vpn?", "v2") is None  # other prompt/model
+
+    cache.put("terceiro", "v1", True)
+    cache.prune()
+    assert cache.get("posso usar o vpn?", "v1") is None  # only the newest 2 kept
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get("terceiro", "v1") is None
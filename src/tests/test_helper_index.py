@@ -0,0 +1,230 @@
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from helper_index import (
+    FLOAT_VECTORS_FILE,
+    LEGACY_DOCSTORE_FILE,
+    BM25Index,
+    ProjectIndex,
+    build_source_ranges,
+    dense_search,
+    dense_search_batch,
+    fuse_hits,
+    normalized_similarity,
+    reciprocal_rank_fusion,
+    resolve_index_factory,
+    save_project_index,
+    set_search_parameters,
+    upgrade_project,
+    write_index,
+)
+
+CORPUS = [
+    "O artigo 5 trata das férias dos colaboradores.",
+    "Reembolso de despesas de viagem exige nota fiscal.",
+    "A Lei 12.345/2020 regula o trabalho remoto.",
+    "O artigo 7 define o horário de trabalho.",
+] + [f"Procedimento interno número {i} do setor administrativo." for i in range(16)]
+
+THRESHOLD = 1.15
+
+
+def test_bm25_matches_codes_and_accents():
+    index = BM25Index.build(CORPUS)
+    assert index.search("lei 12.345/2020", 3)[0][0] == 2
+    assert index.search("ferias", 3)[0][0] == 0
+    assert index.search("de para que", 3) == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60)
+    assert [idx for idx, _ in fused] == [1, 3, 2]
+
+
+def test_single_shared_word_is_not_contextual():
+    # no dense hit under the threshold, only the common word "artigo" matches
+    lexical = BM25Index.build(CORPUS).search("receita de bolo de artigo", 20)
+    assert lexical
+    dense, fused, relevance = fuse_hits([(1, 1.6), (0, 1.7)], lexical, THRESHOLD, 6.0)
+    assert dense == {}
+    assert fused == []
+
+
+def test_strong_lexical_match_without_dense_hit():
+    lexical = BM25Index.build(CORPUS).search("o que diz a lei 12.345/2020", 20)
+    dense, fused, relevance = fuse_hits([(1, 1.6)], lexical, THRESHOLD, 6.0)
+    assert [idx for idx, _ in fused] == [2]
+
+
+def test_lexical_hits_fused_with_dense_hits():
+    lexical = BM25Index.build(CORPUS).search("artigo horário", 20)
+    dense, fused, relevance = fuse_hits([(3, 0.4), (1, 1.6)], lexical, THRESHOLD, 6.0)
+    assert dense == {3: 0.4}
+    assert fused[0][0] == 3
+    assert relevance[3] == 1.0
+    assert 0 in relevance  # weak lexical hit kept, ranked by fusion
+
+
+def test_dense_only():
+    dense, fused, relevance = fuse_hits([(4, 0.2), (5, 0.9), (6, 2.0)], None, THRESHOLD, 6.0)
+    assert [idx for idx, _ in fused] == [4, 5]
+    assert relevance[4] == 1.0
+
+
+def test_normalized_similarity_orders_shards_by_distance():
+    # each shard's best chunk has relevance 1.0; the closer one must win
+    relevant = {"score": 0.3, "relevance": 1.0}
+    marginal = {"score": 1.1, "relevance": 1.0}
+    lexical_only = {"score": None, "relevance": 1.0}
+    docs = sorted(
+        [marginal, lexical_only, relevant],
+        key=lambda doc: (normalized_similarity(doc["score"], THRESHOLD), doc["relevance"]),
+        reverse=True,
+    )
+    assert docs == [relevant, marginal, lexical_only]
+    assert normalized_similarity(0.0, THRESHOLD) == 1.0
+    assert normalized_similarity(2.0, THRESHOLD) == 0.0
+
+
+def test_legacy_project_is_upgraded_once_by_concurrent_loaders(tmp_path, monkeypatch):
+    documents = {
+        f"uuid-{i}": Document(page_content=text, metadata={"source": f"doc{i // 2}.pdf"})
+        for i, text in enumerate(CORPUS[:4])
+    }
+    with open(tmp_path / LEGACY_DOCSTORE_FILE, "wb") as f:
+        pickle.dump((InMemoryDocstore(documents), dict(enumerate(documents))), f)
+    write_index(faiss.IndexFlatL2(4), str(tmp_path))
+
+    builds = []
+    build = BM25Index.build
+    monkeypatch.setattr(
+        BM25Index, "build", classmethod(lambda cls, texts: builds.append(1) or build(texts))
+    )
+    # each call opens its own lock file descriptor, like separate processes
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(upgrade_project, [str(tmp_path)] * 4))
+
+    assert builds == [1]
+    assert not os.path.exists(tmp_path / LEGACY_DOCSTORE_FILE)
+    project = ProjectIndex(str(tmp_path))
+    assert len(project.chunks) == 4
+    assert project.chunks.get([2])[2]["content"] == CORPUS[2]
+    assert project.lexical.search("lei 12.345/2020", 1)[0][0] == 2
+    assert project.sources == {"doc0.pdf": [[0, 2]], "doc1.pdf": [[2, 4]]}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_compression_is_skipped_below_the_minimum_number_of_vectors():
+    parameters = {"compression_min_vectors": 1000, "compression_pq_m": 8}
+    factory, warnings = resolve_index_factory(999, 32, parameters, "", "sq8")
+    assert factory == "Flat"
+    assert len(warnings) == 1 and "sq8" in warnings[0]
+
+    assert resolve_index_factory(1000, 32, parameters, "", "sq8") == ("SQ8", [])
+    assert resolve_index_factory(1000, 32, parameters, "", "pq") == ("PQ8", [])
+    assert resolve_index_factory(10, 32, parameters, "", "none") == ("Flat", [])
+
+
+def test_an_explicit_factory_wins_over_the_compression():
+    parameters = {"compression_min_vectors": 1000}
+    factory, warnings = resolve_index_factory(10, 32, parameters, " HNSW32,Flat ", "pq")
+    assert factory == "HNSW32,Flat"
+    assert len(warnings) == 1 and "pq" in warnings[0]
+    assert resolve_index_factory(10, 32, parameters, "IVF4,PQ8", "pq") == ("IVF4,PQ8", [])
+
+
+def random_project(count, dim=32, sources=("a.pdf", "b.pdf")):
+    vectors = np.random.default_rng(0).standard_normal((count, dim)).astype(np.float32)
+    documents = [
+        Document(page_content=f"trecho {i}", metadata={"source": sources[i % len(sources)]})
+        for i in range(count)
+    ]
+    return vectors, documents
+
+
+# 4-bit PQ codes: few centroids to train on a small corpus
+@pytest.mark.parametrize("factory", ["SQ8", "PQ8x4", "IVF4,PQ8x4"])
+def test_compressed_indexes_are_rescored_with_the_float_store(tmp_path, factory):
+    vectors, documents = random_project(1000)
+    save_project_index(str(tmp_path), documents, vectors, factory)
+    project = ProjectIndex(str(tmp_path))
+    set_search_parameters(project.index, {"index_nprobe": 4})
+    assert project.float_vectors is not None
+
+    queries = vectors[:20] + 0.01
+    exact = ((vectors[None, :, :] - queries[:, None, :]) ** 2).sum(axis=2)
+    for query, distances, hits in zip(
+        queries, exact, dense_search_batch(project.index, queries, 5, project.float_vectors, 8)
+    ):
+        # exact distances of the candidates, best first
+        assert [distance for _, distance in hits] == sorted(distance for _, distance in hits)
+        for idx, distance in hits:
+            assert distance == pytest.approx(distances[idx], rel=1e-4)
+    hits = dense_search_batch(project.index, queries, 1, project.float_vectors, 8)
+    assert [row[0][0] for row in hits] == list(range(20))
+
+
+def test_rebuilding_uncompressed_removes_the_float_store(tmp_path):
+    vectors, documents = random_project(300)
+    save_project_index(str(tmp_path), documents, vectors, "SQ8")
+    assert os.path.exists(tmp_path / FLOAT_VECTORS_FILE)
+
+    save_project_index(str(tmp_path), documents[:100], vectors[:100], "Flat")
+    project = ProjectIndex(str(tmp_path))
+    assert project.float_vectors is None
+    assert project.index.ntotal == len(project.chunks) == project.lexical.num_docs == 100
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_source_ranges_of_contiguous_and_interleaved_sources():
+    assert build_source_ranges(["a", "a", "b", "b", "b", "c"]) == {
+        "a": [[0, 2]],
+        "b": [[2, 5]],
+        "c": [[5, 6]],
+    }
+    assert build_source_ranges(["a", "b", "b", "a", "c", "a"]) == {
+        "a": [[0, 1], [3, 4], [5, 6]],
+        "b": [[1, 3]],
+        "c": [[4, 5]],
+    }
+
+
+@pytest.mark.parametrize("factory", ["Flat", "HNSW16,Flat", "IVF4,Flat", "SQ8", "IVF4,PQ8x4"])
+def test_filtered_search_only_returns_the_selected_sources(tmp_path, factory):
+    # interleaved sources: a.pdf has the even chunk ids, b.pdf the odd ones
+    vectors, documents = random_project(600, sources=("a.pdf", "b.pdf", "a.pdf", "c.pdf"))
+    save_project_index(str(tmp_path), documents, vectors, factory)
+    project = ProjectIndex(str(tmp_path))
+    set_search_parameters(project.index, {"index_nprobe": 4})
+
+    subset = project.ids_for_sources(["b.pdf", "c.pdf"])
+    assert list(subset) == [i for i in range(600) if i % 2 == 1]
+    for target in [1, 3, 251]:  # b.pdf / c.pdf chunks (wrong-source neighbours around)
+        hits = dense_search(
+            project.index, vectors[target] + 0.01, 10, project.float_vectors, subset=subset
+        )
+        assert len(hits) == 10
+        assert all(documents[idx].metadata["source"] in ("b.pdf", "c.pdf") for idx, _ in hits)
+        assert hits[0][0] == target
+
+    lexical = project.lexical.search("trecho", 20, subset=subset)
+    assert lexical and all(idx % 2 == 1 for idx, _ in lexical)
+
+
+def test_filtering_by_an_unknown_source_returns_nothing(tmp_path):
+    vectors, documents = random_project(50)
+    save_project_index(str(tmp_path), documents, vectors, "Flat")
+    project = ProjectIndex(str(tmp_path))
+
+    subset = project.ids_for_sources(["inexistente.pdf"])
+    assert len(subset) == 0 and subset.dtype == np.int64
+    assert dense_search(project.index, vectors[0], 5, subset=subset) == []
+    assert project.lexical.search("trecho", 5, subset=subset) == []
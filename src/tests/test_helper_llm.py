@@ -0,0 +1,21 @@
+from helper_llm import get_llm_gateway, set_llm_gateway_processes
+
+PARAMETERS = {
+    "llm_requests_per_minute": 600,
+    "llm_tokens_per_minute": 100_000,
+    "llm_max_concurrency": 8,
+}
+
+
+def test_limits_are_split_among_processes():
+    try:
+        set_llm_gateway_processes(4)
+        gateway = get_llm_gateway(PARAMETERS)
+        assert gateway.request_bucket.capacity == 150
+        assert gateway.token_bucket.capacity == 25_000
+        assert gateway.max_concurrency == 2
+    finally:
+        set_llm_gateway_processes(1)
+    gateway = get_llm_gateway(PARAMETERS)
+    assert gateway.request_bucket.capacity == 600
+    assert gateway.max_concurrency == 8
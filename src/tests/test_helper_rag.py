@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+pytest.importorskip("sentence_transformers")
+
+from helper_cache import SemanticAnswerCache  # noqa: E402
+from helper_index import save_project_index  # noqa: E402
+from helper_rag import ChatBot  # noqa: E402
+
+SOURCES = ["ferias.pdf", "reembolso.pdf", "ferias.pdf", "viagem.pdf"]
+PARAMETERS = {
+    "MAX_DOCS": 5,
+    "similarity_threshold": 1.15,
+    "hybrid_search": True,
+    "rerank": False,
+    "embedding": "test",
+}
+
+
+@pytest.fixture
+def chatbot(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((40, 16)).astype(np.float32)
+    documents = [
+        Document(page_content=f"trecho {i} do arquivo", metadata={"source": SOURCES[i % 4]})
+        for i in range(40)
+    ]
+    save_project_index(str(tmp_path), documents, vectors, "Flat")
+
+    bot = ChatBot.__new__(ChatBot)
+    bot.parameters = PARAMETERS
+    bot.faiss_path = str(tmp_path)
+    bot.KB = None
+    # each query is the vector of one chunk (plus noise)
+    bot.embed_queries = lambda queries: [vectors[int(query)] + 0.01 for query in queries]
+    return bot
+
+
+def test_relevant_documents_are_limited_to_the_selected_sources(chatbot):
+    unfiltered = chatbot.get_relevant_documents_batch(["4", "1"])
+    assert unfiltered[0][0]["id"] == 4 and unfiltered[1][0]["id"] == 1
+
+    results = chatbot.get_relevant_documents_batch(
+        ["4", "1", "7"], ["reembolso.pdf", "viagem.pdf"]
+    )
+    assert results[0] == []  # its close chunk is in ferias.pdf, none under the threshold
+    assert results[1][0]["id"] == 1 and results[2][0]["id"] == 7
+    for documents in results:
+        assert {doc["document"] for doc in documents} <= {"reembolso.pdf", "viagem.pdf"}
+
+
+def test_an_unknown_source_returns_no_documents(chatbot):
+    assert chatbot.get_relevant_documents_batch(["4"], ["inexistente.pdf"]) == [[]]
+
+
+@pytest.mark.parametrize("speculative", [True, False])
+def test_cached_answers_are_not_served_to_blocked_inputs(chatbot, speculative):
+    cache = SemanticAnswerCache(("index", "v1"))
+    vector = np.ones(16, dtype=np.float32)
+    cache.add(vector, 0.2, {"Response_Type": "3_Contextual", "Response": "resposta em cache"})
+
+    chatbot.parameters = {**PARAMETERS, "speculative_execution": speculative}
+    chatbot.flag_debug = False
+    chatbot.get_answer_cache = lambda: cache
+    chatbot.embed_query = lambda text: vector  # near-duplicate of the cached question
+
+    chatbot.check_guardrail = lambda text: False
+    response = chatbot.generate_response("pergunta maliciosa", 0.2, "Não")
+    assert response["Response_Type"] == "0_GUARDRAIL_BLOCK"
+
+    chatbot.check_guardrail = lambda text: True
+    response = chatbot.generate_response("pergunta parecida", 0.2, "Não")
+    assert response["Response"] == "resposta em cache"
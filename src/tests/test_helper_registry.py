@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import helper_registry  # noqa: E402
+from helper_registry import IndexRegistry  # noqa: E402
+
+
+def test_models_load_once_without_blocking_the_registry(monkeypatch):
+    loading, release, loads = threading.Event(), threading.Event(), []
+
+    def slow_model(model_name, **kwargs):
+        loads.append(model_name)
+        loading.set()
+        release.wait(5)  # e.g. a download
+        return object()
+
+    monkeypatch.setattr(helper_registry, "HuggingFaceEmbeddings", slow_model)
+    registry = IndexRegistry()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get_embedding_model("m")))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    assert loading.wait(5)
+
+    # the registry keeps serving other lookups while the model loads
+    assert registry.stats()["models"] == []
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert loads == ["m"]
+    assert len(results) == 3 and len({id(model) for model in results}) == 1
+    assert registry.stats()["models"] == ["m"]
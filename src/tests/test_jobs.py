@@ -0,0 +1,82 @@
+import os
+import time
+
+import backend.jobs as jobs
+from backend.jobs import JOB_DONE, JOB_RUNNING, JobManager
+from backend.summarizer import Summarizer
+
+PARAMETERS = {"jobs_item_concurrency": 1, "jobs_retention_days": 1}
+OPTIONS = {"word_limit": 50, "summarize_all": False, "additional_info": ""}
+
+
+def create_job(manager, files, options=OPTIONS):
+    job_id, inputs_dir = manager.create()
+    for name, text in files.items():
+        with open(os.path.join(inputs_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    manager.submit(job_id, "summarize", options)  # not started: only queued
+    return job_id
+
+
+def test_interrupted_job_resumes_without_redoing_items(tmp_path, monkeypatch):
+    calls = []
+    first = JobManager(PARAMETERS, str(tmp_path))
+
+    def summarize(self, text, word_limit, additional_info):
+        calls.append(text)
+        if len(calls) == 2:
+            first.stopping.set()  # worker shutting down after two items
+        return f"resumo {text}"
+
+    monkeypatch.setattr(Summarizer, "summarize_text", summarize)
+    files = {f"doc{i}.txt": f"texto {i}" for i in range(6)}
+    job_id = create_job(first, files)
+
+    first.run(job_id)
+    status = first.status(job_id)
+    assert status["status"] == JOB_RUNNING
+    assert (status["completed"], status["total"]) == (2, 6)
+    assert len(first.result(job_id)["summaries"]) == 2
+
+    # another process picks it up (the lock was released with the first one)
+    second = JobManager(PARAMETERS, str(tmp_path))
+    second.run(job_id)
+    assert second.status(job_id)["status"] == JOB_DONE
+    assert len(calls) == 6
+    assert second.result(job_id)["summaries"] == {
+        name: f"resumo {text}" for name, text in files.items()
+    }
+    assert not os.path.exists(os.path.join(second.job_dir(job_id), "inputs"))
+
+
+def test_summarize_all_skips_unreadable_files(tmp_path, monkeypatch):
+    prompts = []
+    monkeypatch.setattr(
+        jobs,
+        "extract_text_from_file",
+        lambda path: None if path.endswith(".pdf") else "Texto",
+    )
+    monkeypatch.setattr(
+        Summarizer,
+        "summarize_text",
+        lambda self, text, word_limit, additional_info: prompts.append(text) or "resumo",
+    )
+    manager = JobManager(PARAMETERS, str(tmp_path))
+    job_id = create_job(
+        manager, {"a.txt": "", "b.pdf": "", "c.txt": ""}, {**OPTIONS, "summarize_all": True}
+    )
+    manager.run(job_id)
+    assert manager.result(job_id)["summaries"] == {"_All_Docs_": "resumo"}
+    assert prompts == ["Texto\n\nTexto\n\n"]
+
+
+def test_scan_removes_expired_orphan_uploads(tmp_path):
+    manager = JobManager(PARAMETERS, str(tmp_path))
+    orphan, _ = manager.create()
+    recent, _ = manager.create()
+    expired = time.time() - 2 * 86400
+    os.utime(manager.job_dir(orphan), (expired, expired))
+
+    manager.scan()
+    assert not os.path.exists(manager.job_dir(orphan))
+    assert os.path.exists(manager.job_dir(recent))
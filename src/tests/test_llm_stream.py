@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+import asyncio
+import time
+
+import helper_llm
+from helper_llm import LLMGateway
+
+PARAMETERS = {"model_name": "gpt-4o-mini", "key": "test"}
+
+
+class SlowStream:
+    """Fake streamed completion: one token every 50 ms, records its cancellation."""
+
+    def __init__(self, state):
+        self.state = state
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.state["closed"] = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self.state["sent"] += 1
+        if self.state["sent"] > 100:
+            raise StopAsyncIteration
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            self.state["cancelled"] = True
+            raise
+        delta = SimpleNamespace(content="x")
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+def fake_client(state):
+    async def create(**kwargs):
+        return SlowStream(state)
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_closing_an_unstarted_stream_cancels_the_request(monkeypatch):
+    state = {"sent": 0, "cancelled": False, "closed": False}
+    monkeypatch.setattr(helper_llm, "get_llm_client", lambda parameters: fake_client(state))
+    gateway = LLMGateway(max_concurrency=1)
+
+    stream = gateway.stream_sync([{"role": "user", "content": "oi"}], PARAMETERS)
+    assert wait_for(lambda: gateway.stats()["in_flight"] == 1)
+    stream.close()  # never iterated (discarded speculative reply)
+
+    assert wait_for(lambda: state["cancelled"])
+    assert wait_for(lambda: state["closed"])  # connection returned to the pool
+    assert wait_for(lambda: gateway.stats()["in_flight"] == 0)
+    assert state["sent"] < 100
+    assert list(stream) == []
+
+
+def test_stream_yields_tokens(monkeypatch):
+    state = {"sent": 95, "cancelled": False, "closed": False}
+    monkeypatch.setattr(helper_llm, "get_llm_client", lambda parameters: fake_client(state))
+    gateway = LLMGateway()
+    assert "".join(gateway.stream_sync([{"role": "user", "content": "oi"}], PARAMETERS)) == "xxxxx"
+    assert state["closed"]
+
+
+def test_a_request_cancelled_when_admitted_returns_its_slot():
+    gateway = LLMGateway(max_concurrency=1)
+
+    class CancelledOnAdmission(asyncio.Future):
+        """Cancels the caller between its admission and its resumption."""
+
+        def set_result(self, result):
+            super().set_result(result)
+            self.caller.cancel()
+
+    async def scenario():
+        future = CancelledOnAdmission()
+
+        def create_future():  # only for the request (asyncio uses futures too)
+            del gateway._loop.create_future
+            return future
+
+        gateway._loop.create_future = create_future
+        future.caller = asyncio.ensure_future(gateway._acquire(0, 1))
+        try:
+            await future.caller
+        except asyncio.CancelledError:
+            pass
+        return future.done() and not future.cancelled()
+
+    assert gateway.submit(scenario()).result(timeout=2)  # it was admitted
+    assert wait_for(lambda: gateway.stats()["in_flight"] == 0)
+    # the slot is free for the next request
+    gateway.submit(gateway._acquire(0, 1)).result(timeout=2)
+    assert gateway.stats()["in_flight"] == 1
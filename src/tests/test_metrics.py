@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from backend.metrics import MetricsReporter, aggregate, process_metrics  # noqa: E402
+from backend.jobs import write_json  # noqa: E402
+
+
+def snapshot(pid, guardrail, hits, misses, requests, wait, prompt, cached):
+    return {
+        "pid": pid,
+        "time": 0,
+        "guardrail": guardrail,
+        "query_cache": {"size": hits, "max_size": 10, "hits": hits, "misses": misses, "hit_rate": 0.0},
+        "registry": {"indexes": 1, "memory_bytes": 100, "max_memory_bytes": 1000},
+        "llm": {
+            "requests": requests,
+            "wait_time_total": wait,
+            "wait_time_max": wait,
+            "wait_time_avg": 0.0,
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "cache_hit_rate": 0.0,
+        },
+        "llm_usage": [{"model": "m", "prompt_tokens": prompt}],
+    }
+
+
+def test_aggregate_sums_workers_and_recomputes_rates():
+    metrics = aggregate(
+        [
+            snapshot(1, {"cache_hit": 1, "llm_allowed": 1}, 3, 1, 2, 1.0, 100, 50),
+            snapshot(2, {"local_allowed": 2}, 1, 3, 2, 3.0, 300, 0),
+        ]
+    )
+    assert metrics["workers"] == 2
+    assert metrics["guardrail"]["total"] == 4
+    assert metrics["guardrail"]["no_llm_rate"] == 0.75
+    assert metrics["query_cache"]["hit_rate"] == 0.5
+    assert metrics["llm"]["requests"] == 4
+    assert metrics["llm"]["wait_time_avg"] == 1.0
+    assert metrics["llm"]["wait_time_max"] == 3.0
+    assert metrics["llm"]["cache_hit_rate"] == 0.125
+    assert [r["pid"] for r in metrics["registry"]] == [1, 2]
+    assert len(metrics["llm_usage"]) == 2
+
+
+def test_collect_reads_live_snapshots_and_drops_stale_ones(tmp_path):
+    reporter = MetricsReporter({"metrics_snapshot_seconds": 10}, str(tmp_path))
+    live = process_metrics()
+    live["pid"] = -1
+    write_json(reporter.snapshot_path(-1), live)
+    write_json(reporter.snapshot_path(-2), {**live, "pid": -2, "time": 0})
+    metrics = reporter.collect()
+    assert metrics["workers"] == 2
+    assert not (tmp_path / "-2.json").exists()
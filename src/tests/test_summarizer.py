@@ -0,0 +1,22 @@
+import asyncio
+
+import backend.summarizer as summarizer
+from backend.summarizer import Summarizer
+
+
+def test_summarize_all_skips_unreadable_files(monkeypatch):
+    texts = {"a.pdf": "Texto A", "b.pdf": None, "c.txt": "Texto C"}
+    prompts = []
+
+    async def fake_summarize(self, text, word_limit, additional_info):
+        prompts.append(text)
+        return "resumo"
+
+    monkeypatch.setattr(summarizer, "extract_text_from_file", texts.get)
+    monkeypatch.setattr(Summarizer, "asummarize_text", fake_summarize)
+
+    summaries = asyncio.run(
+        Summarizer({}).aprocess_documents(list(texts), 100, True, "")
+    )
+    assert summaries == {"_All_Docs_": "resumo"}
+    assert prompts == ["Texto A\n\nTexto C\n\n"]